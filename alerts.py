@@ -0,0 +1,410 @@
+"""Streaming per-patient alerts over sliding windows of sensor readings.
+
+crud.create_sensor_readings feeds every committed reading to alert_engine, so
+the sync route, the write-behind buffer, the gateway batch route and PPG
+windows are all covered. Per patient (sensor user_id) the engine keeps a ring
+of ALERT_WINDOW_SECONDS / ALERT_BUCKET_SECONDS time buckets plus window
+totals; each bucket holds the sums needed for
+
+    count, mean and standard deviation of heart rate and SpO2,
+    seconds spent with SpO2 below ALERT_SPO2_LOW,
+    least-squares slope (rate of change per minute) of both signals,
+
+so a reading updates its bucket and the totals, and buckets that fall out of
+the window are subtracted as time advances: constant time per reading and
+a fixed ~80 bytes per bucket per patient (about 3 KB with the defaults),
+whatever the sample rate. Readings older than the patient's newest one are
+ignored. At most ALERT_MAX_PATIENTS windows are kept, least recently
+updated evicted first.
+
+Rules are evaluated on every reading: {"name", "metric", "op", "value",
+"severity"} plus optional "min_count" / "min_span_seconds" before the rule
+may fire. DEFAULT_RULES apply unless ALERT_RULES_FILE points at a JSON list
+of rules. A rule fires when its condition becomes true, then stays quiet
+until it has cleared; it never fires twice within ALERT_COOLDOWN_SECONDS
+for a patient, also across workers (checked against the alerts table).
+The windows are only updated once the readings are committed (see
+observe_committed), so a failed and retried ingest batch is not counted
+twice and a dropped one never counts. Fired alerts are then stored in their
+own transaction and published to the live stream as {"type": "alert", ...}.
+
+Windows live in process memory: with several workers, a patient's window
+only covers the readings that worker ingested, so route a device's uploads
+to one worker (e.g. hash on user_id at the proxy) for full windows.
+
+Knobs (environment variables):
+    ALERTS_ENABLED          1 (default) / 0
+    ALERT_WINDOW_SECONDS    sliding window length (default 1200)
+    ALERT_BUCKET_SECONDS    eviction granularity (default 30)
+    ALERT_SPO2_LOW          SpO2 level counted as "below" (default 90)
+    ALERT_MAX_GAP_SECONDS   longest gap between readings counted as time below (default 30)
+    ALERT_COOLDOWN_SECONDS  minimum time between alerts of one rule per patient (default 600)
+    ALERT_MAX_PATIENTS      windows kept in memory (default 10000)
+    ALERT_RULES_FILE        JSON list of rules replacing DEFAULT_RULES
+"""
+import json
+import math
+import operator
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+
+import logs
+import metrics
+from live import live_hub
+from models import Alert
+
+ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "1") == "1"
+ALERT_WINDOW_SECONDS = float(os.getenv("ALERT_WINDOW_SECONDS", "1200"))
+ALERT_BUCKET_SECONDS = float(os.getenv("ALERT_BUCKET_SECONDS", "30"))
+ALERT_SPO2_LOW = float(os.getenv("ALERT_SPO2_LOW", "90"))
+ALERT_MAX_GAP_SECONDS = float(os.getenv("ALERT_MAX_GAP_SECONDS", "30"))
+ALERT_COOLDOWN_SECONDS = float(os.getenv("ALERT_COOLDOWN_SECONDS", "600"))
+ALERT_MAX_PATIENTS = int(os.getenv("ALERT_MAX_PATIENTS", "10000"))
+ALERT_RULES_FILE = os.getenv("ALERT_RULES_FILE")
+
+DEFAULT_RULES = [
+    {"name": "spo2_low_sustained", "metric": "spo2_seconds_below", "op": ">=", "value": 120,
+     "severity": "high"},
+    {"name": "spo2_desaturation_trend", "metric": "spo2_slope_per_min", "op": "<=", "value": -0.25,
+     "min_count": 20, "min_span_seconds": 600, "severity": "medium"},
+    {"name": "heart_rate_high_sustained", "metric": "heart_rate_mean", "op": ">=", "value": 120,
+     "min_count": 20, "min_span_seconds": 300, "severity": "medium"},
+    {"name": "heart_rate_low_sustained", "metric": "heart_rate_mean", "op": "<=", "value": 45,
+     "min_count": 20, "min_span_seconds": 300, "severity": "medium"},
+    {"name": "heart_rate_spike", "metric": "heart_rate_zscore", "op": ">=", "value": 4,
+     "min_count": 30, "severity": "low"},
+]
+
+OPS = {">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt}
+SEVERITIES = ("low", "medium", "high")
+
+# Per-bucket (and window total) sums; x is seconds since the patient's origin
+N, HR, HR2, SP, SP2, BELOW, X, X2, XHR, XSP = range(10)
+FIELDS = 10
+
+_EPOCH = datetime(1970, 1, 1)
+
+logger = logs.get_logger("alerts")
+
+alerts_fired = metrics.register(metrics.Counter(
+    "alerts_fired_total", "Alerts raised by the streaming rules", ("rule", "severity")))
+
+
+def _mean(t, total):
+    return t[total] / t[N]
+
+
+def _std(t, total, squares):
+    mean = t[total] / t[N]
+    return math.sqrt(max(t[squares] / t[N] - mean * mean, 0.0))
+
+
+def _slope_per_min(t, xy, y):
+    denominator = t[N] * t[X2] - t[X] * t[X]
+    if denominator <= 1e-9:
+        return None
+    return 60.0 * (t[N] * t[xy] - t[X] * t[y]) / denominator
+
+
+def _zscore(value, t, total, squares):
+    std = _std(t, total, squares)
+    return (value - t[total] / t[N]) / std if std > 0 else None
+
+
+# metric name -> f(window totals, latest heart rate, latest spo2)
+METRICS = {
+    "heart_rate_mean": lambda t, hr, sp: _mean(t, HR),
+    "heart_rate_std": lambda t, hr, sp: _std(t, HR, HR2),
+    "heart_rate_slope_per_min": lambda t, hr, sp: _slope_per_min(t, XHR, HR),
+    "heart_rate_zscore": lambda t, hr, sp: _zscore(hr, t, HR, HR2),
+    "spo2_mean": lambda t, hr, sp: _mean(t, SP),
+    "spo2_std": lambda t, hr, sp: _std(t, SP, SP2),
+    "spo2_slope_per_min": lambda t, hr, sp: _slope_per_min(t, XSP, SP),
+    "spo2_zscore": lambda t, hr, sp: _zscore(sp, t, SP, SP2),
+    "spo2_seconds_below": lambda t, hr, sp: t[BELOW],
+}
+
+
+class Rule:
+    __slots__ = ("name", "metric", "op", "compare", "value", "severity", "min_count", "min_span_seconds", "fn")
+
+    def __init__(self, name: str, metric: str, op: str, value: float, severity: str = "medium",
+                 min_count: int = 1, min_span_seconds: float = 0.0):
+        if metric not in METRICS:
+            raise ValueError(f"Rule {name!r}: unknown metric {metric!r} (one of {sorted(METRICS)})")
+        if op not in OPS:
+            raise ValueError(f"Rule {name!r}: unknown op {op!r} (one of {sorted(OPS)})")
+        if severity not in SEVERITIES:
+            raise ValueError(f"Rule {name!r}: severity must be one of {SEVERITIES}")
+        self.name, self.metric, self.op, self.value = name, metric, op, float(value)
+        self.compare, self.fn = OPS[op], METRICS[metric]
+        self.severity = severity
+        self.min_count = max(int(min_count), 1)
+        self.min_span_seconds = float(min_span_seconds)
+
+
+def load_rules(path: str = ALERT_RULES_FILE) -> list:
+    specs = DEFAULT_RULES
+    if path:
+        with open(path) as f:
+            specs = json.load(f)
+    rules = [Rule(**spec) for spec in specs]
+    if len({rule.name for rule in rules}) != len(rules):
+        raise ValueError("Alert rule names must be unique")
+    return rules
+
+
+class PatientWindow:
+    """Ring of time buckets with running totals for one patient."""
+
+    __slots__ = ("buckets", "totals", "head", "origin", "first_seen", "last_seen", "last_spo2",
+                 "active", "last_fired")
+
+    def __init__(self, size: int, seconds: float):
+        self.buckets = array("d", bytes(8 * FIELDS * size))
+        self.totals = [0.0] * FIELDS
+        self.head = None          # absolute number of the newest bucket
+        self.origin = seconds     # x = seconds - origin keeps the regression sums small
+        self.first_seen = None
+        self.last_seen = None
+        self.last_spo2 = None
+        self.active = None        # rule names currently true
+        self.last_fired = None    # rule name -> seconds
+
+    def _clear(self, slot: int):
+        b, t, base = self.buckets, self.totals, slot * FIELDS
+        for i in range(FIELDS):
+            t[i] -= b[base + i]
+            b[base + i] = 0.0
+
+    def _reset(self, seconds: float):
+        self.buckets = array("d", bytes(len(self.buckets) * 8))
+        self.totals = [0.0] * FIELDS
+        self.origin = seconds
+        self.first_seen = seconds
+
+    def _rebase(self, shift: float):
+        """Move the origin forward by shift seconds; also re-sums the totals to shed rounding drift."""
+        b, size = self.buckets, len(self.buckets) // FIELDS
+        totals = [0.0] * FIELDS
+        for base in range(0, size * FIELDS, FIELDS):
+            n, x = b[base + N], b[base + X]
+            b[base + X2] += shift * (shift * n - 2 * x)
+            b[base + XHR] -= shift * b[base + HR]
+            b[base + XSP] -= shift * b[base + SP]
+            b[base + X] = x - shift * n
+            for i in range(FIELDS):
+                totals[i] += b[base + i]
+        self.totals = totals
+        self.origin += shift
+
+    def add(self, seconds: float, heart_rate: float, spo2: float, size: int, bucket_seconds: float):
+        """Fold one reading in; False (and no change) if it is older than the newest one."""
+        if self.last_seen is not None and seconds < self.last_seen:
+            return False
+        number = int(seconds // bucket_seconds)
+        if self.head is None or number - self.head >= size:
+            self._reset(seconds)
+        else:
+            for absolute in range(self.head + 1, number + 1):
+                self._clear(absolute % size)
+        self.head = number if self.head is None else max(self.head, number)
+        if self.first_seen is None:
+            self.first_seen = seconds
+
+        window = size * bucket_seconds
+        if seconds - self.origin > 4 * window:
+            self._rebase(seconds - window - self.origin)
+
+        below = 0.0
+        if self.last_spo2 is not None and self.last_spo2 < ALERT_SPO2_LOW:
+            below = min(seconds - self.last_seen, ALERT_MAX_GAP_SECONDS)
+        x = seconds - self.origin
+        values = (1.0, heart_rate, heart_rate * heart_rate, spo2, spo2 * spo2, below, x, x * x,
+                  x * heart_rate, x * spo2)
+        b, t, base = self.buckets, self.totals, (number % size) * FIELDS
+        for i, value in enumerate(values):
+            b[base + i] += value
+            t[i] += value
+        self.last_seen = seconds
+        self.last_spo2 = spo2
+        return True
+
+    def span(self, window: float) -> float:
+        return min(self.last_seen - self.first_seen, window)
+
+
+class AlertEngine:
+    def __init__(self, rules=None, window_seconds: float = ALERT_WINDOW_SECONDS,
+                 bucket_seconds: float = ALERT_BUCKET_SECONDS, cooldown_seconds: float = ALERT_COOLDOWN_SECONDS,
+                 max_patients: int = ALERT_MAX_PATIENTS):
+        self.rules = load_rules() if rules is None else rules
+        self.bucket_seconds = bucket_seconds
+        self.size = max(int(math.ceil(window_seconds / bucket_seconds)), 1)
+        self.window = self.size * bucket_seconds
+        self.cooldown = cooldown_seconds
+        self.max_patients = max_patients
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self.observed = self.out_of_order = self.evicted = self.fired = self.suppressed = 0
+
+    def _window(self, user_id: int, seconds: float) -> PatientWindow:
+        window = self._windows.get(user_id)
+        if window is None:
+            window = self._windows[user_id] = PatientWindow(self.size, seconds)
+            if len(self._windows) > self.max_patients:
+                self._windows.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._windows.move_to_end(user_id)
+        return window
+
+    def _evaluate(self, window: PatientWindow, seconds: float, heart_rate: float, spo2: float):
+        totals = window.totals
+        span = window.span(self.window)
+        for rule in self.rules:
+            value = None
+            if totals[N] >= rule.min_count and span >= rule.min_span_seconds:
+                value = rule.fn(totals, heart_rate, spo2)
+            if value is None or not rule.compare(value, rule.value):
+                if window.active and rule.name in window.active:
+                    window.active.discard(rule.name)
+                continue
+            if window.active is None:
+                window.active = set()
+            elif rule.name in window.active:
+                continue
+            window.active.add(rule.name)
+            if window.last_fired is None:
+                window.last_fired = {}
+            last = window.last_fired.get(rule.name)
+            if last is not None and seconds - last < self.cooldown:
+                self.suppressed += 1
+                continue
+            window.last_fired[rule.name] = seconds
+            yield rule, value
+
+    def observe(self, readings) -> list:
+        """Feed stored readings (dicts with user_id, heart_rate, spo2, timestamp); returns new alert rows."""
+        fired = []
+        with self._lock:
+            for reading in readings:
+                heart_rate, spo2 = reading.get("heart_rate"), reading.get("spo2")
+                if heart_rate is None or spo2 is None:
+                    continue
+                timestamp = reading["timestamp"]
+                seconds = (timestamp - _EPOCH).total_seconds()
+                user_id = reading["user_id"]
+                window = self._window(user_id, seconds)
+                if not window.add(seconds, float(heart_rate), float(spo2), self.size, self.bucket_seconds):
+                    self.out_of_order += 1
+                    continue
+                self.observed += 1
+                for rule, value in self._evaluate(window, seconds, float(heart_rate), float(spo2)):
+                    fired.append({
+                        "user_id": user_id,
+                        "rule": rule.name,
+                        "severity": rule.severity,
+                        "metric": rule.metric,
+                        "value": round(float(value), 3),
+                        "threshold": rule.value,
+                        "message": f"{rule.name}: {rule.metric} = {value:.2f} ({rule.op} {rule.value:g})",
+                        "timestamp": timestamp,
+                    })
+        return fired
+
+    def snapshot(self, user_id: int) -> dict:
+        """Current window metrics for one patient (None if none is kept)."""
+        with self._lock:
+            window = self._windows.get(user_id)
+            if window is None or window.totals[N] < 0.5:
+                return None
+            totals = list(window.totals)
+            span = window.span(self.window)
+            active = sorted(window.active or ())
+        values = {name: fn(totals, math.nan, math.nan) for name, fn in METRICS.items() if "zscore" not in name}
+        values = {k: (round(v, 3) if v is not None else None) for k, v in values.items()}
+        return dict(values, count=int(totals[N]), span_seconds=span, active_rules=active)
+
+    def stats(self) -> dict:
+        return {
+            "patients": len(self._windows),
+            "observed": self.observed,
+            "out_of_order": self.out_of_order,
+            "evicted": self.evicted,
+            "fired": self.fired,
+            "suppressed": self.suppressed,
+            "rules": [rule.name for rule in self.rules],
+        }
+
+
+def store(db: Session, fired: list) -> list:
+    """Insert fired alerts not already raised within the cooldown (by any worker). The caller commits."""
+    if not fired:
+        return []
+    pairs = {(a["user_id"], a["rule"]) for a in fired}
+    since = min(a["timestamp"] for a in fired) - timedelta(seconds=alert_engine.cooldown)
+    recent = dict(
+        ((user_id, rule), last)
+        for user_id, rule, last in db.execute(
+            select(Alert.user_id, Alert.rule, func.max(Alert.timestamp))
+            .where(tuple_(Alert.user_id, Alert.rule).in_(pairs), Alert.timestamp >= since)
+            .group_by(Alert.user_id, Alert.rule)
+        )
+    )
+    cooldown = timedelta(seconds=alert_engine.cooldown)
+    kept = []
+    for alert in fired:
+        key = (alert["user_id"], alert["rule"])
+        last = recent.get(key)
+        if last is not None and abs(alert["timestamp"] - last) < cooldown:
+            alert_engine.suppressed += 1
+            continue
+        recent[key] = alert["timestamp"]
+        kept.append(alert)
+    if kept:
+        db.execute(Alert.__table__.insert(), kept)
+    return kept
+
+
+def observe_committed(db: Session, readings) -> list:
+    """Feed committed readings to alert_engine, then store and publish what fired.
+
+    A failure evaluating the rules or storing the alerts is logged, not
+    raised: the readings are already committed, and a caller retrying them
+    would insert them twice.
+    """
+    try:
+        fired = alert_engine.observe(readings)
+    except Exception as e:
+        logger.error("❌ Alert rules failed on %d readings: %s", len(readings), e)
+        return []
+    if not fired:
+        return []
+    try:
+        stored = store(db, fired)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("❌ Storing %d alerts failed: %s", len(fired), e)
+        return []
+    publish(stored)
+    return stored
+
+
+def publish(stored: list):
+    """Count and push stored alerts to live subscribers (after the commit)."""
+    for alert in stored:
+        alert_engine.fired += 1
+        alerts_fired.inc(alert["rule"], alert["severity"])
+        live_hub.publish(alert["user_id"], {"type": "alert", **alert}, remember=False)
+        logger.info("🚨 Alert %s for user %s: %s", alert["rule"], alert["user_id"], alert["message"])
+
+
+alert_engine = AlertEngine()
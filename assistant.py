@@ -0,0 +1,273 @@
+"""Bounded, streaming, cached LLM calls behind POST /ai-assistant (app.py).
+
+  * Concurrency: at most ASSISTANT_MAX_CONCURRENCY provider calls per process.
+    A request that can't get a slot within ASSISTANT_QUEUE_TIMEOUT_SECONDS
+    gets 503 instead of parking a server thread behind slow completions.
+  * Timeouts: every provider call (and every gap between streamed chunks)
+    is bounded by ASSISTANT_TIMEOUT_SECONDS; a timeout is a 504.
+  * Streaming: with "stream": true in the body (or Accept: text/event-stream)
+    text deltas are forwarded as Server-Sent Events as the provider
+    generates them:  data: {"text": "..."}  ...  data: {"done": true, "cached": false}
+  * Cache: completed answers are kept under a hash of the normalized
+    conversation (model, roles, contents lowercased with whitespace
+    collapsed), with a TTL and LRU eviction by entry count and total size,
+    so repeated FAQ-style questions are answered without a provider call.
+    A streamed request that hits the cache gets the answer as one event.
+
+The provider is whatever OPENAI_BASE_URL points at, so tests and load runs
+can use the local stub (python benchmarks/stub_llm.py) instead of the real
+API:
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=stub python app.py
+
+Knobs (environment variables):
+    OPENAI_API_KEY / OPENAI_BASE_URL
+    ASSISTANT_MODEL                   default gpt-4o-mini
+    ASSISTANT_MAX_CONCURRENCY         default 8
+    ASSISTANT_QUEUE_TIMEOUT_SECONDS   default 2
+    ASSISTANT_TIMEOUT_SECONDS         default 30
+    ASSISTANT_MAX_RETRIES             default 1
+    ASSISTANT_CACHE_TTL_SECONDS       default 3600 (0 disables the cache)
+    ASSISTANT_CACHE_MAX_ENTRIES       default 1000
+    ASSISTANT_CACHE_MAX_BYTES         default 8 MiB
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import openai
+from openai import OpenAI
+
+ASSISTANT_MODEL = os.getenv("ASSISTANT_MODEL", "gpt-4o-mini")
+ASSISTANT_MAX_CONCURRENCY = int(os.getenv("ASSISTANT_MAX_CONCURRENCY", "8"))
+ASSISTANT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ASSISTANT_QUEUE_TIMEOUT_SECONDS", "2"))
+ASSISTANT_TIMEOUT_SECONDS = float(os.getenv("ASSISTANT_TIMEOUT_SECONDS", "30"))
+ASSISTANT_MAX_RETRIES = int(os.getenv("ASSISTANT_MAX_RETRIES", "1"))
+ASSISTANT_CACHE_TTL_SECONDS = float(os.getenv("ASSISTANT_CACHE_TTL_SECONDS", "3600"))
+ASSISTANT_CACHE_MAX_ENTRIES = int(os.getenv("ASSISTANT_CACHE_MAX_ENTRIES", "1000"))
+ASSISTANT_CACHE_MAX_BYTES = int(os.getenv("ASSISTANT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+
+class AssistantError(Exception):
+    """The provider call failed; status_code is what the route returns."""
+
+    status_code = 502
+
+
+class AssistantBusy(AssistantError):
+    status_code = 503
+
+
+class AssistantTimeout(AssistantError):
+    status_code = 504
+
+
+def normalize(messages) -> list:
+    """[(role, content)] with content lowercased and whitespace collapsed."""
+    out = []
+    for msg in messages:
+        content = msg.get("content") if isinstance(msg, dict) else None
+        if not isinstance(content, str):
+            continue
+        out.append((str(msg.get("role", "user")), " ".join(content.split()).lower()))
+    return out
+
+
+def cache_key(model: str, messages) -> str:
+    return hashlib.sha256(json.dumps([model, normalize(messages)]).encode()).hexdigest()
+
+
+def user_input(messages) -> str:
+    """The user turns joined into one prompt (what the route has always sent)."""
+    return "".join(
+        msg["content"] + "\n"
+        for msg in messages
+        if isinstance(msg, dict) and msg.get("role") == "user" and isinstance(msg.get("content"), str)
+    )
+
+
+class ResponseCache:
+    """Thread-safe LRU of answers with a TTL and entry/byte limits."""
+
+    def __init__(self, ttl: float = ASSISTANT_CACHE_TTL_SECONDS, max_entries: int = ASSISTANT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = ASSISTANT_CACHE_MAX_BYTES):
+        self.ttl, self.max_entries, self.max_bytes = ttl, max_entries, max_bytes
+        self._entries = OrderedDict()   # key -> (expires_at, text)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, text: str):
+        size = len(text.encode())
+        # An empty answer is a provider hiccup, not something to serve again
+        if not text or self.ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, text)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, text = self._entries.pop(key)
+        self._bytes -= len(text.encode())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+
+class Assistant:
+    def __init__(self, model: str = ASSISTANT_MODEL, max_concurrency: int = ASSISTANT_MAX_CONCURRENCY,
+                 queue_timeout: float = ASSISTANT_QUEUE_TIMEOUT_SECONDS, cache: ResponseCache = None):
+        self.model = model
+        self.queue_timeout = queue_timeout
+        self.max_concurrency = max_concurrency
+        self.cache = cache or ResponseCache()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._client = None
+        self._lock = threading.Lock()
+        self.in_flight = self.rejected = self.timeouts = self.errors = 0
+
+    @property
+    def client(self) -> OpenAI:
+        # Created on first use so the app starts without provider settings
+        if self._client is None:
+            self._client = OpenAI(timeout=ASSISTANT_TIMEOUT_SECONDS, max_retries=ASSISTANT_MAX_RETRIES)
+        return self._client
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise AssistantBusy("Assistant is at capacity, retry shortly")
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _failed(self, e: Exception) -> AssistantError:
+        with self._lock:
+            if isinstance(e, openai.APITimeoutError):
+                self.timeouts += 1
+                return AssistantTimeout("Assistant timed out")
+            self.errors += 1
+        return AssistantError(f"Assistant provider error: {e}")
+
+    def complete(self, messages):
+        """(answer text, cached?) for a conversation."""
+        key = cache_key(self.model, messages)
+        text = self.cache.get(key)
+        if text is not None:
+            return text, True
+        self._acquire()
+        try:
+            response = self.client.responses.create(model=self.model, input=user_input(messages))
+            text = response.output_text
+        except openai.OpenAIError as e:
+            raise self._failed(e)
+        finally:
+            self._release()
+        self.cache.put(key, text)
+        return text, False
+
+    def stream(self, messages):
+        """(cached answer, None) or (None, AssistantStream of text deltas).
+
+        The provider request is sent before this returns, so capacity,
+        timeout and connection errors surface here as AssistantError. The
+        stream holds a concurrency slot until it is exhausted or closed;
+        the caller must close() it even if it never iterates it.
+        """
+        key = cache_key(self.model, messages)
+        text = self.cache.get(key)
+        if text is not None:
+            return text, None
+        self._acquire()
+        try:
+            events = self.client.responses.create(model=self.model, input=user_input(messages), stream=True)
+        except openai.OpenAIError as e:
+            self._release()
+            raise self._failed(e)
+        except BaseException:
+            self._release()
+            raise
+        return None, AssistantStream(self, key, events)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "cache": self.cache.stats(),
+        }
+
+
+class AssistantStream:
+    """Text deltas of one provider stream; close() releases its slot (idempotent)."""
+
+    def __init__(self, owner: Assistant, key: str, events):
+        self.owner = owner
+        self.key = key
+        self.events = events
+        self._closed = False
+
+    def __iter__(self):
+        parts = []
+        try:
+            for event in self.events:
+                if event.type == "response.output_text.delta":
+                    parts.append(event.delta)
+                    yield event.delta
+                elif event.type in ("response.failed", "error"):
+                    raise AssistantError("Assistant provider error: generation failed")
+        except openai.OpenAIError as e:
+            raise self.owner._failed(e)
+        finally:
+            self.close()
+        # Only complete answers are cached
+        self.owner.cache.put(self.key, "".join(parts))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.events.close()
+        finally:
+            self.owner._release()
+
+
+assistant = Assistant()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+import hashing
 from jose import jwt
 from datetime import datetime, timedelta
 
@@ -10,8 +10,8 @@ from schemas import LoginRequest
 
 router = APIRouter()
 
-#  Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+#  Password hashing context (bcrypt runs in hashing's process pool)
+pwd_context = hashing.pwd_context
 
 # 🔑 JWT config
 SECRET_KEY = "your-secret-key"  # Replace with a secure key in production
@@ -20,7 +20,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 #  Password verification
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.verify_password(plain_password, hashed_password)
 
 #  JWT token creation
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -33,8 +33,16 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 @router.post("/login")
 def login(request: LoginRequest, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.username == request.username).first()
-    if not user or not verify_password(request.password, user.hashed_password):
+    try:
+        valid, new_hash = hashing.verify_and_update(request.password, user.hashed_password) if user else (False, None)
+    except hashing.PasswordHashingBusy:
+        raise HTTPException(status_code=503, detail="Too many login attempts in progress, retry shortly")
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid username or password")
+    if new_hash:
+        # Cost factor changed since this hash was made
+        user.hashed_password = new_hash
+        db.commit()
 
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(data={"sub": user.username, "user_id": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""Rescore existing health_records with the current risk model.
+
+Streams records in id order (keyset chunks, so memory stays flat), scores
+each chunk with one vectorized model call and writes changed statuses back
+with a single executemany UPDATE per chunk, moving the same records between
+the status counters of patient_summaries in that transaction.
+
+    python backfill_risk.py --chunk-size 5000
+    python backfill_risk.py --patient-id 12 --dry-run
+    python backfill_risk.py --start-id 1500000   # resume after an interruption
+"""
+import argparse
+import time
+
+from sqlalchemy import bindparam, select, update
+
+import summaries
+from database import SessionLocal
+from models import HealthRecord, Patient
+from utils import compute_risk_ml_batch
+
+
+def iter_chunks(db, chunk_size: int, start_id: int = 0, patient_id: int = None):
+    """Yield lists of (id, heart_rate, spo2, age, status, patient_id) rows, chunk by chunk."""
+    last_id = start_id
+    while True:
+        query = (
+            select(HealthRecord.id, HealthRecord.heart_rate, HealthRecord.spo2, Patient.age, HealthRecord.status,
+                   HealthRecord.patient_id)
+            .outerjoin(Patient, Patient.id == HealthRecord.patient_id)
+            .where(HealthRecord.id > last_id)
+            .order_by(HealthRecord.id)
+            .limit(chunk_size)
+        )
+        if patient_id is not None:
+            query = query.where(HealthRecord.patient_id == patient_id)
+        rows = db.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def backfill(chunk_size: int = 5000, start_id: int = 0, patient_id: int = None, dry_run: bool = False):
+    stmt = (
+        update(HealthRecord.__table__)
+        .where(HealthRecord.__table__.c.id == bindparam("record_id"))
+        .values(status=bindparam("new_status"))
+    )
+    scanned = changed = 0
+    started = time.monotonic()
+
+    db = SessionLocal()
+    try:
+        for rows in iter_chunks(db, chunk_size, start_id, patient_id):
+            ids, heart_rate, spo2, age, status, patient_ids = zip(*rows)
+            labels = compute_risk_ml_batch(heart_rate, spo2, age)
+            changes = [
+                (patient_id, record_id, old, label)
+                for record_id, patient_id, old, label in zip(ids, patient_ids, status, labels)
+                if old != label
+            ]
+            updates = [{"record_id": record_id, "new_status": label} for _, record_id, _, label in changes]
+            if updates and not dry_run:
+                db.execute(stmt, updates)
+                summaries.statuses_changed(db, changes)
+                db.commit()
+            else:
+                db.rollback()  # release the read snapshot between chunks
+
+            scanned += len(rows)
+            changed += len(updates)
+            rate = scanned / max(time.monotonic() - started, 1e-9)
+            print(f"🔁 scanned={scanned} changed={changed} last_id={ids[-1]} ({rate:.0f} rows/s)")
+    finally:
+        db.close()
+
+    print(f"✅ Backfill done: {scanned} records scanned, {changed} {'would change' if dry_run else 'updated'}")
+    return scanned, changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore health_records with the current risk model")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--start-id", type=int, default=0, help="resume after this record id")
+    parser.add_argument("--patient-id", type=int, default=None, help="only rescore one patient")
+    parser.add_argument("--dry-run", action="store_true", help="score but do not write")
+    args = parser.parse_args()
+
+    backfill(args.chunk_size, args.start_id, args.patient_id, args.dry_run)
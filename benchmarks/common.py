@@ -0,0 +1,50 @@
+"""Result files shared by the benchmark scripts.
+
+Every run writes one JSON document (benchmark name, time, interpreter,
+platform, configuration and the measured numbers) so two runs can be
+diffed by hand or with --baseline.
+"""
+import json
+import os
+import platform
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def make_results(name: str, args, measurements: dict) -> dict:
+    return {
+        "benchmark": name,
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        **measurements,
+    }
+
+
+def write_results(results: dict, output: str = None, prefix: str = "run") -> str:
+    output = output or os.path.join(RESULTS_DIR, f"{prefix}-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📝 Results written to {output}")
+    return output
+
+
+def compare(results: dict, baseline_path: str, section: str, keys):
+    """Print the relative change of each key per entry against a baseline file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path}:")
+    for name, now in results[section].items():
+        before = baseline.get(section, {}).get(name)
+        if not before:
+            continue
+        deltas = [
+            f"{key} {100 * (now[key] - before[key]) / before[key]:+.1f}%"
+            for key in keys
+            if before.get(key)
+        ]
+        print(f"  {name:40s} " + "  ".join(deltas))
@@ -0,0 +1,256 @@
+"""Load test: simulated ESP32 devices plus dashboard readers against main.py.
+
+Starts the FastAPI app under uvicorn against a throwaway SQLite database
+(or --in-process, through httpx's ASGI transport), seeds patients and
+history, then for --duration seconds:
+
+  * --devices devices each POST /sensor-readings at --rate Hz (open loop:
+    requests are sent on schedule even if earlier ones are still pending),
+    every --healthlog-every-th one going to POST /healthlogs instead;
+  * --readers dashboard clients loop over GET /healthlogs and
+    GET /patients/{id}/records/.
+
+Prints throughput and p50/p95/p99 latency per route and writes the same
+numbers as JSON (--output) so runs can be compared; --baseline prints the
+change against an earlier results file.
+
+    python benchmarks/load_test.py --devices 200 --rate 1 --readers 20 --duration 30
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import numpy as np
+
+from common import ROOT, compare, make_results, write_results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingestion/read load test for main.py")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1.0, help="readings per second per device")
+    parser.add_argument("--healthlog-every", type=int, default=10, help="every Nth reading goes to POST /healthlogs (0 = never)")
+    parser.add_argument("--readers", type=int, default=10, help="concurrent dashboard clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--patients", type=int, default=50)
+    parser.add_argument("--history", type=int, default=200, help="seeded readings/records per patient")
+    parser.add_argument("--database-url", default=None, help="default: fresh SQLite file in a temp dir")
+    parser.add_argument("--in-process", action="store_true", help="drive the app through ASGI instead of uvicorn")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="results JSON (default: benchmarks/results/load-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results JSON to compare against")
+    return parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed(args):
+    """Create tables and seed patients/accounts with history; returns (patient ids, user ids, tokens)."""
+    import crud
+    import models
+    import utils
+    from database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        patient_ids, user_ids, tokens = [], [], []
+        for i in range(args.patients):
+            patient = models.Patient(name=f"bench-{i}", age=random.randint(60, 95), gender="F")
+            user = models.User(fullname=f"Bench {i}", age=patient.age, email=f"bench{i}@example.com")
+            db.add_all([patient, user])
+            db.flush()
+            patient_ids.append(patient.id)
+            user_ids.append(user.id)
+            tokens.append(utils.create_access_token({"sub": user.email, "user_id": user.id}))
+            db.execute(models.HealthRecord.__table__.insert(), [
+                {"patient_id": patient.id, "heart_rate": random.randint(55, 130), "spo2": random.randint(85, 100),
+                 "status": "Normal", "timestamp": now - timedelta(seconds=k)}
+                for k in range(args.history)
+            ])
+            crud.create_sensor_readings(db, [
+                {"user_id": user.id, "heart_rate": random.randint(55, 130), "spo2": random.randint(85, 100),
+                 "ir": random.randint(0, 100000), "red": random.randint(0, 100000),
+                 "timestamp": now - timedelta(seconds=k)}
+                for k in range(args.history)
+            ])
+        db.commit()
+        return patient_ids, user_ids, tokens
+    finally:
+        db.close()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}    # route -> {status code or exception name: count}
+
+    def record(self, route: str, seconds: float, error: str = None):
+        self.latencies.setdefault(route, []).append(seconds)
+        if error is not None:
+            counts = self.errors.setdefault(route, {})
+            counts[error] = counts.get(error, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            ms = np.asarray(values) * 1000
+            routes[route] = {
+                "requests": len(values),
+                "errors": sum(self.errors.get(route, {}).values()),
+                "error_kinds": self.errors.get(route, {}),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                "p99_ms": round(float(np.percentile(ms, 99)), 3),
+                "max_ms": round(float(ms.max()), 3),
+            }
+        return routes
+
+
+async def timed(client, recorder, route, method, url, **kwargs):
+    started = time.perf_counter()
+    error = None
+    try:
+        response = await client.request(method, url, **kwargs)
+        if response.status_code >= 400 and not (route.startswith("GET /patients") and response.status_code == 404):
+            error = str(response.status_code)
+    except httpx.HTTPError as exc:
+        error = type(exc).__name__
+    recorder.record(route, time.perf_counter() - started, error)
+
+
+async def device(client, recorder, user_id, patient_id, args, deadline):
+    interval = 1.0 / args.rate
+    next_at = time.monotonic() + random.random() * interval
+    pending = set()
+    n = 0
+    while next_at < deadline:
+        await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+        n += 1
+        hr, spo2 = random.randint(55, 130), random.randint(85, 100)
+        if args.healthlog_every and n % args.healthlog_every == 0:
+            call = timed(client, recorder, "POST /healthlogs", "POST", "/healthlogs",
+                         json={"heart_rate": hr, "spo2": spo2, "patient_id": patient_id})
+        else:
+            call = timed(client, recorder, "POST /sensor-readings", "POST", "/sensor-readings",
+                         json={"user_id": user_id, "heart_rate": hr, "spo2": spo2,
+                               "ir": random.randint(0, 100000), "red": random.randint(0, 100000)})
+        task = asyncio.ensure_future(call)
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        next_at += interval
+    if pending:
+        await asyncio.gather(*pending)
+
+
+async def reader(client, recorder, tokens, patient_ids, deadline):
+    while time.monotonic() < deadline:
+        token = random.choice(tokens)
+        await timed(client, recorder, "GET /healthlogs", "GET", "/healthlogs",
+                    headers={"Authorization": f"Bearer {token}"})
+        await timed(client, recorder, "GET /patients/{patient_id}/records/", "GET",
+                    f"/patients/{random.choice(patient_ids)}/records/")
+
+
+async def run_load(client, args, patient_ids, user_ids, tokens) -> dict:
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    tasks = [
+        device(client, recorder, user_ids[i % len(user_ids)], patient_ids[i % len(patient_ids)], args, deadline)
+        for i in range(args.devices)
+    ]
+    tasks += [reader(client, recorder, tokens, patient_ids, deadline) for _ in range(args.readers)]
+    await asyncio.gather(*tasks)
+    return recorder.summary(time.monotonic() - started)
+
+
+async def run_in_process(args, patient_ids, user_ids, tokens) -> dict:
+    import main
+
+    await main.app.router.startup()
+    try:
+        # Unhandled exceptions become 500s, as they would under uvicorn
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_load(client, args, patient_ids, user_ids, tokens)
+    finally:
+        await main.app.router.shutdown()
+
+
+async def run_uvicorn(args, patient_ids, user_ids, tokens) -> dict:
+    port = args.port or free_port()
+    log_path = os.path.join(tempfile.gettempdir(), f"latestback-bench-server-{port}.log")
+    log = open(log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=os.environ.copy(),
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    print(f"🚀 uvicorn on port {port} (server log: {log_path})")
+    try:
+        limits = httpx.Limits(max_connections=args.devices + args.readers, max_keepalive_connections=args.devices + args.readers)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            for _ in range(300):
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not come up")
+            return await run_load(client, args, patient_ids, user_ids, tokens)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        log.close()
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+
+    tmpdir = None
+    if args.database_url is None:
+        tmpdir = tempfile.mkdtemp(prefix="latestback-bench-")
+        args.database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    # Must be set before the app's database module is imported (here and in uvicorn)
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    patient_ids, user_ids, tokens = seed(args)
+    runner = run_in_process if args.in_process else run_uvicorn
+    routes = asyncio.run(runner(args, patient_ids, user_ids, tokens))
+
+    print(f"{'route':40s} {'reqs':>7s} {'err':>5s} {'rps':>8s} {'p50ms':>8s} {'p95ms':>8s} {'p99ms':>8s}")
+    for route, r in routes.items():
+        print(f"{route:40s} {r['requests']:7d} {r['errors']:5d} {r['throughput_rps']:8.1f} "
+              f"{r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f}"
+              + (f"  {r['error_kinds']}" if r["errors"] else ""))
+
+    results = make_results("load_test", args, {"routes": routes})
+    write_results(results, args.output, "load")
+    if args.baseline:
+        compare(results, args.baseline, "routes", ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"))
+
+
+if __name__ == "__main__":
+    main()
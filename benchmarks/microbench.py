@@ -0,0 +1,116 @@
+"""Microbenchmarks for the per-request CPU work in main.py.
+
+Covers risk scoring (single reading and batched), PPG derivation,
+password hashing and verification, and access-token verification. Each
+case is timed over --repeat rounds of an auto-sized loop; the median
+per-operation time is reported and written as JSON for run-to-run
+comparison.
+
+    python benchmarks/microbench.py
+    python benchmarks/microbench.py --baseline benchmarks/results/micro-<earlier>.json
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from common import ROOT, compare, make_results, write_results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for scoring, hashing and tokens")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing round")
+    parser.add_argument("--only", default=None, help="substring filter on case names")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    return parser.parse_args()
+
+
+def measure(fn, repeat: int, min_time: float) -> dict:
+    """Median seconds per call of fn() over `repeat` rounds of at least min_time each."""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 10 or loops >= 1 << 24:
+            break
+        loops *= 10
+    loops = max(1, int(loops * (min_time / max(elapsed, 1e-9))))
+
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        rounds.append((time.perf_counter() - started) / loops)
+    median = statistics.median(rounds)
+    return {
+        "loops": loops,
+        "median_us": round(median * 1e6, 3),
+        "min_us": round(min(rounds) * 1e6, 3),
+        "ops_per_sec": round(1 / median, 1),
+    }
+
+
+def cases():
+    import hashing
+    import ppg
+    import utils
+    from token_cache import TokenCache
+
+    rng = np.random.default_rng(0)
+    batch = rng.integers([40, 80, 60], [180, 101, 100], size=(1000, 3)).astype(float)
+    password = "correct horse battery staple"
+    hashed = hashing._hash(password)
+    token = utils.create_access_token({"sub": "bench", "user_id": 1})
+    cache = TokenCache()
+    windows = [ppg.synthesize(hr, 96, noise=0.05, seed=i) for i, hr in enumerate(rng.uniform(50, 150, 100))]
+    ppg_ir = np.stack([ir for ir, _ in windows])
+    ppg_red = np.stack([red for _, red in windows])
+
+    return {
+        "compute_risk_ml": lambda: utils.compute_risk_ml(92, 96, 74),
+        "compute_risk_ml (off-grid input)": lambda: utils.compute_risk_ml(92.5, 96, 74),
+        "classify_risk": lambda: utils.classify_risk(92, 96),
+        "compute_risk_ml_batch x1000": lambda: utils.compute_risk_ml_batch(batch[:, 0], batch[:, 1], batch[:, 2]),
+        "ppg.derive x100 windows (8 s @ 100 Hz)": lambda: ppg.derive(ppg_ir, ppg_red, 100.0),
+        "hash_password (inline)": lambda: hashing._hash(password),
+        "verify_password (inline)": lambda: hashing._verify_and_update(password, hashed),
+        "verify_password (process pool)": lambda: hashing.verify_password(password, hashed),
+        "verify_access_token": lambda: utils.verify_access_token(token),
+        "verify_access_token (cached)": lambda: cache.verify(token, utils.verify_access_token),
+    }
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    results = {}
+    for name, fn in cases().items():
+        if args.only and args.only not in name:
+            continue
+        # bcrypt is slow by design; a couple of rounds is enough
+        slow = "password" in name
+        results[name] = measure(fn, 3 if slow else args.repeat, args.min_time)
+        r = results[name]
+        print(f"{name:40s} {r['median_us']:>12.2f} us/op {r['ops_per_sec']:>12.1f} ops/s")
+
+    import hashing
+    hashing.shutdown()
+
+    output = make_results("microbench", args, {"cases": results})
+    write_results(output, args.output, "micro")
+    if args.baseline:
+        compare(output, args.baseline, "cases", ("median_us",))
+
+
+if __name__ == "__main__":
+    main()
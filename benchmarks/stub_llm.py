@@ -0,0 +1,140 @@
+"""Local stand-in for the LLM provider behind /ai-assistant (see assistant.py).
+
+Implements POST /v1/responses, plain and streamed (Server-Sent Events), with
+a configurable delay before the first token and between tokens, so the
+assistant's concurrency limit, timeouts, streaming and cache can be
+exercised without network access or an API key:
+
+    python benchmarks/stub_llm.py --port 8099 --first-token-ms 300 --token-ms 20
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=stub python app.py
+
+The answer echoes the prompt's word count and the number of requests served,
+so cached and fresh answers can be told apart. GET /stats returns the
+request counters.
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLM(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, first_token_ms: float = 200, token_ms: float = 20, tokens: int = 20):
+        super().__init__(address, Handler)
+        self.first_token = first_token_ms / 1000
+        self.token_delay = token_ms / 1000
+        self.tokens = tokens
+        self.lock = threading.Lock()
+        self.requests = self.streamed = self.in_flight = self.max_in_flight = 0
+
+    def answer(self, prompt: str) -> list:
+        with self.lock:
+            self.requests += 1
+            n = self.requests
+        words = len(prompt.split())
+        return [f"Stub answer {n} to a {words}-word prompt."] + [f" token{i}" for i in range(self.tokens - 1)]
+
+
+def _response(model: str, text: str) -> dict:
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "output": [{
+            "type": "message",
+            "id": f"msg_{uuid.uuid4().hex}",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/stats":
+            return self._json(404, {"error": "not found"})
+        s = self.server
+        self._json(200, {"requests": s.requests, "streamed": s.streamed, "max_in_flight": s.max_in_flight})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/responses":
+            return self._json(404, {"error": {"message": "not found"}})
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        s = self.server
+        with s.lock:
+            s.in_flight += 1
+            s.max_in_flight = max(s.max_in_flight, s.in_flight)
+        try:
+            tokens = s.answer(str(body.get("input", "")))
+            model = body.get("model", "stub")
+            time.sleep(s.first_token)
+            if not body.get("stream"):
+                time.sleep(s.token_delay * (len(tokens) - 1))
+                return self._json(200, _response(model, "".join(tokens)))
+
+            with s.lock:
+                s.streamed += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            item_id = f"msg_{uuid.uuid4().hex}"
+            for seq, token in enumerate(tokens):
+                if seq:
+                    time.sleep(s.token_delay)
+                self._event("response.output_text.delta", {
+                    "item_id": item_id, "output_index": 0, "content_index": 0, "delta": token,
+                    "sequence_number": seq, "logprobs": [],
+                })
+            self._event("response.completed", {
+                "response": _response(model, "".join(tokens)), "sequence_number": len(tokens),
+            })
+            self.close_connection = True
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            with s.lock:
+                s.in_flight -= 1
+
+    def _event(self, kind: str, payload: dict):
+        data = json.dumps({"type": kind, **payload})
+        self.wfile.write(f"event: {kind}\ndata: {data}\n\n".encode())
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub LLM provider for /ai-assistant tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    server = StubLLM((args.host, args.port), args.first_token_ms, args.token_ms, args.tokens)
+    print(f"🤖 Stub LLM on http://{args.host}:{args.port}/v1 ({args.first_token_ms} ms first token, {args.token_ms} ms/token)")
+    server.serve_forever()
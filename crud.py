@@ -1,5 +1,12 @@
+from datetime import datetime
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from utils import compute_risk_ml
+import alerts
+import rollups
+import retention
+import summaries
+from schemas import SensorReadingCreate
 import models, schemas
 
 # Create patient
@@ -40,6 +47,8 @@ def create_health_record(db: Session, record: schemas.HealthRecordCreate, patien
         status=status
     )
     db.add(db_record)
+    db.flush()
+    summaries.record_added(db, db_record)
     db.commit()
     db.refresh(db_record)
     return db_record
@@ -53,6 +62,8 @@ def delete_record(db: Session, record_id: int):
     record = db.query(models.HealthRecord).filter(models.HealthRecord.id == record_id).first()
     if record:
         db.delete(record)
+        db.flush()
+        summaries.record_removed(db, record)
         db.commit()
         return True
     return False
@@ -62,4 +73,87 @@ def create_sensor_reading(db: Session, reading: SensorReadingCreate):
     db.add(new_reading)
     db.commit()
     db.refresh(new_reading)
-    return new_reading
\ No newline at end of file
+    return new_reading
+
+# Bulk insert sensor readings (one multi-row INSERT + rollup upsert, one commit), then alerts they raise
+def create_sensor_readings(db: Session, readings: list[dict]):
+    if not readings:
+        return 0
+    now = datetime.utcnow()
+    for reading in readings:
+        if reading.get("timestamp") is None:
+            reading["timestamp"] = now
+    db.execute(models.SensorReading.__table__.insert(), readings)
+    rollups.apply_readings(db, readings)
+    db.commit()
+    if alerts.ALERTS_ENABLED:
+        alerts.observe_committed(db, readings)
+    return len(readings)
+
+# Store PPG windows and the sensor readings derived from them in one transaction
+def create_ppg_windows(db: Session, windows: list[dict], readings: list[dict]):
+    if windows:
+        db.execute(models.PpgWindow.__table__.insert(), windows)
+    if readings:
+        create_sensor_readings(db, readings)
+    else:
+        db.commit()
+    return len(windows)
+
+def get_ppg_window(db: Session, window_id: int):
+    return db.query(models.PpgWindow).filter(models.PpgWindow.id == window_id).first()
+
+# One page of a user's sensor readings, newest first, keyset-paginated on (timestamp, id)
+def get_sensor_readings_page(db: Session, user_id: int, since=None, until=None, limit: int = 100, after=None):
+    SR = models.SensorReading
+    query = db.query(SR.id, SR.user_id, SR.heart_rate, SR.spo2, SR.ir, SR.red, SR.timestamp).filter(SR.user_id == user_id)
+    if since is not None:
+        query = query.filter(SR.timestamp >= since)
+    if until is not None:
+        query = query.filter(SR.timestamp < until)
+    if after is not None:
+        ts, row_id = after
+        query = query.filter(or_(SR.timestamp < ts, and_(SR.timestamp == ts, SR.id < row_id)))
+    rows = query.order_by(SR.timestamp.desc(), SR.id.desc()).limit(limit + 1).all()
+    rows = _merge_archived("sensor_readings", user_id, rows, since, until, after, limit)
+    # Fetching one extra row tells us whether another page exists
+    return rows[:limit], len(rows) > limit
+
+# One page of a patient's health records, newest first, keyset-paginated on (timestamp, id)
+def get_health_records_page(db: Session, patient_id: int, since=None, until=None, limit: int = 100, after=None):
+    HR = models.HealthRecord
+    query = db.query(
+        HR.id, HR.patient_id, HR.heart_rate, HR.spo2, HR.glucose, HR.temperature, HR.status, HR.timestamp
+    ).filter(HR.patient_id == patient_id)
+    if since is not None:
+        query = query.filter(HR.timestamp >= since)
+    if until is not None:
+        query = query.filter(HR.timestamp < until)
+    if after is not None:
+        ts, row_id = after
+        query = query.filter(or_(HR.timestamp < ts, and_(HR.timestamp == ts, HR.id < row_id)))
+    rows = query.order_by(HR.timestamp.desc(), HR.id.desc()).limit(limit + 1).all()
+    rows = _merge_archived("health_records", patient_id, rows, since, until, after, limit)
+    return rows[:limit], len(rows) > limit
+
+# One page of a user's alerts, newest first, keyset-paginated on (timestamp, id)
+def get_alerts_page(db: Session, user_id: int, since=None, until=None, limit: int = 100, after=None):
+    A = models.Alert
+    query = db.query(A).filter(A.user_id == user_id)
+    if since is not None:
+        query = query.filter(A.timestamp >= since)
+    if until is not None:
+        query = query.filter(A.timestamp < until)
+    if after is not None:
+        ts, row_id = after
+        query = query.filter(or_(A.timestamp < ts, and_(A.timestamp == ts, A.id < row_id)))
+    rows = query.order_by(A.timestamp.desc(), A.id.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+# Pages that reach past the archive watermark also read the owner's archive files (see retention.py)
+def _merge_archived(table: str, owner_id: int, rows, since, until, after, limit: int):
+    oldest_bound = rows[-1].timestamp if len(rows) > limit else since
+    if not retention.needs_archive(table, oldest_bound):
+        return rows
+    archived = retention.read_archive(table, owner_id, since, until, after, limit + 1)
+    return retention.merge_newest_first(rows, archived, limit + 1)
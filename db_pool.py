@@ -0,0 +1,117 @@
+"""Instrumented connection pool shared by the FastAPI engine and the Flask service.
+
+InstrumentedQueuePool is SQLAlchemy's QueuePool plus counters for how many
+checkouts had to wait for a free connection and how long they waited.
+
+Pool knobs (environment variables, used by both services):
+    DB_POOL_SIZE       connections kept open
+    DB_MAX_OVERFLOW    extra connections allowed under burst load
+    DB_POOL_TIMEOUT    seconds to wait for a connection before failing
+    DB_POOL_RECYCLE    seconds after which a connection is replaced
+    DB_POOL_PRE_PING   1 = check a connection is alive before handing it out
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+
+def pool_options() -> dict:
+    """Keyword arguments for create_engine built from the DB_POOL_* settings."""
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record(self, elapsed: float, waited: bool, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_time_total += elapsed
+                self.wait_time_max = max(self.wait_time_max, elapsed)
+            if timed_out:
+                self.timeouts += 1
+
+
+class InstrumentedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats  # keep counting across engine.dispose()
+        return pool
+
+    def _do_get(self):
+        # Every connection (pooled and overflow) is in use: this checkout will block
+        waited = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        started = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, True, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started, waited)
+        return entry
+
+    def snapshot(self) -> dict:
+        stats = self.stats
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            "checkouts": stats.checkouts,
+            "waits": stats.waits,
+            "timeouts": stats.timeouts,
+            "wait_time_total_ms": round(stats.wait_time_total * 1000, 3),
+            "wait_time_max_ms": round(stats.wait_time_max * 1000, 3),
+        }
+
+
+def create_dbapi_pool(creator, ping=None) -> InstrumentedQueuePool:
+    """Pool around a plain DB-API connect function (no SQLAlchemy engine).
+
+    ping(dbapi_connection) is called on checkout when DB_POOL_PRE_PING is on;
+    if it raises, the connection is discarded and a fresh one is opened.
+    """
+    pool = InstrumentedQueuePool(
+        creator,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        timeout=DB_POOL_TIMEOUT,
+        recycle=DB_POOL_RECYCLE,
+    )
+    if ping is not None and DB_POOL_PRE_PING:
+        @event.listens_for(pool, "checkout")
+        def _ping(dbapi_connection, connection_record, connection_proxy):
+            try:
+                ping(dbapi_connection)
+            except Exception:
+                raise exc.DisconnectionError()
+    return pool
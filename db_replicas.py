@@ -0,0 +1,238 @@
+"""Read replicas for database.py: round-robin read sessions with lag checks.
+
+DATABASE_REPLICA_URLS lists replica databases (comma-separated URLs in the
+same form as DATABASE_URL). Writes, auth and anything that must see its own
+writes keep using get_db (the primary); GET endpoints that only read use
+get_read_db, which hands out a session on the next healthy replica in turn.
+
+A background thread checks every replica each REPLICA_CHECK_INTERVAL_SECONDS
+and measures its replication lag:
+
+  * MySQL: Seconds_Behind_Source from SHOW REPLICA STATUS (SHOW SLAVE STATUS
+    before 8.0.22); NULL there means replication is stopped;
+  * PostgreSQL: now() - pg_last_xact_replay_timestamp() on a standby, 0 when
+    it has replayed everything it received;
+  * REPLICA_LAG_QUERY, if set, replaces both (e.g. a heartbeat table:
+    SELECT TIMESTAMPDIFF(SECOND, MAX(ts), UTC_TIMESTAMP()) FROM heartbeat).
+
+A replica that fails the check or lags more than REPLICA_MAX_LAG_SECONDS is
+skipped until a later check passes; with none left, reads fall back to the
+primary. Replicas are only used after their first successful check.
+
+Read-your-writes: a request that commits on the primary gets a last_write
+cookie and an X-Last-Write header (epoch seconds). For the next
+READ_YOUR_WRITES_SECONDS a request carrying either one reads from the
+primary, so a client sees its own writes even while replicas catch up.
+Keep it above REPLICA_MAX_LAG_SECONDS.
+
+Knobs (environment variables):
+    DATABASE_REPLICA_URLS            replica URLs, comma-separated (unset = primary only)
+    REPLICA_MAX_LAG_SECONDS          lag above which a replica is skipped
+    REPLICA_CHECK_INTERVAL_SECONDS   seconds between health/lag checks
+    REPLICA_LAG_QUERY                custom SQL returning the lag in seconds
+    READ_YOUR_WRITES_SECONDS         how long a writer's reads stay on the primary
+"""
+import contextvars
+import itertools
+import os
+import threading
+import time
+from http.cookies import SimpleCookie
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+import logs
+import metrics
+
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "2"))
+REPLICA_LAG_QUERY = os.getenv("REPLICA_LAG_QUERY", "")
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+logger = logs.get_logger("db")
+
+read_sessions = metrics.register(metrics.Counter(
+    "db_read_sessions_total", "Read-only sessions by database and the reason it was chosen", ("target", "reason")))
+
+# Background threads don't survive fork(); the checker restarts in every child
+_fork_generation = 0
+
+
+def _after_fork():
+    global _fork_generation
+    _fork_generation += 1
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def measure_lag(conn) -> float:
+    """Replication lag of the database behind conn, in seconds (inf = not replicating)."""
+    if REPLICA_LAG_QUERY:
+        lag = conn.exec_driver_sql(REPLICA_LAG_QUERY).scalar()
+        return float("inf") if lag is None else float(lag)
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        for statement, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                                  ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+            try:
+                row = conn.exec_driver_sql(statement).mappings().first()
+            except Exception:
+                continue
+            if row is None:
+                return 0.0  # not configured as a replica: nothing to lag behind
+            return float("inf") if row[column] is None else float(row[column])
+        raise RuntimeError("replica status is not readable (needs REPLICATION CLIENT)")
+    if dialect == "postgresql":
+        return float(conn.exec_driver_sql(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+            "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        ).scalar())
+    conn.exec_driver_sql("SELECT 1")
+    return 0.0
+
+
+class Replica:
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+        self.last_error = None
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                lag = measure_lag(conn)
+        except Exception as e:
+            if self.healthy or self.checked_at is None:
+                logger.warning("⚠️ Replica %s check failed, reading from the others: %s", self.name, e)
+            self.healthy, self.lag, self.last_error = False, None, str(e)
+        else:
+            healthy = lag <= REPLICA_MAX_LAG_SECONDS
+            if healthy != self.healthy:
+                if healthy:
+                    logger.info("✅ Replica %s in rotation (lag %.1fs)", self.name, lag)
+                else:
+                    logger.warning("⚠️ Replica %s lags %.1fs, out of rotation", self.name, lag)
+            self.healthy, self.lag, self.last_error = healthy, lag, None
+        self.checked_at = time.time()
+
+    def stats(self) -> dict:
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "checked_at": self.checked_at,
+            "last_error": self.last_error,
+        }
+
+
+class ReplicaSet:
+    """Replicas handed out round-robin, skipping the ones that failed their last check."""
+
+    def __init__(self, engines):
+        self.replicas = [Replica(f"replica{i}", e) for i, e in enumerate(engines, start=1)]
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._generation = None
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def pick(self):
+        """The next healthy replica, or None."""
+        if self._generation != _fork_generation:
+            self._start()
+        n = len(self.replicas)
+        start = next(self._next)
+        for i in range(n):
+            replica = self.replicas[(start + i) % n]
+            if replica.healthy:
+                return replica
+        return None
+
+    def check(self):
+        for replica in self.replicas:
+            replica.check()
+
+    def _start(self):
+        with self._lock:
+            if self._generation == _fork_generation:
+                return
+            self._generation = _fork_generation
+            threading.Thread(target=self._run, name="db-replica-checker", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.check()
+            time.sleep(REPLICA_CHECK_INTERVAL_SECONDS)
+
+    def stats(self) -> dict:
+        return {r.name: r.stats() for r in self.replicas}
+
+
+def parse_last_write(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def wrote_recently(last_write) -> bool:
+    return last_write is not None and time.time() - last_write < READ_YOUR_WRITES_SECONDS
+
+
+# Set to [commit time or None] by ReadYourWritesMiddleware while a request is served
+_request_write = contextvars.ContextVar("request_write", default=None)
+
+
+def track_writes(engine):
+    """Note commits on the primary made while serving a request."""
+    @event.listens_for(engine, "commit")
+    def _on_commit(conn):
+        current = _request_write.get()
+        if current is not None:
+            current[0] = time.time()
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware stamping responses of requests that committed on the primary."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        written = [None]
+        token = _request_write.set(written)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and written[0] is not None:
+                stamp = f"{written[0]:.3f}"
+                cookie = SimpleCookie()
+                cookie[LAST_WRITE_COOKIE] = stamp
+                cookie[LAST_WRITE_COOKIE]["max-age"] = int(READ_YOUR_WRITES_SECONDS) + 1
+                cookie[LAST_WRITE_COOKIE]["path"] = "/"
+                cookie[LAST_WRITE_COOKIE]["samesite"] = "Lax"
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.output(header="").strip().encode()),
+                    (LAST_WRITE_HEADER.lower().encode(), stamp.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_write.reset(token)
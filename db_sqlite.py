@@ -0,0 +1,122 @@
+"""SQLite edge mode: WAL journaling, tuned pragmas and a single writer.
+
+Bedside gateways have no MySQL server, so database.py can run on a local
+SQLite file instead (DATABASE_URL=sqlite:////var/lib/latestback/edge.db;
+create the schema once with python init_db.py).
+SQLite allows one writer at a time; with many threads writing, deferred
+transactions that try to upgrade to a write lock fail with "database is
+locked" even with a busy timeout. So this mode uses two engines on the
+same file:
+
+  * a read engine (normal pool) whose transactions are plain deferred
+    BEGINs; under WAL, readers never block the writer or each other;
+  * a write engine with exactly one connection whose transactions start
+    with BEGIN IMMEDIATE. Writers queue for that connection in the pool
+    (DB_POOL_TIMEOUT), not in SQLite's busy handler.
+
+RoutingSession sends a session's flushes and INSERT/UPDATE/DELETE
+statements to the write engine and keeps using it until the transaction
+ends, so the rest of that transaction reads its own writes.
+
+Knobs (environment variables):
+    SQLITE_WAL               1 = journal_mode=WAL (default), 0 = leave as is
+    SQLITE_SYNCHRONOUS       OFF / NORMAL / FULL (NORMAL is durable enough with WAL)
+    SQLITE_CACHE_SIZE_KB     page cache per connection
+    SQLITE_MMAP_SIZE         bytes of the file to memory-map (0 = off)
+    SQLITE_BUSY_TIMEOUT_MS   how long a connection waits on a lock
+    SQLITE_SINGLE_WRITER     1 = separate one-connection write engine (default)
+"""
+import os
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SINGLE_WRITER = os.getenv("SQLITE_SINGLE_WRITER", "1") == "1"
+
+if SQLITE_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"SQLITE_SYNCHRONOUS must be OFF, NORMAL, FULL or EXTRA, not {SQLITE_SYNCHRONOUS!r}")
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def is_memory(url: str) -> bool:
+    # sqlite://, sqlite:///:memory: and file::memory: URIs are private per connection
+    return url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:") or ":memory:" in url or "mode=memory" in url
+
+
+def connect_args() -> dict:
+    # Connections are shared across the threadpool and the ingest writer
+    return {"check_same_thread": False}
+
+
+def configure_engine(engine, immediate: bool = False):
+    """Apply the pragmas on every new connection and take over transaction BEGIN.
+
+    pysqlite emits its own BEGIN lazily (and not before SELECTs), which breaks
+    SAVEPOINTs and makes BEGIN IMMEDIATE impossible. Turning that off and
+    emitting BEGIN from the engine's "begin" event is the workaround from the
+    SQLAlchemy SQLite dialect docs.
+    """
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            if SQLITE_WAL and not is_memory(str(engine.url)):
+                cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            # Negative cache_size is in KiB rather than pages
+            cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+    return engine
+
+
+def pragmas(engine) -> dict:
+    """Current values of the tuned pragmas on one pooled connection."""
+    names = ("journal_mode", "synchronous", "cache_size", "mmap_size", "busy_timeout", "foreign_keys")
+    with engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
+
+
+class RoutingSession(Session):
+    """Session that writes through the single-connection write engine.
+
+    sessionmaker(bind=read_engine, class_=RoutingSession, write_bind=write_engine);
+    with no write_bind every statement goes to the normal bind.
+    """
+
+    def __init__(self, *args, write_bind=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.write_bind = write_bind
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.write_bind is not None:
+            if self.info.get("writing") or self._flushing or isinstance(clause, UpdateBase):
+                self.info["writing"] = True
+                return self.write_bind
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _release_writer(session, transaction):
+    # Outermost transaction over: the next one starts back on the read engine
+    if transaction.parent is None:
+        session.info.pop("writing", None)
@@ -0,0 +1,57 @@
+"""Export risk_model.pkl + label_encoder.pkl to the lightweight JSON artifact.
+
+    python export_model.py                      # writes risk_model.json
+    python export_model.py --output other.json
+
+The export is refused unless the artifact reproduces sklearn's labels on
+a grid covering the plausible input range. The lookup table for the new
+artifact (risk_table.npz) is built and checked cell by cell at the same time.
+"""
+import argparse
+
+import joblib
+import numpy as np
+
+import risk_table
+from risk_engine import LinearRiskModel, RISK_ENCODER_PKL, RISK_MODEL_ARTIFACT, RISK_MODEL_PKL, file_digest
+
+
+def verification_inputs() -> np.ndarray:
+    grid = np.mgrid[30:221:2, 50:101, 0:121:3].reshape(3, -1).T
+    rng = np.random.default_rng(0)
+    noise = rng.uniform([0, 0, 0], [250, 100, 130], size=(20000, 3))
+    return np.vstack([grid, noise]).astype(np.float64)
+
+
+def export(model_path: str = RISK_MODEL_PKL, encoder_path: str = RISK_ENCODER_PKL,
+           output: str = RISK_MODEL_ARTIFACT) -> LinearRiskModel:
+    model = joblib.load(model_path)
+    encoder = joblib.load(encoder_path)
+    compiled = LinearRiskModel.from_sklearn(model, encoder)
+
+    X = verification_inputs()
+    expected = encoder.inverse_transform(model.predict(X))
+    batch = compiled.predict(X)
+    single = [compiled.predict_one(*row) for row in X[::50]]
+    if not (batch == expected).all() or list(expected[::50]) != single:
+        raise RuntimeError("Exported risk model does not reproduce sklearn predictions")
+
+    compiled.save(output)
+    print(f"✅ Exported {model_path} + {encoder_path} -> {output} ({len(X)} inputs verified)")
+
+    table = risk_table.RiskLookupTable.build(compiled, file_digest(output))
+    if not table.verify(compiled, single=True):
+        raise RuntimeError("Risk lookup table does not match the exported model")
+    table.save(risk_table.RISK_TABLE_PATH)
+    print(f"✅ Lookup table for {output} -> {risk_table.RISK_TABLE_PATH}")
+    return compiled
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the risk model to a sklearn-free artifact")
+    parser.add_argument("--model", default=RISK_MODEL_PKL)
+    parser.add_argument("--encoder", default=RISK_ENCODER_PKL)
+    parser.add_argument("--output", default=RISK_MODEL_ARTIFACT)
+    args = parser.parse_args()
+
+    export(args.model, args.encoder, args.output)
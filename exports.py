@@ -0,0 +1,144 @@
+"""Streaming bulk export of sensor_readings / health_records as NDJSON or CSV.
+
+Rows are read in ascending (timestamp, id) order through a server-side
+cursor and fetched in EXPORT_CHUNK_SIZE partitions, so memory stays flat and
+the first bytes go out as soon as the first partition arrives. Every row
+carries the keyset cursor of its position; passing the last one received
+back as ?cursor= resumes an interrupted export right after that row.
+
+Exports that reach past the archive watermark (see retention.py) also read
+the owner's archive files, a month at a time, merged in (timestamp, id)
+order with the hot rows.
+"""
+import csv
+import heapq
+import io
+import itertools
+import json
+import os
+import zlib
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+
+import models
+import retention
+from utils import encode_cursor
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+EXPORTS = {
+    "sensor_readings": (
+        models.SensorReading,
+        "user_id",
+        ["id", "user_id", "heart_rate", "spo2", "ir", "red", "timestamp"],
+    ),
+    "health_records": (
+        models.HealthRecord,
+        "patient_id",
+        ["id", "patient_id", "heart_rate", "spo2", "glucose", "temperature", "status", "timestamp"],
+    ),
+}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _hot_partitions(session_factory, kind, owner_id, since, until, after, chunk_size):
+    model, owner_column, columns = EXPORTS[kind]
+    stmt = select(*[getattr(model, c) for c in columns]).where(getattr(model, owner_column) == owner_id)
+    if since is not None:
+        stmt = stmt.where(model.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(model.timestamp < until)
+    if after is not None:
+        ts, row_id = after
+        stmt = stmt.where(or_(model.timestamp > ts, and_(model.timestamp == ts, model.id > row_id)))
+    stmt = stmt.order_by(model.timestamp, model.id).execution_options(stream_results=True)
+
+    # The export owns its session: it outlives the request handler
+    db = session_factory()
+    try:
+        for rows in db.execute(stmt).partitions(chunk_size):
+            yield rows
+    finally:
+        db.close()
+
+
+def _row_key(row):
+    # NULL timestamps sort first, as they do in the ORDER BY
+    return (row.timestamp or datetime.min, row.id)
+
+
+def _partitions(session_factory, kind, owner_id, since, until, after, chunk_size):
+    hot = _hot_partitions(session_factory, kind, owner_id, since, until, after, chunk_size)
+    if not retention.needs_archive(kind, since):
+        yield from hot
+        return
+    # Archived rows are namedtuples with the same fields, in the same order, as the export columns
+    archived = itertools.chain.from_iterable(retention.iter_archive(kind, owner_id, since, until, after))
+    merged = heapq.merge(archived, itertools.chain.from_iterable(hot), key=_row_key)
+    try:
+        chunk, last = [], None
+        for row in merged:
+            # An interrupted archive run leaves rows in both places
+            if last is not None and _row_key(row) == last:
+                continue
+            last = _row_key(row)
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        hot.close()
+
+
+def _records(rows, columns):
+    for row in rows:
+        record = dict(zip(columns, row))
+        ts = record["timestamp"]
+        record["cursor"] = encode_cursor(ts, record["id"]) if ts is not None else None
+        record["timestamp"] = ts.isoformat() if ts is not None else None
+        yield record
+
+
+def _ndjson(partitions, columns):
+    for rows in partitions:
+        yield "".join(json.dumps(record) + "\n" for record in _records(rows, columns)).encode()
+
+
+def _csv(partitions, columns):
+    fieldnames = columns + ["cursor"]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    yield buffer.getvalue().encode()
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_records(rows, columns))
+        yield buffer.getvalue().encode()
+
+
+def _gzip(chunks):
+    # Sync-flush after every partition so clients can decode as data arrives
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def stream_export(session_factory, kind: str, owner_id: int, fmt: str = "ndjson",
+                  since=None, until=None, after=None, gzip: bool = False,
+                  chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Return (byte iterator, media type, filename) for one owner's rows."""
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    columns = EXPORTS[kind][2]
+    partitions = _partitions(session_factory, kind, owner_id, since, until, after, chunk_size)
+    body = _ndjson(partitions, columns) if fmt == "ndjson" else _csv(partitions, columns)
+    filename = f"{kind}_{owner_id}.{fmt}"
+    if gzip:
+        return _gzip(body), "application/gzip", filename + ".gz"
+    return body, MEDIA_TYPES[fmt], filename
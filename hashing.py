@@ -0,0 +1,108 @@
+"""bcrypt hashing/verification off the request path.
+
+bcrypt costs ~100-300 ms of CPU per call. Running it inline lets a login
+burst (shift change) starve sensor ingestion, so every hash/verify goes to a
+small dedicated process pool. At most PASSWORD_HASH_QUEUE operations may be
+running or waiting at once; beyond that callers get PasswordHashingBusy,
+which the routes turn into a 503.
+
+Knobs (environment variables):
+    PASSWORD_HASH_WORKERS   processes in the pool (0 = hash inline, no pool)
+    PASSWORD_HASH_QUEUE     max in-flight + queued operations
+    PASSWORD_HASH_TIMEOUT   seconds to wait for a result
+    BCRYPT_ROUNDS           cost factor; hashes with any other cost are
+                            re-hashed transparently on the next successful login
+"""
+import concurrent.futures
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# min == max == default, so a hash with any other cost reports needs_update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class PasswordHashingBusy(Exception):
+    """Too many password operations in flight; retry later."""
+
+
+# Worker-side functions (module level so they can be sent to the pool)
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _executor
+
+
+def _submit(fn, *args):
+    """Future for fn(*args) on the pool; raises PasswordHashingBusy when saturated."""
+    if not _slots.acquire(blocking=False):
+        raise PasswordHashingBusy()
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def _run(fn, *args):
+    if PASSWORD_HASH_WORKERS <= 0:
+        return fn(*args)
+    try:
+        return _submit(fn, *args).result(timeout=PASSWORD_HASH_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        raise PasswordHashingBusy()
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash, password)
+
+
+def verify_and_update(password: str, hashed: str):
+    """(valid, new_hash); new_hash is set when the stored hash should be replaced."""
+    if not hashed:
+        return False, None
+    if isinstance(hashed, bytes):
+        hashed = hashed.decode()
+    return _run(_verify_and_update, password, hashed)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return verify_and_update(password, hashed)[0]
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,164 @@
+"""Write-behind buffer for sensor readings.
+
+Readings are accepted into a bounded in-process queue and a background
+thread group-commits them every INGEST_BATCH_SIZE rows or
+INGEST_FLUSH_INTERVAL_MS milliseconds, whichever comes first.
+
+Knobs (environment variables):
+    INGEST_BUFFER_ENABLED      1 = queue and ack immediately, 0 = commit per request
+    INGEST_BATCH_SIZE          max rows per commit
+    INGEST_FLUSH_INTERVAL_MS   max time a reading waits before being committed
+    INGEST_MAX_QUEUE           queued readings before callers get backpressure (503)
+    INGEST_MAX_RETRIES         attempts per batch before it is dropped
+"""
+import os
+import queue
+import threading
+import time
+
+import crud
+import logs
+
+logger = logs.get_logger("ingest")
+
+INGEST_BUFFER_ENABLED = os.getenv("INGEST_BUFFER_ENABLED", "1") == "1"
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL_MS = int(os.getenv("INGEST_FLUSH_INTERVAL_MS", "200"))
+INGEST_MAX_QUEUE = int(os.getenv("INGEST_MAX_QUEUE", "20000"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+
+
+class IngestQueueFull(Exception):
+    """Raised when the buffer is at capacity and the caller should retry later."""
+
+
+class IngestStopped(Exception):
+    """Raised when the writer isn't running (not started yet, or shutting down)."""
+
+
+class IngestBuffer:
+    def __init__(
+        self,
+        session_factory,
+        writer=crud.create_sensor_readings,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval_ms: int = INGEST_FLUSH_INTERVAL_MS,
+        max_queue: int = INGEST_MAX_QUEUE,
+        max_retries: int = INGEST_MAX_RETRIES,
+    ):
+        self.session_factory = session_factory
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._submit_lock = threading.Lock()
+        self._thread = None
+
+        self.committed = 0
+        self.batches = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30):
+        """Stop accepting work and flush everything still queued."""
+        # Under the submit lock, so no reading is queued after the writer's last check
+        with self._submit_lock:
+            self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, row: dict):
+        """Queue one reading without blocking.
+
+        Raises IngestQueueFull when at capacity, IngestStopped when nothing
+        would write it (the caller should store it synchronously instead).
+        """
+        with self._submit_lock:
+            if self._stopping.is_set() or not self.running:
+                raise IngestStopped()
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.rejected += 1
+                raise IngestQueueFull()
+
+    def flush(self):
+        """Block until every reading queued so far has been written (or dropped)."""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": INGEST_BUFFER_ENABLED,
+            "running": self.running,
+            "depth": self.depth(),
+            "capacity": self._queue.maxsize,
+            "committed": self.committed,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+        }
+
+    def _next_batch(self) -> list:
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if self._stopping.is_set() or remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        for attempt in range(1, self.max_retries + 1):
+            db = self.session_factory()
+            try:
+                self.writer(db, batch)
+                self.committed += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                db.rollback()
+                logger.error("❌ Ingest batch of %d failed (attempt %d/%d): %s", len(batch), attempt, self.max_retries, e)
+                if attempt < self.max_retries:
+                    time.sleep(min(0.1 * 2 ** attempt, 5))
+            finally:
+                db.close()
+        self.dropped += len(batch)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._write(batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+            elif self._stopping.is_set() and self._queue.empty():
+                return
@@ -0,0 +1,67 @@
+"""Create the database schema: missing tables, plus indexes added to existing ones.
+
+The API no longer runs create_all when it is imported, so a worker start
+does no DDL and doesn't depend on the database being reachable. Run this
+once per deploy (and once before the first start of an edge gateway):
+
+    python init_db.py           # create what is missing
+    python init_db.py --check   # only report; exit status 1 if anything is missing
+
+create_all only creates whole tables, so indexes declared on tables that
+already exist (e.g. ix_health_records_patient_ts) are created here too.
+"""
+import argparse
+import sys
+
+from sqlalchemy import inspect
+
+import models  # noqa: F401 (registers every table on Base.metadata)
+from database import Base, engine
+
+
+def missing(bind=engine) -> list:
+    """[(kind, name)] of the tables and indexes the database doesn't have yet."""
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    out = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            out.append(("table", table.name))
+            continue
+        indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        out.extend(("index", ix.name) for ix in sorted(table.indexes, key=lambda ix: ix.name) if ix.name not in indexes)
+    return out
+
+
+def init_db(bind=engine) -> list:
+    """Create the missing tables and indexes; returns what was created."""
+    todo = missing(bind)
+    Base.metadata.create_all(bind=bind)
+    new_tables = {name for kind, name in todo if kind == "table"}
+    for table in Base.metadata.sorted_tables:
+        if table.name not in new_tables:
+            for index in table.indexes:
+                index.create(bind=bind, checkfirst=True)
+    return todo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create missing tables and indexes")
+    parser.add_argument("--check", action="store_true", help="report what is missing without changing anything")
+    args = parser.parse_args()
+
+    if args.check:
+        todo = missing()
+        for kind, name in todo:
+            print(f"missing {kind}: {name}")
+        print("✅ Schema is up to date" if not todo else f"⚠️ {len(todo)} schema objects missing")
+        sys.exit(1 if todo else 0)
+
+    created = init_db()
+    for kind, name in created:
+        print(f"created {kind}: {name}")
+    print(f"✅ {len(created)} schema objects created" if created else "✅ Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
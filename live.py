@@ -0,0 +1,139 @@
+"""In-process pub/sub for live vitals (WebSocket and Server-Sent Events).
+
+Ingestion calls live_hub.publish() for every accepted reading. The hub keeps
+the latest event per user, so a new subscriber gets the current vitals
+immediately, and fans each event out to that user's subscribers on the
+app's event loop. Events are serialized to JSON once per publish, not once
+per subscriber. Each subscriber has a small bounded queue; a client that
+falls behind loses its oldest events instead of growing memory.
+
+The latest events are an LRU of at most LIVE_LATEST_SIZE users, and an
+event older than LIVE_LATEST_TTL seconds is no longer replayed (those are
+not current vitals any more).
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "32"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+LIVE_LATEST_SIZE = int(os.getenv("LIVE_LATEST_SIZE", "10000"))
+LIVE_LATEST_TTL = float(os.getenv("LIVE_LATEST_TTL", "300"))
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class Subscription:
+    def __init__(self, hub, user_ids, queue_size: int):
+        self.hub = hub
+        self.user_ids = set(user_ids)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def push(self, message: str):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: float = None):
+        """Next JSON message, or None if nothing arrived within timeout."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class LiveHub:
+    def __init__(self, queue_size: int = LIVE_QUEUE_SIZE,
+                 latest_size: int = LIVE_LATEST_SIZE, latest_ttl: float = LIVE_LATEST_TTL):
+        self.queue_size = queue_size
+        self.latest_size = latest_size
+        self.latest_ttl = latest_ttl
+        self._latest = OrderedDict()   # user_id -> (message, expires_at)
+        self._latest_lock = threading.Lock()
+        self._subscribers = {}
+        self._loop = None
+        self._loop_thread = None
+        self.published = 0
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Deliver events on this loop (call from the app's startup hook)."""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def publish(self, user_id: int, event: dict, remember: bool = True):
+        """Record and fan out an event. Safe to call from any thread.
+
+        remember=False events (alerts) are not replayed to new subscribers,
+        which start from the latest vitals.
+        """
+        message = json.dumps(event, default=_default)
+        if remember:
+            with self._latest_lock:
+                self._latest[user_id] = (message, time.monotonic() + self.latest_ttl)
+                self._latest.move_to_end(user_id)
+                while len(self._latest) > self.latest_size:
+                    self._latest.popitem(last=False)
+        self.published += 1
+        if self._loop is None or user_id not in self._subscribers:
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._fanout(user_id, message)
+        else:
+            self._loop.call_soon_threadsafe(self._fanout, user_id, message)
+
+    def _fanout(self, user_id: int, message: str):
+        for subscription in self._subscribers.get(user_id, ()):
+            subscription.push(message)
+
+    def latest(self, user_id: int):
+        with self._latest_lock:
+            entry = self._latest.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._latest[user_id]
+                return None
+            return entry[0]
+
+    def subscribe(self, user_ids) -> Subscription:
+        """Register a subscriber (on the event loop); it starts with the latest events."""
+        subscription = Subscription(self, user_ids, self.queue_size)
+        for user_id in subscription.user_ids:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            message = self.latest(user_id)
+            if message is not None:
+                subscription.push(message)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for user_id in subscription.user_ids:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[user_id]
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "users_cached": len(self._latest),
+            "users_subscribed": len(self._subscribers),
+            "subscriptions": len({id(s) for subs in self._subscribers.values() for s in subs}),
+        }
+
+
+live_hub = LiveHub()
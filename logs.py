@@ -0,0 +1,34 @@
+"""Leveled, sampled logging for the request path.
+
+Per-request messages ("📥 Incoming sensor data") are DEBUG and additionally
+sampled, so a busy ingest route doesn't pay for console output on every
+call; errors are always logged.
+
+Knobs (environment variables):
+    LOG_LEVEL          DEBUG / INFO / WARNING / ERROR (default INFO)
+    LOG_SAMPLE_RATE    fraction of per-request debug messages kept (default 0.01)
+"""
+import logging
+import os
+import random
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+_configured = False
+
+
+def configure():
+    global _configured
+    if not _configured:
+        logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"latestback.{name}")
+
+
+def sampled(logger: logging.Logger, level: int = logging.DEBUG, rate: float = LOG_SAMPLE_RATE) -> bool:
+    """True if a per-request message at `level` should be emitted this time."""
+    return logger.isEnabledFor(level) and (rate >= 1 or random.random() < rate)
@@ -1,9 +1,14 @@
-from fastapi import FastAPI, Depends, HTTPException, Security
+from fastapi import FastAPI, Depends, HTTPException, Security, Body, Query, WebSocket, WebSocketDisconnect
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from schemas import UserLogin
-import models, schemas, crud, utils
-from database import SessionLocal, engine, Base
+import models, schemas, crud, utils, ingest, exports, rollups, hashing, metrics, logs, sensor_codec, ppg, alerts, summaries, db_replicas
+import asyncio
+import json
+import numpy as np
+from live import live_hub, LIVE_HEARTBEAT_SECONDS
+from token_cache import token_cache, user_cache
+from database import SessionLocal, engine, write_engine, replicas
 from fastapi.middleware.cors import CORSMiddleware
 from models import User
 from utils import verify_password, create_access_token
@@ -11,31 +16,101 @@ from schemas import UserCreate
 from auth import router as auth_router
 from schemas import UserCreate, UserOut
 from utils import hash_password
-from datetime import datetime
-from database import get_db
+from datetime import datetime, timedelta, timezone
+from database import get_db, get_read_db, read_session_factory, last_write_of, pool_stats
 from models import SensorReading
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from schemas import SensorReadingCreate
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.requests import Request
 from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import ListError
+from typing import List, Optional
 
 
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+logs.configure()
+logger = logs.get_logger("api")
+
+# Tables are created by `python init_db.py`, not on import (no DDL or DB round trip at worker start)
+
+# SQL statement counts/latency for /metrics
+metrics.instrument_engine(engine)
+if write_engine is not engine:
+    metrics.instrument_engine(write_engine)
+for replica in replicas.replicas:
+    metrics.instrument_engine(replica.engine)
 
 app = FastAPI()
 app.include_router(auth_router)
 
+# Write-behind buffer for /sensor-readings (see ingest.py for knobs)
+ingest_buffer = ingest.IngestBuffer(SessionLocal)
+
+@app.on_event("startup")
+def load_risk_models():
+    # Before the first request rather than during it; a no-op when serve.py's parent already loaded them
+    utils.load_models()
+
+@app.on_event("startup")
+def start_ingest_buffer():
+    if ingest.INGEST_BUFFER_ENABLED:
+        ingest_buffer.start()
+
+@app.on_event("startup")
+async def bind_live_hub():
+    # Live vitals are fanned out to subscribers on this loop
+    live_hub.bind_loop(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+def stop_ingest_buffer():
+    # Flush whatever is still queued before the worker exits
+    ingest_buffer.stop()
+
+@app.on_event("shutdown")
+def stop_password_pool():
+    hashing.shutdown()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins (e.g., http://127.0.0.1:5500). For production, restrict to specific domains.
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", db_replicas.LAST_WRITE_HEADER],
 )
 
+# Marks responses of requests that wrote, so their next reads stay on the primary
+if replicas:
+    app.add_middleware(db_replicas.ReadYourWritesMiddleware)
+
+# Outermost, so preflights and errors are timed too
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Gauges read at scrape time
+def _pool_gauge(key):
+    def read():
+        stats = pool_stats()
+        values = {("main",): stats.get(key)}
+        if "writer" in stats:
+            values[("writer",)] = stats["writer"].get(key)
+        for name, replica_stats in stats.get("replicas", {}).items():
+            values[(name,)] = replica_stats.get(key)
+        return values
+    return read
+
+metrics.gauge("ingest_queue_depth", "Readings waiting in the write-behind buffer", lambda: ingest_buffer.depth())
+metrics.gauge("db_pool_size", "Connections kept open by the pool", _pool_gauge("size"), ("pool",))
+metrics.gauge("db_pool_checked_out", "Connections currently in use", _pool_gauge("checked_out"), ("pool",))
+metrics.gauge("db_pool_waits_total", "Checkouts that had to wait for a connection", _pool_gauge("waits"), ("pool",))
+metrics.gauge("db_pool_timeouts_total", "Checkouts that gave up waiting", _pool_gauge("timeouts"), ("pool",))
+metrics.gauge("db_replica_lag_seconds", "Replication lag measured by the last replica check",
+              lambda: {(r.name,): r.lag for r in replicas.replicas}, ("replica",))
+metrics.gauge("db_replica_healthy", "1 if the replica is in the read rotation",
+              lambda: {(r.name,): int(r.healthy) for r in replicas.replicas}, ("replica",))
+
 # Dependency
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -46,12 +121,96 @@ class SensorReadingCreate(BaseModel):
     ir: int
     red: int
 
+# Timestamps are stored as naive UTC; an offset (e.g. a trailing Z) is converted away
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# Batch items may carry the device-side timestamp of a buffered reading
+class SensorReadingBatchItem(SensorReadingCreate):
+    timestamp: Optional[datetime] = None
+
+    _naive_timestamp = validator("timestamp", allow_reuse=True)(naive_utc)
+
+# Upper bound on readings accepted in one /sensor-readings/batch request
+MAX_SENSOR_BATCH = 5000
+
+# A window of raw PPG samples; ir/red are plain lists, checked and converted in _ppg_samples (not by pydantic, which would coerce 1.9 or "2" to int)
+class PpgWindowIn(BaseModel):
+    user_id: int
+    sample_rate: float = 100.0
+    start_time: Optional[datetime] = None
+    ir: list
+    red: list
+
+    _naive_start_time = validator("start_time", allow_reuse=True)(naive_utc)
+
+# Limits for POST /ppg-windows
+MAX_PPG_BATCH = 500
+PPG_MIN_SECONDS = 2
+PPG_MAX_SECONDS = 60
+PPG_MAX_SAMPLE_RATE = 1000
+
+# Device uploads are JSON or a binary encoding picked by Content-Type (see sensor_codec.py)
+async def sensor_payload(request: Request):
+    return request.headers.get("content-type", ""), await request.body()
+
+def parse_json_body(body: bytes):
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise RequestValidationError([ErrorWrapper(e, ("body", getattr(e, "pos", 0)))])
+
+def sensor_payload_error(e: sensor_codec.PayloadError):
+    return JSONResponse(
+        content={"error": str(e)},
+        status_code=e.status_code,
+        headers={"Access-Control-Allow-Origin": "*"}
+    )
+
+def sensor_openapi_body(schema: dict) -> dict:
+    binary = {"schema": {"type": "string", "format": "binary"}}
+    content = {"application/json": {"schema": schema}}
+    content.update({content_type: binary for content_type in sensor_codec.BINARY_CONTENT_TYPES})
+    return {"requestBody": {"required": True, "content": content}}
+
+# Signature checks are cached per token until its exp; logouts are shared through the DB (see token_cache.py)
+token_cache.bind(SessionLocal)
+
+def verify_token(token: str):
+    return token_cache.verify(token, utils.verify_access_token)
+
 def get_current_user(token: str = Security(oauth2_scheme)):
-   payload = utils.verify_access_token(token)
-   if not payload:
-     raise HTTPException(status_code=401, detail="Invalid or expired token")
+    payload = verify_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
     return payload
 
+def get_current_user_id(current_user: dict = Depends(get_current_user)) -> int:
+    user_id = current_user.get("user_id")
+    if user_id is None:
+        # Tokens issued before user_id was added to the claims
+        raise HTTPException(status_code=401, detail="Token has no user id, please log in again")
+    return int(user_id)
+
+def _load_user_record(user_id: int):
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+        return {"id": user.id, "fullname": user.fullname, "age": user.age, "email": user.email}
+    finally:
+        db.close()
+
+# Account row for the caller, cached for USER_CACHE_TTL seconds instead of re-querying accounts
+def get_current_user_record(user_id: int = Depends(get_current_user_id)) -> dict:
+    record = user_cache.get(user_id, _load_user_record)
+    if record is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return record
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     return JSONResponse(
@@ -71,7 +230,7 @@ def create_patient(patient: schemas.PatientCreate, db: Session = Depends(get_db)
 
 # Get patient by name
 @app.get("/patients/{name}", response_model=schemas.Patient)
-def read_patient(name: str, db: Session = Depends(get_db)):
+def read_patient(name: str, db: Session = Depends(get_read_db)):
     db_patient = crud.get_patient_by_name(db, name=name)
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -92,23 +251,43 @@ def delete_record(record_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Record not found")
     return {"message": "Record deleted successfully"}
 
-# Get health history for patient
-@app.get("/patients/{patient_id}/records/", response_model=list[schemas.HealthRecord])
+# Get health history for patient (newest first, at most `limit` records)
+# Pass the X-Next-Cursor response header back as ?cursor= for the next page
+@app.get("/patients/{patient_id}/records/", response_model=list[schemas.HealthRecordOut])
 def read_records(
     patient_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
     # current_user: dict = Depends(get_current_user)
 ):
-    records = crud.get_health_records(db, patient_id)
-    if not records:
+    try:
+        after = utils.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    records, has_more = crud.get_health_records_page(db, patient_id, limit=limit, after=after)
+    if not records and after is None:
         raise HTTPException(status_code=404, detail="No records found for this patient")
+    if has_more:
+        last = records[-1]
+        response.headers["X-Next-Cursor"] = utils.encode_cursor(last.timestamp, last.id)
     return records
 
+# GET /patients/{patient_id}/summary (latest vitals, 24h/7d stats, status counts; see summaries.py)
+@app.get("/patients/{patient_id}/summary")
+def read_patient_summary(patient_id: int, db: Session = Depends(get_read_db)):
+    summary = summaries.get_summary(db, patient_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No records found for this patient")
+    return summary
+
 # Signup
 @app.post("/signup", response_model=UserOut)
 def signup(user: UserCreate, db: Session = Depends(get_db)):
     try:
-        print("Incoming signup data:", user)
+        logger.debug("Incoming signup: %s", user.username)
 
         existing = db.query(User).filter(User.username == user.username).first()
         if existing:
@@ -128,18 +307,30 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         db.refresh(new_user)
         return new_user
 
+    except HTTPException:
+        raise
+    except hashing.PasswordHashingBusy:
+        raise HTTPException(status_code=503, detail="Too many signups in progress, retry shortly")
     except Exception as e:
-        print("❌ Signup error:", e)
+        logger.exception("❌ Signup error: %s", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 # Login
 @app.post("/login")
 def login(user: UserLogin, db: Session = Depends(get_db)):
     db_user = db.query(User).filter(User.username == user.username).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    try:
+        valid, new_hash = utils.verify_and_update_password(user.password, db_user.hashed_password) if db_user else (False, None)
+    except hashing.PasswordHashingBusy:
+        raise HTTPException(status_code=503, detail="Too many login attempts in progress, retry shortly")
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid username or password")
-    
-    token = create_access_token({"sub": db_user.username})
+    if new_hash:
+        # Cost factor changed since this hash was made
+        db_user.hashed_password = new_hash
+        db.commit()
+
+    token = create_access_token({"sub": db_user.username, "user_id": db_user.id})
     return {
         "access_token": token,
         "token_type": "bearer",
@@ -151,42 +342,85 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
 @app.post("/healthlogs")
 def receive_health_data(data: schemas.LiveHealthData, db: Session = Depends(get_db)):
     try:
-        crud.create_health_record(
-            db=db,
-            record=schemas.HealthRecordCreate(
-                heart_rate=data.heart_rate,
-                spo2=data.spo2,
-                timestamp=datetime.now()
-            ),
-            patient_id=data.patient_id
-        )
+        # crud only reads heart_rate/spo2 from the record
+        db_record = crud.create_health_record(db=db, record=data, patient_id=data.patient_id)
+        if db_record is not None:
+            live_hub.publish(data.patient_id, {
+                "type": "health_record",
+                "patient_id": data.patient_id,
+                "heart_rate": db_record.heart_rate,
+                "spo2": db_record.spo2,
+                "status": db_record.status,
+                "timestamp": db_record.timestamp
+            })
         return {"status": "received", "timestamp": datetime.now()}
     except Exception as e:
-        print("❌ ESP32 data error:", e)
+        logger.exception("❌ ESP32 data error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to store health data")
 
+# Push accepted readings to live subscribers (WebSocket / SSE)
+def publish_sensor_readings(rows: list):
+    for row in rows:
+        live_hub.publish(row["user_id"], {"type": "sensor_reading", **row})
+
 # POST /sensor-readings (for storing sensor data) - with explicit CORS headers and error handling
-@app.post("/sensor-readings")
-async def receive_sensor_reading(data: SensorReadingCreate, db: Session = Depends(get_db)):
-    try:
-        print("📥 Incoming sensor data:", data)
-        reading = SensorReading(
-            user_id=data.user_id,
-            heart_rate=data.heart_rate,
-            spo2=data.spo2,
-            ir=data.ir,
-            red=data.red,
-            timestamp=datetime.utcnow()
-        )
-        db.add(reading)
-        db.commit()
-        print("✅ Data stored successfully")
+# Body: a SensorReadingCreate as JSON, or one reading in a sensor_codec binary encoding
+@app.post("/sensor-readings", openapi_extra=sensor_openapi_body(SensorReadingCreate.schema()))
+async def receive_sensor_reading(payload: tuple = Depends(sensor_payload), db: Session = Depends(get_db)):
+    content_type, body = payload
+    if sensor_codec.is_binary(content_type):
+        try:
+            rows, errors = sensor_codec.decode(content_type, body, max_records=1)
+        except sensor_codec.PayloadError as e:
+            return sensor_payload_error(e)
+        if errors or len(rows) != 1:
+            detail = errors[0][1] if errors else [{"loc": [], "msg": "expected exactly one reading", "type": "value_error"}]
+            return JSONResponse(content={"detail": detail}, status_code=422, headers={"Access-Control-Allow-Origin": "*"})
+        row = rows[0]
+        row["timestamp"] = row["timestamp"] or datetime.utcnow()
+        data = row
+    else:
+        try:
+            data = SensorReadingCreate.parse_obj(parse_json_body(body))
+        except ValidationError as e:
+            raise RequestValidationError([ErrorWrapper(e, ("body",))])
+        row = {
+            "user_id": data.user_id,
+            "heart_rate": data.heart_rate,
+            "spo2": data.spo2,
+            "ir": data.ir,
+            "red": data.red,
+            "timestamp": datetime.utcnow()
+        }
+    if ingest.INGEST_BUFFER_ENABLED:
+        try:
+            ingest_buffer.submit(row)
+        except ingest.IngestQueueFull:
+            return JSONResponse(
+                content={"error": "Ingestion queue full, retry later"},
+                status_code=503,
+                headers={"Access-Control-Allow-Origin": "*", "Retry-After": "1"}
+            )
+        except ingest.IngestStopped:
+            pass  # Writer not running (startup/shutdown): store it synchronously below
+        else:
+            publish_sensor_readings([row])
+            return JSONResponse(
+                content={"status": "queued"},
+                headers={"Access-Control-Allow-Origin": "*"}
+            )
+
+    try:
+        if logs.sampled(logger):
+            logger.debug("📥 Incoming sensor data: %s", data)
+        crud.create_sensor_readings(db, [row])
+        publish_sensor_readings([row])
         return JSONResponse(
             content={"status": "stored"},
             headers={"Access-Control-Allow-Origin": "*"}
         )
     except Exception as e:
-        print("❌ Database error in /sensor-readings:", str(e))
+        logger.error("❌ Database error in /sensor-readings: %s", e)
         db.rollback()  # Roll back on error
         return JSONResponse(
             content={"error": "Failed to store data", "details": str(e)},
@@ -194,8 +428,212 @@ async def receive_sensor_reading(data: SensorReadingCreate, db: Session = Depend
             headers={"Access-Control-Allow-Origin": "*"}
         )
 
+# POST /sensor-readings/batch (gateway flush: many readings, one transaction)
+# Body: a JSON array of SensorReadingBatchItem, or a sensor_codec binary encoding
+@app.post(
+    "/sensor-readings/batch",
+    openapi_extra=sensor_openapi_body({"type": "array", "items": SensorReadingBatchItem.schema()})
+)
+def receive_sensor_readings_batch(payload: tuple = Depends(sensor_payload), db: Session = Depends(get_db)):
+    content_type, body = payload
+    now = datetime.utcnow()
+
+    if sensor_codec.is_binary(content_type):
+        try:
+            rows, errors = sensor_codec.decode(content_type, body, max_records=MAX_SENSOR_BATCH)
+        except sensor_codec.PayloadError as e:
+            return sensor_payload_error(e)
+        for row in rows:
+            row["timestamp"] = row["timestamp"] or now
+        invalid = dict(errors)
+        count = len(rows) + len(invalid)
+        results = [
+            {"index": index, "status": "invalid", "errors": invalid[index]} if index in invalid
+            else {"index": index, "status": "stored"}
+            for index in range(count)
+        ]
+    else:
+        items = parse_json_body(body)
+        if not isinstance(items, list):
+            raise RequestValidationError([ErrorWrapper(ListError(), ("body",))])
+        if len(items) > MAX_SENSOR_BATCH:
+            return JSONResponse(
+                content={"error": f"Batch too large (max {MAX_SENSOR_BATCH} readings)"},
+                status_code=413,
+                headers={"Access-Control-Allow-Origin": "*"}
+            )
+
+        count = len(items)
+        rows, results = [], []
+        for index, item in enumerate(items):
+            try:
+                data = SensorReadingBatchItem.parse_obj(item)
+            except ValidationError as e:
+                results.append({"index": index, "status": "invalid", "errors": e.errors()})
+                continue
+            row = data.dict()
+            row["timestamp"] = row["timestamp"] or now
+            rows.append(row)
+            results.append({"index": index, "status": "stored"})
+
+    try:
+        crud.create_sensor_readings(db, rows)
+    except Exception as e:
+        logger.error("❌ Database error in /sensor-readings/batch: %s", e)
+        db.rollback()
+        for result in results:
+            if result["status"] == "stored":
+                result["status"] = "failed"
+        return JSONResponse(
+            content={"error": "Failed to store data", "details": str(e), "results": results},
+            status_code=500,
+            headers={"Access-Control-Allow-Origin": "*"}
+        )
+
+    publish_sensor_readings(rows)
+    return JSONResponse(
+        content={
+            "status": "stored",
+            "stored": len(rows),
+            "rejected": count - len(rows),
+            "results": results
+        },
+        headers={"Access-Control-Allow-Origin": "*"}
+    )
+
+# Samples of one PPG window as int arrays, or a list of validation errors
+def _ppg_samples(window: PpgWindowIn):
+    errors = []
+    if not 0 < window.sample_rate <= PPG_MAX_SAMPLE_RATE:
+        errors.append({"loc": ["sample_rate"], "msg": f"must be in (0, {PPG_MAX_SAMPLE_RATE}]", "type": "value_error"})
+        return None, None, errors
+    channels = []
+    for name in ("ir", "red"):
+        values = getattr(window, name)
+        samples = None
+        # type() rather than isinstance(): bools are ints too
+        if all(type(value) is int for value in values):
+            try:
+                samples = np.asarray(values, dtype=np.int64)
+            except OverflowError:
+                samples = None
+        if samples is None:
+            errors.append({"loc": [name], "msg": "must be a flat list of integers", "type": "type_error"})
+        elif samples.size and (samples.min() < 0 or samples.max() > sensor_codec.INT32_MAX):
+            errors.append({"loc": [name], "msg": f"samples must be between 0 and {sensor_codec.INT32_MAX}", "type": "value_error"})
+        channels.append(samples)
+    if errors:
+        return None, None, errors
+
+    ir, red = channels
+    low, high = int(PPG_MIN_SECONDS * window.sample_rate), int(PPG_MAX_SECONDS * window.sample_rate)
+    if ir.size != red.size:
+        errors.append({"loc": ["red"], "msg": "ir and red must have the same length", "type": "value_error"})
+    elif not low <= ir.size <= high:
+        errors.append({"loc": ["ir"], "msg": f"window must hold {low} to {high} samples", "type": "value_error"})
+    return (None, None, errors) if errors else (ir, red, [])
+
+# POST /ppg-windows (raw IR/red windows; HR/SpO2 derived server-side, see ppg.py)
+# Body: a JSON array of PpgWindowIn. Windows with a usable signal also become sensor readings.
+@app.post("/ppg-windows")
+def receive_ppg_windows(items: List[dict] = Body(...), db: Session = Depends(get_db)):
+    if len(items) > MAX_PPG_BATCH:
+        return JSONResponse(
+            content={"error": f"Batch too large (max {MAX_PPG_BATCH} windows)"},
+            status_code=413,
+            headers={"Access-Control-Allow-Origin": "*"}
+        )
+
+    now = datetime.utcnow()
+    accepted, results = [], []
+    for index, item in enumerate(items):
+        try:
+            window = PpgWindowIn.parse_obj(item)
+        except ValidationError as e:
+            results.append({"index": index, "status": "invalid", "errors": e.errors()})
+            continue
+        ir, red, errors = _ppg_samples(window)
+        if errors:
+            results.append({"index": index, "status": "invalid", "errors": errors})
+            continue
+        duration = timedelta(seconds=ir.size / window.sample_rate)
+        # Without a device clock, the window is taken to have just ended
+        start = window.start_time or now - duration
+        accepted.append((window, ir, red, start, start + duration))
+        results.append({"index": index, "status": "stored"})
+
+    derived = ppg.derive_windows([(ir, red, window.sample_rate) for window, ir, red, _, _ in accepted])
+    windows, readings = [], []
+    for (window, ir, red, start, end), values in zip(accepted, derived):
+        windows.append({
+            "user_id": window.user_id,
+            "start_time": start,
+            "sample_rate": window.sample_rate,
+            "sample_count": int(ir.size),
+            "ir": ppg.pack_samples(ir),
+            "red": ppg.pack_samples(red),
+            "heart_rate": values["heart_rate"],
+            "spo2": values["spo2"],
+        })
+        if values["valid"]:
+            readings.append({
+                "user_id": window.user_id,
+                "heart_rate": values["heart_rate"],
+                "spo2": values["spo2"],
+                "ir": int(values["dc_ir"]),
+                "red": int(values["dc_red"]),
+                "timestamp": end,
+            })
+
+    try:
+        crud.create_ppg_windows(db, windows, readings)
+    except Exception as e:
+        logger.error("❌ Database error in /ppg-windows: %s", e)
+        db.rollback()
+        return JSONResponse(
+            content={"error": "Failed to store data", "details": str(e)},
+            status_code=500,
+            headers={"Access-Control-Allow-Origin": "*"}
+        )
+
+    publish_sensor_readings(readings)
+    stored = iter(derived)
+    for result in results:
+        if result["status"] == "stored":
+            values = next(stored)
+            result.update(heart_rate=values["heart_rate"], spo2=values["spo2"], valid=values["valid"])
+    return JSONResponse(
+        content={
+            "status": "stored",
+            "stored": len(windows),
+            "derived": len(readings),
+            "rejected": len(items) - len(windows),
+            "results": results
+        },
+        headers={"Access-Control-Allow-Origin": "*"}
+    )
+
+# GET /ppg-windows/{window_id} (stored samples and derived values of one window)
+@app.get("/ppg-windows/{window_id}")
+def get_ppg_window(window_id: int, db: Session = Depends(get_read_db)):
+    window = crud.get_ppg_window(db, window_id)
+    if not window:
+        raise HTTPException(status_code=404, detail="PPG window not found")
+    return {
+        "id": window.id,
+        "user_id": window.user_id,
+        "start_time": window.start_time,
+        "sample_rate": window.sample_rate,
+        "heart_rate": window.heart_rate,
+        "spo2": window.spo2,
+        "ir": ppg.unpack_samples(window.ir).tolist(),
+        "red": ppg.unpack_samples(window.red).tolist()
+    }
+
 # OPTIONS /sensor-readings (explicit handler for preflight CORS requests with manual headers)
 @app.options("/sensor-readings")
+@app.options("/sensor-readings/batch")
+@app.options("/ppg-windows")
 async def options_sensor_readings():
     response = Response()
     response.headers["Access-Control-Allow-Origin"] = "*"
@@ -203,11 +641,29 @@ async def options_sensor_readings():
     response.headers["Access-Control-Allow-Headers"] = "*"
     return response
 
+# GET /ingest/stats (write-behind buffer depth and throughput counters)
+@app.get("/ingest/stats")
+def get_ingest_stats():
+    return ingest_buffer.stats()
+
 # GET /healthlogs (retrieve sensor readings for authenticated user)
+# Newest first; pass the X-Next-Cursor response header back as ?cursor= for the next page
 @app.get("/healthlogs")
-def get_health_logs(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_health_logs(
+    response: Response,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db)
+):
+    try:
+        after = utils.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    readings = db.query(SensorReading).order_by(SensorReading.timestamp.desc()).all()
+    readings, has_more = crud.get_sensor_readings_page(db, user_id, since, until, limit, after)
 
     result = [
         {
@@ -222,10 +678,246 @@ def get_health_logs(current_user: dict = Depends(get_current_user), db: Session
         for r in readings
     ]
 
+    if has_more:
+        last = readings[-1]
+        response.headers["X-Next-Cursor"] = utils.encode_cursor(last.timestamp, last.id)
     return result
 
+# GET /patients/{patient_id}/records/history (newest first, including archived months; see retention.py)
+# Pass the X-Next-Cursor response header back as ?cursor= for the next page
+@app.get("/patients/{patient_id}/records/history", response_model=List[schemas.HealthRecordOut])
+def get_record_history(
+    patient_id: int,
+    response: Response,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    try:
+        after = utils.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    records, has_more = crud.get_health_records_page(db, patient_id, since, until, limit, after)
+    if has_more:
+        last = records[-1]
+        response.headers["X-Next-Cursor"] = utils.encode_cursor(last.timestamp, last.id)
+    return records
+
+# GET /alerts (alerts raised for the authenticated user by the streaming rules; see alerts.py)
+# Newest first; pass the X-Next-Cursor response header back as ?cursor= for the next page
+@app.get("/alerts")
+def get_alerts(
+    response: Response,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db)
+):
+    try:
+        after = utils.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    rows, has_more = crud.get_alerts_page(db, user_id, since, until, limit, after)
+    result = [
+        {
+            "id": a.id,
+            "rule": a.rule,
+            "severity": a.severity,
+            "metric": a.metric,
+            "value": a.value,
+            "threshold": a.threshold,
+            "message": a.message,
+            "timestamp": a.timestamp.isoformat()
+        }
+        for a in rows
+    ]
+    if has_more:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = utils.encode_cursor(last.timestamp, last.id)
+    return result
+
+# GET /alerts/window (the authenticated user's current sliding-window statistics)
+@app.get("/alerts/window")
+def get_alert_window(user_id: int = Depends(get_current_user_id)):
+    return {"window_seconds": alerts.alert_engine.window, "metrics": alerts.alert_engine.snapshot(user_id)}
+
+# GET /alerts/stats (patients tracked, readings observed, alerts fired/suppressed)
+@app.get("/alerts/stats")
+def get_alert_stats():
+    return alerts.alert_engine.stats()
+
+# GET /healthlogs/rollups (chart series from minute/hour/day rollups; defaults to the last 24h)
+@app.get("/healthlogs/rollups")
+def get_health_log_rollups(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    max_points: int = Query(500, ge=1, le=5000),
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db)
+):
+    until = until or datetime.utcnow()
+    since = since or until - timedelta(days=1)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    resolution, points = rollups.query_series(db, user_id, since, until, max_points)
+    return {
+        "resolution": resolution,
+        "bucket_seconds": rollups.RESOLUTIONS[resolution],
+        "points": points
+    }
+
+def _export_response(request: Request, kind: str, owner_id: int, format: str, since, until, cursor, gzip: bool):
+    try:
+        after = utils.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    body, media_type, filename = exports.stream_export(
+        read_session_factory(last_write_of(request)), kind, owner_id, format, since, until, after, gzip
+    )
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# GET /healthlogs/export (stream the caller's sensor readings, oldest first)
+# Resume an interrupted export with ?cursor=<cursor of the last row received>
+@app.get("/healthlogs/export")
+def export_health_logs(
+    request: Request,
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    gzip: bool = False,
+    user_id: int = Depends(get_current_user_id)
+):
+    return _export_response(request, "sensor_readings", user_id, format, since, until, cursor, gzip)
+
+# GET /patients/{patient_id}/records/export (stream a patient's health records)
+@app.get("/patients/{patient_id}/records/export")
+def export_records(
+    request: Request,
+    patient_id: int,
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    gzip: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    return _export_response(request, "health_records", patient_id, format, since, until, cursor, gzip)
+
+# Same rule as GET /healthlogs: callers only get their own vitals.
+# None for an invalid token; PermissionError if another user's id is requested
+def _live_user_ids(token: Optional[str], user_ids: Optional[List[int]]):
+    payload = verify_token(token) if token else None
+    if not payload or payload.get("user_id") is None:
+        return None
+    own = int(payload["user_id"])
+    if user_ids and any(u != own for u in user_ids):
+        raise PermissionError("Cannot subscribe to another user's vitals")
+    return [own]
+
+# WebSocket /ws/vitals?token=... (push the caller's own live vitals)
+@app.websocket("/ws/vitals")
+async def live_vitals_ws(websocket: WebSocket, token: Optional[str] = None, user_id: Optional[List[int]] = Query(None)):
+    try:
+        user_ids = _live_user_ids(token, user_id)
+    except PermissionError:
+        user_ids = None
+    if not user_ids:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    subscription = live_hub.subscribe(user_ids)
+    try:
+        while True:
+            message = await subscription.get(LIVE_HEARTBEAT_SECONDS)
+            if message is None:
+                await websocket.send_text('{"type": "heartbeat"}')
+            else:
+                await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
+
+# GET /healthlogs/stream (Server-Sent Events; EventSource can pass ?token= instead of a header)
+@app.get("/healthlogs/stream")
+async def live_vitals_sse(request: Request, token: Optional[str] = None, user_id: Optional[List[int]] = Query(None)):
+    auth = request.headers.get("Authorization", "")
+    if auth.lower().startswith("bearer "):
+        token = auth[7:]
+    try:
+        user_ids = _live_user_ids(token, user_id)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if not user_ids:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    subscription = live_hub.subscribe(user_ids)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                message = await subscription.get(LIVE_HEARTBEAT_SECONDS)
+                yield ": heartbeat\n\n" if message is None else f"data: {message}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# GET /metrics (Prometheus text format: per-route requests/latency, SQL, inference, ingest queue, pool)
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# GET /pool-stats (SQLAlchemy connection pool usage and checkout waits; replica health and lag)
+@app.get("/pool-stats")
+def get_pool_stats():
+    return pool_stats()
+
+# GET /models (active and shadow risk model versions, registry listing, shadow agreement/latency)
+@app.get("/models")
+def get_models():
+    return utils.model_status()
+
+# GET /live/stats (subscriber and cache counters for the live hub)
+@app.get("/live/stats")
+def get_live_stats():
+    return live_hub.stats()
+
+# POST /logout (revoke the bearer token: at once on this worker, within TOKEN_REVOCATION_SYNC_SECONDS on the others)
+@app.post("/logout")
+def logout(token: str = Security(oauth2_scheme), current_user: dict = Depends(get_current_user)):
+    token_cache.revoke(token, current_user)
+    if current_user.get("user_id") is not None:
+        user_cache.invalidate(int(current_user["user_id"]))
+    return {"message": "Logged out"}
+
+@app.get("/me")
+def get_me(user: dict = Depends(get_current_user_record)):
+    return user
+
+# GET /token-cache/stats (verified-token and user-record cache counters)
+@app.get("/token-cache/stats")
+def get_token_cache_stats():
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
+
 @app.get("/user/{user_id}")
-def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_read_db)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
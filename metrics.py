@@ -0,0 +1,231 @@
+"""In-process metrics rendered in the Prometheus text format (GET /metrics).
+
+No client library: counters and histograms are plain dicts keyed by label
+values behind one lock, and gauges are callbacks evaluated at scrape time
+(ingest queue depth, pool usage), so the hot path only does a dict update.
+
+  * MetricsMiddleware times every HTTP request and labels it with the route
+    template ("/patients/{patient_id}/records/"), never the raw path.
+  * instrument_engine() hooks SQLAlchemy cursor events; queries are counted
+    globally and per request (through a context variable the middleware sets).
+  * utils.compute_risk_ml reports inference latency and fallbacks here.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}   # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, entry in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{_number(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(entry[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Gauge:
+    """Value(s) read at scrape time: fn() returns a number or {label values tuple: number}."""
+
+    def __init__(self, name: str, help: str, fn, labelnames=()):
+        self.name, self.help, self.fn, self.labelnames = name, help, fn, tuple(labelnames)
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, v in sorted(items):
+            if v is not None:
+                yield f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}"
+
+
+_registry = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name: str, help: str, fn, labelnames=()):
+    return register(Gauge(name, help, fn, labelnames))
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Starlette appends "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+http_requests = register(Counter(
+    "http_requests_total", "HTTP requests by route template, method and status", ("route", "method", "status")))
+http_latency = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("route", "method")))
+http_in_flight = 0
+register(Gauge("http_requests_in_flight", "HTTP requests being served", lambda: http_in_flight))
+
+db_queries = register(Counter("db_queries_total", "SQL statements executed"))
+db_query_latency = register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency", buckets=sorted(set(FAST_BUCKETS + DEFAULT_BUCKETS))))
+db_queries_per_request = register(Histogram(
+    "db_queries_per_request", "SQL statements executed while serving one request", ("route",), COUNT_BUCKETS))
+db_time_per_request = register(Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL while serving one request", ("route",)))
+
+inference_latency = register(Histogram(
+    "risk_inference_duration_seconds", "Risk model inference latency", ("kind",), FAST_BUCKETS))
+inference_fallbacks = register(Counter(
+    "risk_inference_fallbacks_total", "Risk scores that fell back to the rule-based classifier", ("kind",)))
+
+
+# [query count, seconds in SQL] for the request being served, if any
+_request_db = contextvars.ContextVar("request_db", default=None)
+
+
+def instrument_engine(engine):
+    """Count and time every statement run through engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_queries.inc()
+        db_query_latency.observe(elapsed)
+        current = _request_db.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request counts, latency and DB usage."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes_by_endpoint = None
+
+    def _route_template(self, scope) -> str:
+        from starlette.routing import Match
+
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "<unmatched>"
+        if self._routes_by_endpoint is None:
+            by_endpoint = {}
+            for route in scope["app"].router.routes:
+                by_endpoint.setdefault(getattr(route, "endpoint", None), []).append(route)
+            self._routes_by_endpoint = by_endpoint
+        routes = self._routes_by_endpoint.get(endpoint, [])
+        if len(routes) == 1:
+            return routes[0].path
+        # One function behind several paths (e.g. the CORS preflight handler)
+        for route in routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return "<unmatched>"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        global http_in_flight
+        status = 500
+        db_usage = [0, 0.0]
+        token = _request_db.set(db_usage)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight -= 1
+            _request_db.reset(token)
+            route = self._route_template(scope)
+            http_requests.inc(route, scope["method"], str(status))
+            http_latency.observe(elapsed, route, scope["method"])
+            db_queries_per_request.observe(db_usage[0], route)
+            db_time_per_request.observe(db_usage[1], route)
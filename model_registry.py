@@ -0,0 +1,391 @@
+"""Versioned risk models on local disk, hot-swapped into running workers.
+
+    model_artifacts/
+        20261018T085243Z/     one directory per train_model.py run
+            risk_model.json   linear-risk-v1 artifact
+            metrics.json      validation metrics
+            checkpoint.joblib training state (not needed for serving)
+        ACTIVE                name of the version compute_risk_ml serves
+        SHADOW                optional candidate version scored in shadow mode
+
+    python model_registry.py list
+    python model_registry.py activate 20261018T085243Z
+    python model_registry.py shadow 20261018T085243Z     # or: shadow --off
+
+Pointers are single-line files replaced atomically. Every worker runs a
+HotModel watcher thread that re-reads them every RISK_MODEL_CHECK_INTERVAL
+seconds; a changed version is loaded (lookup table included) in that thread
+and swapped in with one reference assignment, so requests never wait on a
+load and in-flight scoring keeps the model it started with. Without an
+ACTIVE pointer the legacy risk_model.json / pickles are served as before.
+
+Shadow mode: with a SHADOW pointer set, RISK_SHADOW_SAMPLE_RATE of the
+scored readings are queued (bounded, dropped when full) to a background
+thread that scores them with both models and records agreement and
+per-model latency; see ShadowScorer.stats() and GET /models.
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import logs
+import metrics
+from risk_engine import LinearRiskModel, file_digest
+
+MODEL_ARTIFACTS_DIR = os.getenv(
+    "MODEL_ARTIFACTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_artifacts"))
+RISK_SHADOW_SAMPLE_RATE = float(os.getenv("RISK_SHADOW_SAMPLE_RATE", "0.05"))
+RISK_SHADOW_QUEUE_SIZE = int(os.getenv("RISK_SHADOW_QUEUE_SIZE", "1000"))
+
+ARTIFACT_FILE = "risk_model.json"
+METRICS_FILE = "metrics.json"
+CHECKPOINT_FILE = "checkpoint.joblib"
+ACTIVE = "ACTIVE"
+SHADOW = "SHADOW"
+
+# Per-model latencies kept for the shadow percentiles
+LATENCY_SAMPLES = 1000
+
+logger = logs.get_logger("models")
+
+# Background threads don't survive fork(); the generation bumps in every child
+# so HotModel/ShadowScorer restart theirs on first use there
+_fork_generation = 0
+
+
+def _after_fork():
+    global _fork_generation
+    _fork_generation += 1
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+shadow_comparisons = metrics.register(metrics.Counter(
+    "risk_shadow_comparisons_total", "Readings scored by both the active and the candidate model",
+    ("candidate", "agree")))
+shadow_latency = metrics.register(metrics.Histogram(
+    "risk_shadow_inference_duration_seconds", "Per-reading inference latency measured by the shadow scorer",
+    ("model",), metrics.FAST_BUCKETS))
+shadow_dropped = metrics.register(metrics.Counter(
+    "risk_shadow_dropped_total", "Shadow samples dropped because the queue was full"))
+
+
+def versions(root: str = MODEL_ARTIFACTS_DIR) -> list:
+    """Version names under root, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and os.path.isfile(os.path.join(root, name, ARTIFACT_FILE))
+    )
+
+
+def version_metrics(version: str, root: str = MODEL_ARTIFACTS_DIR) -> dict:
+    try:
+        with open(os.path.join(root, version, METRICS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def read_pointer(name: str, root: str = MODEL_ARTIFACTS_DIR):
+    """Version named by the ACTIVE/SHADOW pointer, or None."""
+    try:
+        with open(os.path.join(root, name)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_pointer(name: str, version, root: str = MODEL_ARTIFACTS_DIR):
+    """Point name at version (None removes the pointer)."""
+    path = os.path.join(root, name)
+    if version is None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    if version not in versions(root):
+        raise ValueError(f"Unknown model version {version!r}")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, path)
+
+
+def activate(version: str, root: str = MODEL_ARTIFACTS_DIR):
+    write_pointer(ACTIVE, version, root)
+
+
+def load_version(version: str, root: str = MODEL_ARTIFACTS_DIR) -> LinearRiskModel:
+    path = os.path.join(root, version, ARTIFACT_FILE)
+    model = LinearRiskModel.load(path)
+    model.digest = file_digest(path)
+    model.version = version
+    return model
+
+
+def pointer_stamp(name: str, root: str = MODEL_ARTIFACTS_DIR):
+    """(version, artifact mtime) the pointer resolves to; changes when either does."""
+    version = read_pointer(name, root)
+    if version is None:
+        return None
+    try:
+        return version, os.stat(os.path.join(root, version, ARTIFACT_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return version, None
+
+
+class HotModel:
+    """A model reference that a background thread replaces when stamp() changes.
+
+    loader() builds the model (or returns None); stamp() is a cheap value that
+    changes whenever loader() would return something different. The first
+    get() loads the model unless ensure_loaded() already did (startup hook,
+    pre-fork parent); after that get() never blocks on a load.
+    """
+
+    def __init__(self, name: str, loader, stamp, interval: float):
+        self.name = name
+        self.loader = loader
+        self.stamp = stamp
+        self.interval = interval
+        self.model = None
+        self.loaded = False
+        self.loaded_stamp = None
+        self.swaps = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._generation = None
+
+    def load_now(self):
+        """Synchronous load; errors propagate."""
+        stamp = self.stamp()
+        self.model = self.loader()
+        self.loaded_stamp = stamp
+        self.loaded = True
+        return self.model
+
+    def ensure_loaded(self):
+        """Initial load, once. A failure is logged, not raised: the model stays
+        None (callers fall back) and the watcher keeps retrying."""
+        if self.loaded:
+            return self.model
+        with self._lock:
+            if not self.loaded:
+                try:
+                    self.load_now()
+                except Exception as e:
+                    self.loaded = True
+                    self.last_error = str(e)
+                    logger.warning("⚠️ %s model not loaded, retrying in the background: %s", self.name, e)
+        return self.model
+
+    def get(self):
+        if not self.loaded:
+            self.ensure_loaded()
+        if self._generation != _fork_generation:
+            self._start()
+        return self.model
+
+    def check(self) -> bool:
+        """Reload if the stamp moved; True if the model was swapped."""
+        try:
+            stamp = self.stamp()
+            if stamp == self.loaded_stamp:
+                return False
+            model = self.loader()
+        except Exception as e:
+            self.last_error = str(e)
+            logger.warning("⚠️ %s model reload failed, keeping the current one: %s", self.name, e)
+            return False
+        self.model = model
+        self.loaded_stamp = stamp
+        self.swaps += 1
+        self.last_error = None
+        if model is None:
+            logger.info("🔄 %s model cleared", self.name)
+        else:
+            logger.info("🔄 %s model swapped to %s", self.name, getattr(model, "version", None) or "legacy")
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._generation == _fork_generation:
+                return
+            self._generation = _fork_generation
+            threading.Thread(target=self._run, name=f"{self.name}-model-watcher", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
+
+
+class ShadowScorer:
+    """Scores sampled readings with a candidate model off the request path."""
+
+    def __init__(self, active: HotModel, candidate: HotModel,
+                 sample_rate: float = RISK_SHADOW_SAMPLE_RATE, queue_size: int = RISK_SHADOW_QUEUE_SIZE):
+        self.active = active
+        self.candidate = candidate
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._generation = None
+        self._reset(None)
+
+    def _reset(self, version):
+        self._version = version
+        self._compared = self._agreed = self._dropped = self._errors = 0
+        self._pairs = {}
+        self._latency = {"active": deque(maxlen=LATENCY_SAMPLES), "candidate": deque(maxlen=LATENCY_SAMPLES)}
+
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 and self.candidate.get() is not None
+
+    def submit(self, X, labels):
+        """Queue a sample of (n x 3) inputs with the labels the active model served."""
+        if not self.enabled():
+            return
+        X = np.asarray(X, dtype=float).reshape(-1, 3)
+        if len(X) == 1:
+            if random.random() >= self.sample_rate:
+                return
+            sample = np.ones(1, dtype=bool)
+        else:
+            sample = np.random.random(len(X)) < self.sample_rate
+            if not sample.any():
+                return
+        if self._generation != _fork_generation:
+            self._start()
+        try:
+            self._queue.put_nowait((X[sample], np.asarray(labels, dtype=object)[sample]))
+        except queue.Full:
+            shadow_dropped.inc()
+            with self._lock:
+                self._dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._generation == _fork_generation:
+                return
+            self._generation = _fork_generation
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            threading.Thread(target=self._run, name="risk-shadow-scorer", daemon=True).start()
+
+    def _run(self):
+        while True:
+            X, served = self._queue.get()
+            try:
+                self._score(X, served)
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                logger.warning("⚠️ Shadow scoring failed: %s", e)
+
+    def _score(self, X, served):
+        candidate, active = self.candidate.get(), self.active.get()
+        if candidate is None:
+            return
+        version = getattr(candidate, "version", None)
+        timings = {"active": [], "candidate": []}
+        predicted = []
+        for row in X:
+            started = time.perf_counter()
+            active.predict_one(*row)
+            timings["active"].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            predicted.append(candidate.predict_one(*row))
+            timings["candidate"].append(time.perf_counter() - started)
+
+        with self._lock:
+            if version != self._version:
+                self._reset(version)
+            for old, new in zip(served, predicted):
+                agree = old == new
+                self._compared += 1
+                self._agreed += agree
+                key = f"{old} -> {new}"
+                if not agree:
+                    self._pairs[key] = self._pairs.get(key, 0) + 1
+                shadow_comparisons.inc(version, "true" if agree else "false")
+            for model, values in timings.items():
+                self._latency[model].extend(values)
+        for model, values in timings.items():
+            for value in values:
+                shadow_latency.observe(value, model)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latency = {}
+            for model, values in self._latency.items():
+                if values:
+                    p50, p95 = np.percentile(np.fromiter(values, float), [50, 95]) * 1e6
+                    latency[model] = {"p50_us": round(float(p50), 2), "p95_us": round(float(p95), 2)}
+            return {
+                "candidate": self._version or getattr(self.candidate.model, "version", None),
+                "sample_rate": self.sample_rate,
+                "compared": self._compared,
+                "agreement": round(self._agreed / self._compared, 4) if self._compared else None,
+                "disagreements": dict(sorted(self._pairs.items(), key=lambda item: -item[1])),
+                "latency": latency,
+                "queued": self._queue.qsize(),
+                "dropped": self._dropped,
+                "errors": self._errors,
+            }
+
+
+def describe(root: str = MODEL_ARTIFACTS_DIR) -> list:
+    """Every version with its headline metrics, for listings."""
+    active, shadow = read_pointer(ACTIVE, root), read_pointer(SHADOW, root)
+    out = []
+    for version in versions(root):
+        m = version_metrics(version, root)
+        out.append({
+            "version": version,
+            "active": version == active,
+            "shadow": version == shadow,
+            "accuracy": m.get("accuracy"),
+            "macro_f1": m.get("macro_f1"),
+            "mode": m.get("mode"),
+            "trained_rows_total": m.get("trained_rows_total"),
+        })
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List, activate or shadow risk model versions")
+    parser.add_argument("--root", default=MODEL_ARTIFACTS_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    p = sub.add_parser("activate")
+    p.add_argument("version")
+    p = sub.add_parser("shadow")
+    p.add_argument("version", nargs="?")
+    p.add_argument("--off", action="store_true", help="stop shadow scoring")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for row in describe(args.root):
+            flags = ("*" if row["active"] else " ") + ("s" if row["shadow"] else " ")
+            print(f"{flags} {row['version']}  accuracy={row['accuracy']} macro_f1={row['macro_f1']} "
+                  f"rows={row['trained_rows_total']} ({row['mode']})")
+    elif args.command == "activate":
+        activate(args.version, args.root)
+        print(f"🚀 {args.version} is active; workers swap it in within their check interval")
+    elif args.off or not args.version:
+        write_pointer(SHADOW, None, args.root)
+        print("✅ Shadow scoring off")
+    else:
+        write_pointer(SHADOW, args.version, args.root)
+        print(f"👥 Shadow scoring {args.version}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -31,9 +31,47 @@ class HealthRecord(Base):
     spo2 = Column(Integer)
     glucose = Column(Integer, nullable=True)
     temperature = Column(Float, nullable=True)
+    status = Column(String(20), nullable=True)
     timestamp = Column(DateTime, default=datetime.now)
     patient_id = Column(Integer, ForeignKey("patients.id"))
 
+    # Serves per-patient pagination and the summary's hour recomputes
+    __table_args__ = (
+        Index("ix_health_records_patient_ts", "patient_id", "timestamp"),
+    )
+
+
+class PatientSummary(Base):
+    """Per-patient counters and latest vitals, maintained on every record insert/delete (see summaries.py)."""
+    __tablename__ = "patient_summaries"
+
+    patient_id = Column(Integer, primary_key=True)
+    record_count = Column(Integer, nullable=False, default=0)
+    normal_count = Column(Integer, nullable=False, default=0)
+    slightly_normal_count = Column(Integer, nullable=False, default=0)
+    at_risk_count = Column(Integer, nullable=False, default=0)
+    other_count = Column(Integer, nullable=False, default=0)   # no status or an unknown label
+    latest_record_id = Column(Integer)
+    latest_timestamp = Column(DateTime)
+    latest_heart_rate = Column(Integer)
+    latest_spo2 = Column(Integer)
+    latest_status = Column(String(20))
+
+
+class PatientRecordHour(Base):
+    """Hourly vitals aggregates per patient behind the summary's 24h/7d statistics."""
+    __tablename__ = "patient_record_hours"
+
+    patient_id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False)
+    hr_min = Column(Float)
+    hr_max = Column(Float)
+    hr_sum = Column(Float)
+    spo2_min = Column(Float)
+    spo2_max = Column(Float)
+    spo2_sum = Column(Float)
+
 
 class SensorReading(Base):
     __tablename__ = "sensor_readings"
@@ -45,3 +83,76 @@ class SensorReading(Base):
     ir = Column(Integer)
     red = Column(Integer)
     timestamp = Column(DateTime, default=datetime.utcnow)
+
+    # Serves per-user time-range scans and (timestamp, id) keyset pagination
+    __table_args__ = (
+        Index("ix_sensor_readings_user_ts", "user_id", "timestamp"),
+    )
+
+
+class PpgWindow(Base):
+    """A window of raw IR/red PPG samples and the HR/SpO2 derived from it (see ppg.py)."""
+    __tablename__ = "ppg_windows"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    sample_rate = Column(Float, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    ir = Column(LargeBinary(length=2**24 - 1), nullable=False)    # ppg.pack_samples blob
+    red = Column(LargeBinary(length=2**24 - 1), nullable=False)
+    heart_rate = Column(Float, nullable=True)   # NULL when the window was unusable
+    spo2 = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_ppg_windows_user_start", "user_id", "start_time"),
+    )
+
+
+class Alert(Base):
+    """A rule firing from the streaming alert engine (see alerts.py)."""
+    __tablename__ = "alerts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    rule = Column(String(50), nullable=False)
+    severity = Column(String(10), nullable=False)
+    metric = Column(String(40), nullable=False)
+    value = Column(Float)
+    threshold = Column(Float)
+    message = Column(String(255))
+    timestamp = Column(DateTime, nullable=False)   # time of the reading that fired it
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_alerts_user_ts", "user_id", "timestamp"),
+    )
+
+
+class RevokedToken(Base):
+    """A logged-out bearer token, shared by every worker until it expires (see token_cache.py)."""
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    digest = Column(String(64), unique=True, nullable=False)   # SHA-256 of the token
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class SensorRollup(Base):
+    """Per-user aggregates of sensor_readings over fixed buckets (see rollups.py)."""
+    __tablename__ = "sensor_rollups"
+
+    user_id = Column(Integer, primary_key=True)
+    resolution = Column(Integer, primary_key=True)   # bucket width in seconds
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False)
+    hr_min = Column(Float)
+    hr_max = Column(Float)
+    hr_sum = Column(Float)
+    spo2_min = Column(Float)
+    spo2_max = Column(Float)
+    spo2_sum = Column(Float)
+    low_spo2_count = Column(Integer, nullable=False)
+    last_timestamp = Column(DateTime)
+    last_heart_rate = Column(Float)
+    last_spo2 = Column(Float)
@@ -0,0 +1,186 @@
+"""Heart rate and SpO2 from raw PPG (IR/red) windows, vectorized across windows.
+
+Devices may upload windows of raw MAX3010x samples (POST /ppg-windows)
+instead of computing HR/SpO2 on the chip. Windows with the same length and
+sample rate are stacked into (windows x samples) arrays and processed with
+whole-array NumPy operations, so a ward's worth of windows costs a handful
+of array passes rather than a Python loop per sample:
+
+  1. band-pass: a short moving average (removes sample noise) minus a long
+     one (removes baseline wander and the DC level);
+  2. peaks: samples that are the maximum of their refractory neighbourhood
+     (60/PPG_MAX_BPM seconds) and above a per-window threshold; heart rate is
+     the beat count over the span between the first and last peak;
+  3. SpO2 from the ratio of ratios R = (AC_red/DC_red) / (AC_ir/DC_ir),
+     AC being the RMS of the band-passed signal, through the linear
+     calibration SPO2_CAL_A - SPO2_CAL_B * R.
+
+Windows without a finger on the sensor, with too few beats or with an
+implausible rate come back with NaN for both values.
+
+Samples are stored as blobs: int32 deltas, zlib-compressed (pack_samples /
+unpack_samples), a few hundred bytes per second of waveform instead of a
+row per sample.
+
+Knobs (environment variables):
+    PPG_MIN_BPM / PPG_MAX_BPM   plausible heart-rate range
+    PPG_MIN_DC                  mean IR level below which no finger is assumed
+    SPO2_CAL_A / SPO2_CAL_B     SpO2 calibration (replace with the sensor's own)
+"""
+import os
+import zlib
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+PPG_MIN_BPM = float(os.getenv("PPG_MIN_BPM", "30"))
+PPG_MAX_BPM = float(os.getenv("PPG_MAX_BPM", "220"))
+PPG_MIN_DC = float(os.getenv("PPG_MIN_DC", "5000"))
+SPO2_CAL_A = float(os.getenv("SPO2_CAL_A", "110"))
+SPO2_CAL_B = float(os.getenv("SPO2_CAL_B", "25"))
+
+# Moving-average widths in seconds for the band-pass
+SMOOTH_SECONDS = 0.1
+BASELINE_SECONDS = 1.5
+# A peak must stand this many standard deviations above the window's mean
+PEAK_THRESHOLD_STD = 0.6
+MIN_BEATS = 3
+
+
+def pack_samples(samples) -> bytes:
+    """Compact blob for one channel: first value then deltas, int32 little-endian, zlib level 1."""
+    values = np.asarray(samples, dtype=np.int64)
+    deltas = np.diff(values, prepend=0).astype("<i4")
+    return zlib.compress(deltas.tobytes(), 1)
+
+
+def unpack_samples(blob: bytes) -> np.ndarray:
+    return np.cumsum(np.frombuffer(zlib.decompress(blob), dtype="<i4"), dtype=np.int64)
+
+
+def moving_average(x: np.ndarray, width: int) -> np.ndarray:
+    """Centered moving average along axis 1, same length as x (edges padded with the edge value)."""
+    if width <= 1:
+        return x
+    padded = np.pad(x, ((0, 0), (width // 2, width - 1 - width // 2)), mode="edge")
+    csum = np.cumsum(padded, axis=1)
+    csum = np.concatenate([np.zeros((x.shape[0], 1)), csum], axis=1)
+    return (csum[:, width:] - csum[:, :-width]) / width
+
+
+def band_pass(x: np.ndarray, fs: float) -> np.ndarray:
+    smooth = max(1, int(round(fs * SMOOTH_SECONDS)))
+    baseline = max(3, int(round(fs * BASELINE_SECONDS)))
+    return moving_average(x, smooth) - moving_average(x, baseline)
+
+
+def find_peaks(signal: np.ndarray, fs: float) -> np.ndarray:
+    """Boolean (windows x samples) mask of beats in a band-passed signal."""
+    half = max(1, int(fs * 60 / PPG_MAX_BPM) // 2)
+    padded = np.pad(signal, ((0, 0), (half, half)), mode="constant", constant_values=-np.inf)
+    neighbourhood_max = sliding_window_view(padded, 2 * half + 1, axis=1).max(axis=2)
+    threshold = signal.mean(axis=1) + PEAK_THRESHOLD_STD * signal.std(axis=1)
+    peaks = (signal == neighbourhood_max) & (signal > threshold[:, None])
+    # On a flat top only the first sample counts
+    peaks[:, 1:] &= signal[:, 1:] > signal[:, :-1]
+    # The moving averages are unreliable right at the window edges
+    peaks[:, :half] = False
+    peaks[:, -half:] = False
+    return peaks
+
+
+def derive(ir, red, fs: float) -> dict:
+    """Heart rate (bpm), SpO2 (%) and validity for windows of equal length at sample rate fs.
+
+    ir and red are (windows x samples) arrays (a single 1-D window is
+    accepted too); every returned array has one entry per window.
+    """
+    ir = np.atleast_2d(np.asarray(ir, dtype=float))
+    red = np.atleast_2d(np.asarray(red, dtype=float))
+    if ir.shape != red.shape:
+        raise ValueError("ir and red must have the same shape")
+    n_samples = ir.shape[1]
+
+    dc_ir = ir.mean(axis=1)
+    dc_red = red.mean(axis=1)
+    ac_ir = band_pass(ir, fs)
+    ac_red = band_pass(red, fs)
+
+    # More blood absorbs more light, so each beat is a dip in the raw output
+    peaks = find_peaks(-ac_ir, fs)
+    beats = peaks.sum(axis=1)
+    first = peaks.argmax(axis=1)
+    last = n_samples - 1 - peaks[:, ::-1].argmax(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        heart_rate = 60.0 * fs * (beats - 1) / (last - first)
+        rms_ir = np.sqrt(np.mean(ac_ir ** 2, axis=1))
+        rms_red = np.sqrt(np.mean(ac_red ** 2, axis=1))
+        ratio = (rms_red / dc_red) / (rms_ir / dc_ir)
+    spo2 = np.clip(SPO2_CAL_A - SPO2_CAL_B * ratio, 0.0, 100.0)
+
+    valid = (
+        (beats >= MIN_BEATS)
+        & (dc_ir >= PPG_MIN_DC)
+        & (dc_red > 0)
+        & (heart_rate >= PPG_MIN_BPM)
+        & (heart_rate <= PPG_MAX_BPM)
+        & np.isfinite(ratio)
+    )
+    return {
+        "heart_rate": np.where(valid, heart_rate, np.nan),
+        "spo2": np.where(valid, spo2, np.nan),
+        "ratio": ratio,
+        "beats": beats,
+        "dc_ir": dc_ir,
+        "dc_red": dc_red,
+        "valid": valid,
+    }
+
+
+def derive_windows(windows) -> list:
+    """derive() over windows of mixed lengths/rates: one call per (length, rate) group.
+
+    windows: sequence of (ir, red, fs) with 1-D sample arrays.
+    Returns one dict per window (heart_rate/spo2 are None when not valid).
+    """
+    groups = {}
+    for index, (ir, red, fs) in enumerate(windows):
+        groups.setdefault((len(ir), float(fs)), []).append(index)
+
+    results = [None] * len(windows)
+    for (_, fs), indices in groups.items():
+        out = derive(
+            np.stack([windows[i][0] for i in indices]),
+            np.stack([windows[i][1] for i in indices]),
+            fs,
+        )
+        for row, index in enumerate(indices):
+            valid = bool(out["valid"][row])
+            results[index] = {
+                "heart_rate": round(float(out["heart_rate"][row]), 1) if valid else None,
+                "spo2": round(float(out["spo2"][row]), 1) if valid else None,
+                "beats": int(out["beats"][row]),
+                "dc_ir": float(out["dc_ir"][row]),
+                "dc_red": float(out["dc_red"][row]),
+                "valid": valid,
+            }
+    return results
+
+
+def synthesize(heart_rate: float, spo2: float, seconds: float = 8.0, fs: float = 100.0,
+               dc_ir: float = 100000.0, noise: float = 0.0, seed: int = 0):
+    """Synthetic (ir, red) window with the given HR and SpO2, for tests and benchmarks."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * fs)) / fs
+    phase = 2 * np.pi * heart_rate / 60.0 * t
+    # Sharp systolic dip with a slower recovery, plus slow respiratory wander
+    pulse = np.exp(3 * np.cos(phase)) / np.exp(3)
+    wander = 0.01 * np.sin(2 * np.pi * 0.25 * t)
+    ratio = (SPO2_CAL_A - spo2) / SPO2_CAL_B
+    ac_ir = 0.02 * dc_ir
+    dc_red = 0.8 * dc_ir
+    ac_red = ratio * ac_ir / dc_ir * dc_red
+    ir = dc_ir * (1 + wander) - ac_ir * pulse + noise * ac_ir * rng.standard_normal(t.size)
+    red = dc_red * (1 + wander) - ac_red * pulse + noise * ac_red * rng.standard_normal(t.size)
+    return np.round(ir).astype(np.int64), np.round(red).astype(np.int64)
@@ -0,0 +1,469 @@
+"""Retention: keep the hot tables small, move old rows to compressed archives.
+
+sensor_readings and health_records only ever grow. The archive job moves
+every row older than RETENTION_HOT_DAYS into one compressed NumPy file per
+owner (user / patient) and month:
+
+    ARCHIVE_DIR/<table>/<owner id>/<YYYY-MM>.npz
+
+Each file holds one column array per field, sorted by (timestamp, id).
+Files are written (atomically, merged with any earlier file for the same
+month) before the rows are removed from the database, so an interrupted
+run only ever leaves rows in both places, and re-running is safe.
+
+Removing rows:
+  * MySQL: sensor_readings can be range-partitioned by month
+    (`python retention.py partition`); a month that is entirely past the
+    cutoff is removed with DROP PARTITION instead of row deletes. InnoDB
+    doesn't allow foreign keys on partitioned tables, so health_records
+    (which references patients) stays unpartitioned.
+  * Everything else (SQLite, partial months, health_records) is deleted by
+    primary key in chunks of RETENTION_CHUNK_SIZE, one commit per chunk,
+    so the job never holds long locks.
+
+Reads: read_archive() returns archived rows in the same shape as the ORM
+rows, and crud.get_sensor_readings_page merges them in when a page reaches
+past the archive watermark, so GET /healthlogs pages seamlessly into
+history; iter_archive() does the same, oldest first, for the bulk exports.
+Charts keep working from sensor_rollups, which are not archived, and
+`rollups.py --rebuild` / summaries.rebuild() read the archive back in
+(iter_archived_rows) so a rebuild doesn't lose the archived months.
+
+Knobs (environment variables):
+    RETENTION_HOT_DAYS      rows newer than this stay in the database
+    ARCHIVE_DIR             where archive files go
+    RETENTION_CHUNK_SIZE    rows per delete statement / commit
+
+Run from cron:
+    python retention.py archive [--older-than-days N] [--table sensor_readings]
+    python retention.py partition [--months-ahead 3]     # MySQL only
+"""
+import argparse
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import delete, select, text
+
+import models
+
+RETENTION_HOT_DAYS = int(os.getenv("RETENTION_HOT_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+RETENTION_CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", "5000"))
+
+# Per table: model, owner column and the archived value columns ("float", "int" or "str")
+TABLES = {
+    "sensor_readings": {
+        "model": models.SensorReading,
+        "owner": "user_id",
+        "columns": [("heart_rate", "float"), ("spo2", "float"), ("ir", "int"), ("red", "int")],
+    },
+    "health_records": {
+        "model": models.HealthRecord,
+        "owner": "patient_id",
+        "columns": [("heart_rate", "int"), ("spo2", "int"), ("glucose", "int"),
+                    ("temperature", "float"), ("status", "str")],
+    },
+}
+
+# Archived rows look like the ORM query rows (attribute access by column name)
+ROW_TYPES = {
+    name: namedtuple(f"Archived_{name}", ["id", spec["owner"]] + [c for c, _ in spec["columns"]] + ["timestamp"])
+    for name, spec in TABLES.items()
+}
+
+
+def month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+
+def next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def archive_path(table: str, owner_id: int, month: datetime) -> str:
+    return os.path.join(ARCHIVE_DIR, table, str(owner_id), f"{month:%Y-%m}.npz")
+
+
+# Watermark: every row older than this has been archived (and removed)
+def _watermark_path(table: str) -> str:
+    return os.path.join(ARCHIVE_DIR, table, "watermark.json")
+
+
+_watermarks = {}   # path -> (mtime, value); read on every paginated request
+
+
+def get_watermark(table: str):
+    path = _watermark_path(table)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _watermarks.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path) as f:
+            value = datetime.fromisoformat(json.load(f)["archived_before"])
+    except (OSError, ValueError, KeyError):
+        return None
+    _watermarks[path] = (mtime, value)
+    return value
+
+
+def _set_watermark(table: str, cutoff: datetime):
+    current = get_watermark(table)
+    if current is not None and current >= cutoff:
+        return
+    path = _watermark_path(table)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"archived_before": cutoff.isoformat()}, f)
+    os.replace(tmp, path)
+
+
+def _to_arrays(table: str, rows) -> dict:
+    """Column arrays for ORM/Core rows of table (NULL numbers -> NaN, NULL strings -> "")."""
+    spec = TABLES[table]
+    arrays = {
+        "id": np.array([r.id for r in rows], dtype=np.int64),
+        "timestamp": np.array([r.timestamp for r in rows], dtype="datetime64[us]"),
+    }
+    for name, kind in spec["columns"]:
+        values = [getattr(r, name) for r in rows]
+        if kind == "str":
+            arrays[name] = np.array([v or "" for v in values], dtype=str)
+        else:
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return arrays
+
+
+def _from_arrays(table: str, owner_id: int, arrays: dict, index) -> list:
+    spec = TABLES[table]
+    row_type = ROW_TYPES[table]
+    ids = arrays["id"][index].tolist()
+    timestamps = arrays["timestamp"][index].astype("datetime64[us]").tolist()
+    columns = []
+    for name, kind in spec["columns"]:
+        values = arrays[name][index]
+        if kind == "str":
+            columns.append([v or None for v in values.tolist()])
+        elif kind == "int":
+            columns.append([None if v != v else int(v) for v in values.tolist()])
+        else:
+            columns.append([None if v != v else v for v in values.tolist()])
+    return [
+        row_type(row_id, owner_id, *values, ts)
+        for row_id, ts, *values in zip(ids, timestamps, *columns)
+    ]
+
+
+def write_archive(table: str, owner_id: int, month: datetime, arrays: dict) -> str:
+    """Merge arrays into the owner's archive file for month (dedup by id), atomically."""
+    path = archive_path(table, owner_id, month)
+    existing = _load_file(path)
+    if existing is not None:
+        arrays = {key: np.concatenate([existing[key], arrays[key]]) for key in arrays}
+        _, keep = np.unique(arrays["id"], return_index=True)
+        arrays = {key: value[keep] for key, value in arrays.items()}
+    order = np.lexsort((arrays["id"], arrays["timestamp"]))
+    arrays = {key: value[order] for key, value in arrays.items()}
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp, path)
+    return path
+
+
+# Small LRU of loaded archive files, keyed by path and mtime
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+ARCHIVE_CACHE_FILES = 64
+
+
+def _load_file(path: str):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    key = (path, mtime)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    with _cache_lock:
+        _cache[key] = arrays
+        while len(_cache) > ARCHIVE_CACHE_FILES:
+            _cache.popitem(last=False)
+    return arrays
+
+
+def archived_months(table: str, owner_id: int) -> list:
+    folder = os.path.join(ARCHIVE_DIR, table, str(owner_id))
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return []
+    return sorted(datetime.strptime(n[:-4], "%Y-%m") for n in names if n.endswith(".npz"))
+
+
+def iter_archive_files(table: str):
+    """(owner id, rows) for every archive file of table, one file at a time."""
+    root = os.path.join(ARCHIVE_DIR, table)
+    try:
+        owners = sorted(int(name) for name in os.listdir(root) if name.isdigit())
+    except FileNotFoundError:
+        return
+    for owner_id in owners:
+        for month in archived_months(table, owner_id):
+            arrays = _load_file(archive_path(table, owner_id, month))
+            if arrays is not None:
+                yield owner_id, _from_arrays(table, owner_id, arrays, slice(None))
+
+
+def read_archive(table: str, owner_id: int, since=None, until=None, after=None, limit: int = None) -> list:
+    """Archived rows of one owner, newest first, in [since, until) and before the (timestamp, id) keyset `after`."""
+    rows = []
+    for month in reversed(archived_months(table, owner_id)):
+        if since is not None and next_month(month) <= since:
+            break
+        if (until is not None and month >= until) or (after is not None and month > after[0]):
+            continue
+        arrays = _load_file(archive_path(table, owner_id, month))
+        if arrays is None:
+            continue
+        ts = arrays["timestamp"]
+        mask = np.ones(len(ts), dtype=bool)
+        if since is not None:
+            mask &= ts >= np.datetime64(since, "us")
+        if until is not None:
+            mask &= ts < np.datetime64(until, "us")
+        if after is not None:
+            after_ts = np.datetime64(after[0], "us")
+            mask &= (ts < after_ts) | ((ts == after_ts) & (arrays["id"] < after[1]))
+        index = np.flatnonzero(mask)[::-1]
+        if limit is not None:
+            index = index[:limit - len(rows)]
+        rows.extend(_from_arrays(table, owner_id, arrays, index))
+        if limit is not None and len(rows) >= limit:
+            break
+    return rows
+
+
+def iter_archived_rows(session, table: str, chunk_size: int = RETENTION_CHUNK_SIZE):
+    """Archived rows of table that are no longer in the database, one archive file at a time."""
+    model = TABLES[table]["model"]
+    watermark = get_watermark(table)
+    for _, rows in iter_archive_files(table):
+        # Rows past the watermark may be left over from an interrupted archive run, still in the table
+        unsure = [r.id for r in rows if watermark is None or r.timestamp >= watermark]
+        still_hot = set()
+        for i in range(0, len(unsure), chunk_size):
+            still_hot.update(session.execute(
+                select(model.id).where(model.id.in_(unsure[i:i + chunk_size]))
+            ).scalars())
+        yield [r for r in rows if r.id not in still_hot]
+
+
+def iter_archive(table: str, owner_id: int, since=None, until=None, after=None):
+    """Archived rows of one owner, oldest first, one month (list) at a time, in [since, until) and after the keyset `after`."""
+    for month in archived_months(table, owner_id):
+        if (since is not None and next_month(month) <= since) or (after is not None and next_month(month) <= after[0]):
+            continue
+        if until is not None and month >= until:
+            break
+        arrays = _load_file(archive_path(table, owner_id, month))
+        if arrays is None:
+            continue
+        ts = arrays["timestamp"]
+        mask = np.ones(len(ts), dtype=bool)
+        if since is not None:
+            mask &= ts >= np.datetime64(since, "us")
+        if until is not None:
+            mask &= ts < np.datetime64(until, "us")
+        if after is not None:
+            after_ts = np.datetime64(after[0], "us")
+            mask &= (ts > after_ts) | ((ts == after_ts) & (arrays["id"] > after[1]))
+        index = np.flatnonzero(mask)
+        if len(index):
+            yield _from_arrays(table, owner_id, arrays, index)
+
+
+def merge_newest_first(hot_rows, archived_rows, limit: int) -> list:
+    """Hot and archived rows (each newest first) merged on (timestamp, id), at most limit rows."""
+    merged = sorted(list(hot_rows) + list(archived_rows), key=lambda r: (r.timestamp, r.id), reverse=True)
+    return merged[:limit]
+
+
+def needs_archive(table: str, oldest_bound) -> bool:
+    """Whether a read reaching back to oldest_bound (None = no lower bound) can touch archived rows."""
+    watermark = get_watermark(table)
+    return watermark is not None and (oldest_bound is None or oldest_bound < watermark)
+
+
+# ---- Moving rows out of the database ----
+
+def _mysql_partitions(session, table: str) -> dict:
+    """{partition name: upper bound description} of a MySQL table (empty if not partitioned)."""
+    rows = session.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL"
+    ), {"table": table}).all()
+    return {name: description for name, description in rows}
+
+
+def _partition_rows(session, table: str, name: str) -> int:
+    return session.execute(text(f"SELECT COUNT(*) FROM {table} PARTITION ({name})")).scalar()
+
+
+def partition_name(month: datetime) -> str:
+    return f"p{month:%Y%m}"
+
+
+def _delete_ids(session, model, ids, chunk_size: int):
+    for start in range(0, len(ids), chunk_size):
+        session.execute(delete(model).where(model.id.in_(ids[start:start + chunk_size])))
+        session.commit()
+
+
+def archive_table(session, table: str, cutoff: datetime, chunk_size: int = RETENTION_CHUNK_SIZE) -> int:
+    """Archive and remove every row of table older than cutoff; returns rows moved."""
+    spec = TABLES[table]
+    model = spec["model"]
+    owner_col = getattr(model, spec["owner"])
+    columns = [model.id, owner_col, model.timestamp] + [getattr(model, c) for c, _ in spec["columns"]]
+
+    oldest = session.execute(select(model.timestamp).order_by(model.timestamp).limit(1)).scalar()
+    is_mysql = session.get_bind().dialect.name == "mysql"
+    partitions = _mysql_partitions(session, table) if is_mysql else {}
+    moved = 0
+
+    month = month_start(oldest) if oldest is not None else cutoff
+    while month < cutoff:
+        end = min(next_month(month), cutoff)
+        result = session.execute(
+            select(*columns)
+            .where(model.timestamp >= month, model.timestamp < end)
+            .order_by(owner_col, model.timestamp, model.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        ids = []
+        owner_id, batch = None, []
+        for row in result:
+            owner = getattr(row, spec["owner"])
+            if owner != owner_id and batch:
+                write_archive(table, owner_id, month, _to_arrays(table, batch))
+                batch = []
+            owner_id = owner
+            batch.append(row)
+            ids.append(row.id)
+        if batch:
+            write_archive(table, owner_id, month, _to_arrays(table, batch))
+        session.commit()
+
+        # Whole month past the cutoff and partitioned: drop it instead of deleting rows,
+        # unless rows arrived in it since it was read (those would be lost)
+        name = partition_name(month)
+        if name in partitions and next_month(month) <= cutoff and _partition_rows(session, table, name) == len(ids):
+            session.execute(text(f"ALTER TABLE {table} DROP PARTITION {name}"))
+        else:
+            _delete_ids(session, model, ids, chunk_size)
+        moved += len(ids)
+        if ids:
+            print(f"📦 {table} {month:%Y-%m}: {len(ids)} rows archived")
+        month = next_month(month)
+
+    _set_watermark(table, cutoff)
+    return moved
+
+
+# ---- MySQL partition maintenance ----
+
+def partition_statements(table: str, existing: dict, first_month: datetime, through_month: datetime) -> list:
+    """DDL that range-partitions table by month up to through_month (inclusive), plus a catch-all pmax.
+
+    `existing` is the current {name: bound} map; an unpartitioned table is
+    converted (its primary key must include the partition column), an
+    already partitioned one gets new months split out of pmax.
+    """
+    months = []
+    month = month_start(first_month)
+    while month <= through_month:
+        months.append(month)
+        month = next_month(month)
+
+    def definition(m):
+        return f"PARTITION {partition_name(m)} VALUES LESS THAN (TO_DAYS('{next_month(m):%Y-%m-%d}'))"
+
+    if not existing:
+        parts = ", ".join([definition(m) for m in months] + ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+        return [
+            f"ALTER TABLE {table} MODIFY timestamp DATETIME NOT NULL, "
+            f"DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)",
+            f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(timestamp)) ({parts})",
+        ]
+    new = [m for m in months if partition_name(m) not in existing]
+    if not new:
+        return []
+    parts = ", ".join([definition(m) for m in new] + ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+    return [f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({parts})"]
+
+
+def ensure_partitions(session, table: str = "sensor_readings", months_ahead: int = 3) -> list:
+    """Create monthly partitions through months_ahead months from now (MySQL only)."""
+    if session.get_bind().dialect.name != "mysql":
+        return []
+    model = TABLES[table]["model"]
+    oldest = session.execute(select(model.timestamp).order_by(model.timestamp).limit(1)).scalar()
+    through = month_start(datetime.utcnow())
+    for _ in range(months_ahead):
+        through = next_month(through)
+    existing = _mysql_partitions(session, table)
+    first = month_start(oldest) if oldest is not None and not existing else month_start(datetime.utcnow())
+    statements = partition_statements(table, existing, first, through)
+    for statement in statements:
+        session.execute(text(statement))
+    return statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old rows / maintain MySQL partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    archive = sub.add_parser("archive", help="move rows older than the hot window to ARCHIVE_DIR")
+    archive.add_argument("--older-than-days", type=int, default=RETENTION_HOT_DAYS)
+    archive.add_argument("--table", choices=sorted(TABLES), action="append")
+    archive.add_argument("--chunk-size", type=int, default=RETENTION_CHUNK_SIZE)
+    partition = sub.add_parser("partition", help="create monthly partitions for sensor_readings (MySQL)")
+    partition.add_argument("--months-ahead", type=int, default=3)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        if args.command == "archive":
+            # Whole days, so reruns on the same day agree on the cutoff
+            today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            cutoff = today - timedelta(days=args.older_than_days)
+            for table in args.table or sorted(TABLES):
+                moved = archive_table(session, table, cutoff, args.chunk_size)
+                print(f"✅ {table}: {moved} rows older than {cutoff:%Y-%m-%d} archived")
+        else:
+            statements = ensure_partitions(session, months_ahead=args.months_ahead)
+            for statement in statements:
+                print(statement)
+            print(f"✅ {len(statements)} partition statements applied" if statements else "Nothing to do")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
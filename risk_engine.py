@@ -0,0 +1,149 @@
+"""Lightweight inference for the linear risk model.
+
+train_model.py fits a LogisticRegression on (heart_rate, spo2, age). Its
+prediction is just argmax(X @ coef.T + intercept), so export_model.py dumps
+the coefficients, intercepts and decoded class labels to a small JSON
+artifact and LinearRiskModel evaluates them without importing sklearn:
+NumPy for batches, plain Python for single readings.
+"""
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+ARTIFACT_FORMAT = "linear-risk-v1"
+FEATURES = ["heart_rate", "spo2", "age"]
+
+RISK_MODEL_ARTIFACT = os.getenv("RISK_MODEL_ARTIFACT", "risk_model.json")
+RISK_MODEL_PKL = os.getenv("RISK_MODEL_PKL", "risk_model.pkl")
+RISK_ENCODER_PKL = os.getenv("RISK_ENCODER_PKL", "label_encoder.pkl")
+
+
+class LinearRiskModel:
+    """argmax of a linear decision function, same rule as sklearn's predict."""
+
+    def __init__(self, coef, intercept, labels):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.labels = np.asarray(labels, dtype=object)
+        if self.coef.ndim != 2 or self.coef.shape[1] != len(FEATURES):
+            raise ValueError(f"coef must have shape (k, {len(FEATURES)})")
+        # Binary models store one row; predict() picks labels[score > 0]
+        self.binary = self.coef.shape[0] == 1
+        self._rows = [
+            (tuple(float(w) for w in row), float(b))
+            for row, b in zip(self.coef, self.intercept)
+        ]
+        self._labels = [str(label) for label in self.labels]
+
+    @classmethod
+    def from_sklearn(cls, model, encoder=None):
+        labels = model.classes_
+        if encoder is not None:
+            labels = encoder.inverse_transform(labels)
+        return cls(model.coef_, model.intercept_, labels)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if data.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported risk model artifact format: {data.get('format')!r}")
+        return cls(data["coef"], data["intercept"], data["labels"])
+
+    @classmethod
+    def load(cls, path: str = RISK_MODEL_ARTIFACT):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self) -> dict:
+        return {
+            "format": ARTIFACT_FORMAT,
+            "features": FEATURES,
+            "coef": self.coef.tolist(),
+            "intercept": self.intercept.tolist(),
+            "labels": self._labels,
+        }
+
+    def save(self, path: str = RISK_MODEL_ARTIFACT):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+    def decision_function(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURES))
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity")
+        return X @ self.coef.T + self.intercept
+
+    def predict(self, X) -> np.ndarray:
+        """Labels for an (n, 3) array of (heart_rate, spo2, age) rows."""
+        scores = self.decision_function(X)
+        if self.binary:
+            return self.labels[(scores[:, 0] > 0).astype(int)]
+        return self.labels[scores.argmax(axis=1)]
+
+    def predict_one(self, heart_rate, spo2, age) -> str:
+        """Single reading in pure Python (no array allocation)."""
+        x0, x1, x2 = float(heart_rate), float(spo2), float(age)
+        if not (math.isfinite(x0) and math.isfinite(x1) and math.isfinite(x2)):
+            raise ValueError("Input contains NaN or infinity")
+
+        if self.binary:
+            (w0, w1, w2), b = self._rows[0]
+            return self._labels[1] if (w0 * x0 + w1 * x1 + w2 * x2) + b > 0 else self._labels[0]
+
+        best, best_score = 0, -math.inf
+        for i, ((w0, w1, w2), b) in enumerate(self._rows):
+            score = (w0 * x0 + w1 * x1 + w2 * x2) + b
+            if score > best_score:
+                best, best_score = i, score
+        return self._labels[best]
+
+
+class SklearnRiskModel:
+    """Same interface as LinearRiskModel, backed by the pickled sklearn objects."""
+
+    def __init__(self, model, encoder):
+        self.model = model
+        self.encoder = encoder
+
+    @classmethod
+    def load(cls, model_path: str = RISK_MODEL_PKL, encoder_path: str = RISK_ENCODER_PKL):
+        import joblib  # only needed when no exported artifact is available
+
+        return cls(joblib.load(model_path), joblib.load(encoder_path))
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURES))
+        return self.encoder.inverse_transform(self.model.predict(X)).astype(object)
+
+    def predict_one(self, heart_rate, spo2, age) -> str:
+        return self.predict([[heart_rate, spo2, age]])[0]
+
+
+def model_sources(artifact_path: str = RISK_MODEL_ARTIFACT) -> list:
+    """Files the served model is loaded from (artifact, else the pickles)."""
+    if os.path.exists(artifact_path):
+        return [artifact_path]
+    return [RISK_MODEL_PKL, RISK_ENCODER_PKL]
+
+
+def file_digest(*paths) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_risk_model(artifact_path: str = RISK_MODEL_ARTIFACT):
+    """Prefer the exported artifact; fall back to the sklearn pickles."""
+    sources = model_sources(artifact_path)
+    if sources == [artifact_path]:
+        model = LinearRiskModel.load(artifact_path)
+    else:
+        model = SklearnRiskModel.load()
+    model.digest = file_digest(*sources)
+    return model
@@ -0,0 +1,159 @@
+"""Precomputed risk labels for every integer input in the clamped vitals grid.
+
+heart_rate 30-220, spo2 50-100 and age 0-120 give 191 x 51 x 121 ~ 1.2M
+cells, stored as one uint8 label code per cell (~1.2 MB). A prediction is
+then a single index into a bytes object; non-integer or out-of-range inputs
+go to the live model. The table records the digest of the model files it
+was built from, so a stale table is never served.
+"""
+import os
+
+import numpy as np
+
+import logs
+
+HR_MIN, HR_MAX = 30, 220
+SPO2_MIN, SPO2_MAX = 50, 100
+AGE_MIN, AGE_MAX = 0, 120
+
+SHAPE = (HR_MAX - HR_MIN + 1, SPO2_MAX - SPO2_MIN + 1, AGE_MAX - AGE_MIN + 1)
+_SPO2_STRIDE = SHAPE[2]
+_HR_STRIDE = SHAPE[1] * SHAPE[2]
+
+RISK_LOOKUP_TABLE = os.getenv("RISK_LOOKUP_TABLE", "1") == "1"
+RISK_TABLE_PATH = os.getenv("RISK_TABLE_PATH", "risk_table.npz")
+
+logger = logs.get_logger("models")
+
+
+def _grid_block(hr: int) -> np.ndarray:
+    """All (hr, spo2, age) rows for one heart-rate value, in table order."""
+    spo2, age = np.mgrid[SPO2_MIN:SPO2_MAX + 1, AGE_MIN:AGE_MAX + 1].reshape(2, -1)
+    return np.column_stack([np.full(spo2.shape, hr), spo2, age]).astype(np.float64)
+
+
+def _as_index(value, low: int, high: int):
+    """Offset of an integral in-range value, else None."""
+    try:
+        i = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if i != value or i < low or i > high:
+        return None
+    return i - low
+
+
+class RiskLookupTable:
+    def __init__(self, codes: np.ndarray, labels, digest: str = None):
+        self.codes = np.ascontiguousarray(codes, dtype=np.uint8).reshape(SHAPE)
+        self.labels = np.asarray(labels, dtype=object)
+        self.digest = digest
+        self._flat = self.codes.tobytes()
+        self._labels = [str(label) for label in self.labels]
+
+    @classmethod
+    def build(cls, model, digest: str = None):
+        """Evaluate the model on every cell (one vectorized call per heart rate)."""
+        predictions = np.concatenate([
+            np.asarray(model.predict(_grid_block(hr)), dtype=object)
+            for hr in range(HR_MIN, HR_MAX + 1)
+        ])
+        labels, codes = np.unique(predictions.astype(str), return_inverse=True)
+        if len(labels) > 255:
+            raise ValueError("Too many distinct labels for a uint8 table")
+        return cls(codes.astype(np.uint8), labels, digest)
+
+    @classmethod
+    def load(cls, path: str = RISK_TABLE_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["codes"], data["labels"].tolist(), str(data["digest"]))
+
+    def save(self, path: str = RISK_TABLE_PATH):
+        # Per-process name: workers may rebuild the same table at the same time
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp,
+            codes=self.codes,
+            labels=np.asarray(self._labels, dtype=str),
+            digest=np.asarray(self.digest or ""),
+        )
+        os.replace(tmp, path)
+
+    def verify(self, model, single: bool = False) -> bool:
+        """True if every cell equals the model's prediction.
+
+        single=True checks each cell through model.predict_one (the per-request
+        path) instead of the batched predict; slower, used at export time.
+        """
+        for hr in range(HR_MIN, HR_MAX + 1):
+            block = _grid_block(hr)
+            stored = self.labels[self.codes[hr - HR_MIN].ravel()]
+            if single:
+                expected = np.array([model.predict_one(*row) for row in block.tolist()], dtype=object)
+            else:
+                expected = np.asarray(model.predict(block), dtype=object)
+            if not (stored == expected.astype(str)).all():
+                return False
+        return True
+
+    def lookup(self, heart_rate, spo2, age):
+        """Label for an integral in-range reading, or None if it is off the grid."""
+        h = _as_index(heart_rate, HR_MIN, HR_MAX)
+        s = _as_index(spo2, SPO2_MIN, SPO2_MAX)
+        a = _as_index(age, AGE_MIN, AGE_MAX)
+        if h is None or s is None or a is None:
+            return None
+        return self._labels[self._flat[h * _HR_STRIDE + s * _SPO2_STRIDE + a]]
+
+    def lookup_batch(self, X):
+        """(labels, hit_mask) for an (n, 3) array; labels are None where missed."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, 3)
+        low = np.array([HR_MIN, SPO2_MIN, AGE_MIN])
+        high = np.array([HR_MAX, SPO2_MAX, AGE_MAX])
+        with np.errstate(invalid="ignore"):
+            hit = ((X == np.floor(X)) & (X >= low) & (X <= high)).all(axis=1)
+        labels = np.full(len(X), None, dtype=object)
+        idx = (X[hit] - low).astype(np.intp)
+        labels[hit] = self.labels[self.codes[idx[:, 0], idx[:, 1], idx[:, 2]]]
+        return labels, hit
+
+
+class TableRiskModel:
+    """Serves predictions from a RiskLookupTable, falling back to the live model."""
+
+    def __init__(self, model, table: RiskLookupTable):
+        self.model = model
+        self.table = table
+
+    def predict_one(self, heart_rate, spo2, age) -> str:
+        label = self.table.lookup(heart_rate, spo2, age)
+        if label is None:
+            return self.model.predict_one(heart_rate, spo2, age)
+        return label
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64).reshape(-1, 3)
+        labels, hit = self.table.lookup_batch(X)
+        if not hit.all():
+            labels[~hit] = self.model.predict(X[~hit])
+        return labels
+
+
+def load_or_build(model, digest: str, path: str = RISK_TABLE_PATH) -> RiskLookupTable:
+    """Reuse the table on disk if it was built from this model, else rebuild it."""
+    if os.path.exists(path):
+        try:
+            table = RiskLookupTable.load(path)
+            if table.digest == digest:
+                return table
+        except Exception as e:
+            logger.warning("⚠️ Ignoring unreadable risk table: %s", e)
+
+    table = RiskLookupTable.build(model, digest)
+    if not table.verify(model):
+        raise RuntimeError("Risk lookup table does not match the model")
+    try:
+        table.save(path)
+    except OSError as e:
+        logger.warning("⚠️ Could not cache risk table: %s", e)
+    return table
@@ -0,0 +1,253 @@
+"""Incrementally maintained per-user rollups of sensor_readings.
+
+Every ingested batch is folded into minute/hour/day buckets in
+sensor_rollups (count, min, max, sum -> mean, last value, low-SpO2 count)
+with one upsert per batch, inside the same transaction as the raw insert.
+Charts then read a few hundred rollup rows instead of millions of raw ones.
+
+Seed or repair the table from raw history (with ingestion paused):
+    python rollups.py --rebuild
+Archived readings (retention.py) are read back from the archive files, so a
+rebuild keeps the chart history of archived months.
+"""
+import itertools
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+import retention
+from models import SensorReading, SensorRollup
+
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+ROLLUP_LOW_SPO2 = float(os.getenv("ROLLUP_LOW_SPO2", "90"))
+ROLLUP_UPSERT_CHUNK = 500
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_start(timestamp: datetime, resolution: int) -> datetime:
+    seconds = int((timestamp - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+
+def aggregate(readings) -> list:
+    """Fold readings (dicts with user_id, heart_rate, spo2, timestamp) into bucket rows."""
+    buckets = {}
+    for reading in readings:
+        ts = reading["timestamp"]
+        hr = float(reading["heart_rate"])
+        spo2 = float(reading["spo2"])
+        low = 1 if spo2 < ROLLUP_LOW_SPO2 else 0
+        for resolution in RESOLUTIONS.values():
+            key = (reading["user_id"], resolution, bucket_start(ts, resolution))
+            row = buckets.get(key)
+            if row is None:
+                buckets[key] = {
+                    "user_id": key[0], "resolution": resolution, "bucket_start": key[2],
+                    "count": 1,
+                    "hr_min": hr, "hr_max": hr, "hr_sum": hr,
+                    "spo2_min": spo2, "spo2_max": spo2, "spo2_sum": spo2,
+                    "low_spo2_count": low,
+                    "last_timestamp": ts, "last_heart_rate": hr, "last_spo2": spo2,
+                }
+                continue
+            row["count"] += 1
+            row["hr_min"] = min(row["hr_min"], hr)
+            row["hr_max"] = max(row["hr_max"], hr)
+            row["hr_sum"] += hr
+            row["spo2_min"] = min(row["spo2_min"], spo2)
+            row["spo2_max"] = max(row["spo2_max"], spo2)
+            row["spo2_sum"] += spo2
+            row["low_spo2_count"] += low
+            if ts >= row["last_timestamp"]:
+                row["last_timestamp"], row["last_heart_rate"], row["last_spo2"] = ts, hr, spo2
+    return list(buckets.values())
+
+
+def _merge_assignments(table, new, least, greatest):
+    """Column updates folding an incoming bucket row into the stored one.
+
+    Returned as an ordered list: MySQL evaluates ON DUPLICATE KEY UPDATE
+    left to right, so last_timestamp must be assigned after the values
+    that are compared against its old value.
+    """
+    newer = new.last_timestamp >= table.c.last_timestamp
+    return [
+        ("count", table.c.count + new.count),
+        ("hr_min", least(table.c.hr_min, new.hr_min)),
+        ("hr_max", greatest(table.c.hr_max, new.hr_max)),
+        ("hr_sum", table.c.hr_sum + new.hr_sum),
+        ("spo2_min", least(table.c.spo2_min, new.spo2_min)),
+        ("spo2_max", greatest(table.c.spo2_max, new.spo2_max)),
+        ("spo2_sum", table.c.spo2_sum + new.spo2_sum),
+        ("low_spo2_count", table.c.low_spo2_count + new.low_spo2_count),
+        ("last_heart_rate", case((newer, new.last_heart_rate), else_=table.c.last_heart_rate)),
+        ("last_spo2", case((newer, new.last_spo2), else_=table.c.last_spo2)),
+        ("last_timestamp", case((newer, new.last_timestamp), else_=table.c.last_timestamp)),
+    ]
+
+
+def _merge_in_python(db: Session, rows: list):
+    for row in rows:
+        key = (row["user_id"], row["resolution"], row["bucket_start"])
+        existing = db.get(SensorRollup, key)
+        if existing is None:
+            db.add(SensorRollup(**row))
+            continue
+        existing.count += row["count"]
+        existing.hr_min = min(existing.hr_min, row["hr_min"])
+        existing.hr_max = max(existing.hr_max, row["hr_max"])
+        existing.hr_sum += row["hr_sum"]
+        existing.spo2_min = min(existing.spo2_min, row["spo2_min"])
+        existing.spo2_max = max(existing.spo2_max, row["spo2_max"])
+        existing.spo2_sum += row["spo2_sum"]
+        existing.low_spo2_count += row["low_spo2_count"]
+        if row["last_timestamp"] >= existing.last_timestamp:
+            existing.last_timestamp = row["last_timestamp"]
+            existing.last_heart_rate = row["last_heart_rate"]
+            existing.last_spo2 = row["last_spo2"]
+    db.flush()
+
+
+def apply_readings(db: Session, readings):
+    """Upsert the rollup buckets touched by readings. The caller commits."""
+    rows = aggregate(readings)
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("mysql", "sqlite", "postgresql"):
+        _merge_in_python(db, rows)
+        return
+    # Keep each multi-row upsert well under the drivers' bind-parameter limits
+    for i in range(0, len(rows), ROLLUP_UPSERT_CHUNK):
+        db.execute(_upsert(dialect, rows[i:i + ROLLUP_UPSERT_CHUNK]))
+
+
+def _upsert(dialect: str, rows: list):
+    table = SensorRollup.__table__
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(table).values(rows)
+        return stmt.on_duplicate_key_update(
+            _merge_assignments(table, stmt.inserted, func.least, func.greatest)
+        )
+
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        least, greatest = func.min, func.max   # two-argument min/max are scalar in SQLite
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+        least, greatest = func.least, func.greatest
+
+    stmt = insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.resolution, table.c.bucket_start],
+        set_=dict(_merge_assignments(table, stmt.excluded, least, greatest)),
+    )
+
+
+def pick_resolution(since: datetime, until: datetime, max_points: int) -> str:
+    """Finest resolution whose bucket count over the range fits in max_points."""
+    span = max((until - since).total_seconds(), 1)
+    for name, seconds in sorted(RESOLUTIONS.items(), key=lambda item: item[1]):
+        if span / seconds <= max_points:
+            return name
+    return "day"
+
+
+def query_series(db: Session, user_id: int, since: datetime, until: datetime, max_points: int = 500):
+    """(resolution name, list of point dicts) for a user's chart over [since, until)."""
+    name = pick_resolution(since, until, max_points)
+    resolution = RESOLUTIONS[name]
+    R = SensorRollup
+    rows = (
+        db.query(R)
+        .filter(
+            R.user_id == user_id,
+            R.resolution == resolution,
+            R.bucket_start >= bucket_start(since, resolution),
+            R.bucket_start < until,
+        )
+        .order_by(R.bucket_start)
+        .all()
+    )
+    points = [
+        {
+            "bucket_start": r.bucket_start.isoformat(),
+            "count": r.count,
+            "hr_min": r.hr_min,
+            "hr_max": r.hr_max,
+            "hr_mean": r.hr_sum / r.count,
+            "hr_last": r.last_heart_rate,
+            "spo2_min": r.spo2_min,
+            "spo2_max": r.spo2_max,
+            "spo2_mean": r.spo2_sum / r.count,
+            "spo2_last": r.last_spo2,
+            "low_spo2_count": r.low_spo2_count,
+        }
+        for r in rows
+    ]
+    return name, points
+
+
+def _hot_readings(db: Session, chunk_size: int):
+    last_id = 0
+    SR = SensorReading
+    while True:
+        rows = (
+            db.query(SR.id, SR.user_id, SR.heart_rate, SR.spo2, SR.timestamp)
+            .filter(SR.id > last_id, SR.timestamp.isnot(None), SR.heart_rate.isnot(None), SR.spo2.isnot(None))
+            .order_by(SR.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [r._asdict() for r in rows]
+
+
+def _archived_readings(db: Session, chunk_size: int):
+    for rows in retention.iter_archived_rows(db, "sensor_readings", chunk_size):
+        readings = [
+            {"user_id": r.user_id, "heart_rate": r.heart_rate, "spo2": r.spo2, "timestamp": r.timestamp}
+            for r in rows if r.heart_rate is not None and r.spo2 is not None
+        ]
+        for i in range(0, len(readings), chunk_size):
+            yield readings[i:i + chunk_size]
+
+
+def rebuild(db: Session, chunk_size: int = 10000):
+    """Recompute every rollup from sensor_readings and the archive, streaming raw rows."""
+    db.query(SensorRollup).delete()
+    db.commit()
+    total = 0
+    for readings in itertools.chain(_hot_readings(db, chunk_size), _archived_readings(db, chunk_size)):
+        apply_readings(db, readings)
+        db.commit()
+        total += len(readings)
+        print(f"🔁 {total} readings rolled up")
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain sensor_rollups")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all rollups from raw readings")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        session = SessionLocal()
+        try:
+            print(f"✅ Rebuilt rollups from {rebuild(session, args.chunk_size)} readings")
+        finally:
+            session.close()
+    else:
+        parser.print_help()
@@ -27,6 +27,20 @@ class HealthRecord(HealthRecordBase):
     class Config:
         orm_mode = True
 
+# Matches the health_records table (what GET /patients/{id}/records/ returns)
+class HealthRecordOut(BaseModel):
+    id: int
+    patient_id: Optional[int] = None
+    heart_rate: Optional[int] = None
+    spo2: Optional[int] = None
+    glucose: Optional[int] = None
+    temperature: Optional[float] = None
+    status: Optional[str] = None
+    timestamp: Optional[datetime.datetime] = None
+
+    class Config:
+        orm_mode = True
+
 # ==== Patient ====
 class PatientBase(BaseModel):
     fullname: str  # Matches DB (used as name)
@@ -0,0 +1,221 @@
+"""Compact binary bodies for POST /sensor-readings and /sensor-readings/batch.
+
+Devices may send readings as JSON (unchanged), as a fixed little-endian
+struct layout, or as MessagePack; the route picks the decoder from the
+Content-Type header. The binary decoders skip pydantic and check each field
+against FIELD_RANGES instead. A struct body is decoded with one
+np.frombuffer call and the range checks run over whole columns.
+
+The wire format is specified in docs/sensor-payload.md; encode_struct() and
+encode_msgpack() are the reference encoders.
+
+MessagePack support needs the optional `msgpack` package; without it those
+requests get 415.
+"""
+import struct
+from datetime import datetime, timedelta
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+STRUCT_CONTENT_TYPES = ("application/vnd.latestback.sensor", "application/octet-stream")
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack")
+BINARY_CONTENT_TYPES = STRUCT_CONTENT_TYPES + MSGPACK_CONTENT_TYPES
+
+STRUCT_VERSION = 1
+FLAG_TIMESTAMPS = 0x01
+
+# version u8, flags u8, record count u16
+HEADER = struct.Struct("<BBH")
+RECORD_FIELDS = [("user_id", "<u4"), ("heart_rate", "<u2"), ("spo2", "u1"), ("ir", "<u4"), ("red", "<u4")]
+RECORD = np.dtype(RECORD_FIELDS)
+RECORD_WITH_TIMESTAMP = np.dtype(RECORD_FIELDS + [("timestamp_ms", "<i8")])
+
+INT32_MAX = 2 ** 31 - 1
+# Inclusive bounds per field; the same for struct and MessagePack bodies.
+# Integer columns are signed 32-bit in the database.
+FIELD_RANGES = {
+    "user_id": (0, INT32_MAX),
+    "heart_rate": (0, 65535),
+    "spo2": (0, 255),
+    "ir": (0, INT32_MAX),
+    "red": (0, INT32_MAX),
+}
+# Unix milliseconds; 0 (or absent) means "use the server's receive time"
+TIMESTAMP_MS_RANGE = (0, 253402300799999)   # up to 9999-12-31T23:59:59.999
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class PayloadError(Exception):
+    """The body as a whole can't be decoded (bad framing, version or type)."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def media_type(content_type: str) -> str:
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+def is_binary(content_type: str) -> bool:
+    return media_type(content_type) in BINARY_CONTENT_TYPES
+
+
+def _range_error(field: str, low, high) -> dict:
+    return {
+        "loc": [field],
+        "msg": f"ensure this value is between {low} and {high}",
+        "type": "value_error.number.range",
+    }
+
+
+def _timestamp(ms: int):
+    return EPOCH + timedelta(milliseconds=ms) if ms else None
+
+
+def decode_struct(body: bytes, max_records: int):
+    """(rows, errors) from a struct body; errors is [(index, [error, ...])] for rejected records."""
+    if len(body) < HEADER.size:
+        raise PayloadError("Body shorter than the 4-byte header")
+    version, flags, count = HEADER.unpack_from(body)
+    if version != STRUCT_VERSION:
+        raise PayloadError(f"Unsupported payload version {version} (expected {STRUCT_VERSION})")
+    if flags & ~FLAG_TIMESTAMPS:
+        raise PayloadError(f"Unknown flags 0x{flags:02x}")
+    if count > max_records:
+        raise PayloadError(f"Too many readings (max {max_records})", status_code=413)
+    dtype = RECORD_WITH_TIMESTAMP if flags & FLAG_TIMESTAMPS else RECORD
+    if len(body) != HEADER.size + count * dtype.itemsize:
+        raise PayloadError(
+            f"Body is {len(body)} bytes, expected {HEADER.size + count * dtype.itemsize} "
+            f"for {count} records of {dtype.itemsize} bytes"
+        )
+
+    records = np.frombuffer(body, dtype=dtype, count=count, offset=HEADER.size)
+    columns = {name: records[name] for name in dtype.names}
+    # Unsigned wire types can't go below zero; only the upper bounds can be violated
+    bad = {
+        field: columns[field] > high
+        for field, (low, high) in FIELD_RANGES.items()
+        if high < np.iinfo(columns[field].dtype).max
+    }
+    if "timestamp_ms" in columns:
+        low, high = TIMESTAMP_MS_RANGE
+        bad["timestamp_ms"] = (columns["timestamp_ms"] < low) | (columns["timestamp_ms"] > high)
+
+    rejected = np.zeros(count, dtype=bool)
+    for mask in bad.values():
+        rejected |= mask
+
+    errors = []
+    for index in np.flatnonzero(rejected).tolist():
+        errors.append((index, [
+            _range_error(field, *(FIELD_RANGES.get(field) or TIMESTAMP_MS_RANGE))
+            for field, mask in bad.items() if mask[index]
+        ]))
+
+    keep = ~rejected
+    lists = {name: column[keep].tolist() for name, column in columns.items()}
+    timestamps = lists.pop("timestamp_ms", None) or [0] * len(lists["user_id"])
+    rows = [
+        {"user_id": u, "heart_rate": hr, "spo2": s, "ir": ir, "red": red, "timestamp": _timestamp(ts)}
+        for u, hr, s, ir, red, ts in zip(
+            lists["user_id"], lists["heart_rate"], lists["spo2"], lists["ir"], lists["red"], timestamps
+        )
+    ]
+    return rows, errors
+
+
+def _check_item(item) -> tuple:
+    """(row, errors) for one MessagePack map."""
+    if not isinstance(item, dict):
+        return None, [{"loc": [], "msg": "value is not a valid dict", "type": "type_error.dict"}]
+    row, errors = {}, []
+    for field, (low, high) in FIELD_RANGES.items():
+        value = item.get(field)
+        if value is None:
+            errors.append({"loc": [field], "msg": "field required", "type": "value_error.missing"})
+        elif isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+            errors.append({"loc": [field], "msg": "value is not a valid integer", "type": "type_error.integer"})
+        elif not low <= value <= high:
+            errors.append(_range_error(field, low, high))
+        else:
+            row[field] = int(value)
+    ts = item.get("timestamp_ms") or 0
+    if isinstance(ts, bool) or not isinstance(ts, int) or not TIMESTAMP_MS_RANGE[0] <= ts <= TIMESTAMP_MS_RANGE[1]:
+        errors.append(_range_error("timestamp_ms", *TIMESTAMP_MS_RANGE))
+    else:
+        row["timestamp"] = _timestamp(ts)
+    return (None, errors) if errors else (row, [])
+
+
+def decode_msgpack(body: bytes, max_records: int):
+    """(rows, errors) from a MessagePack map (one reading) or array of maps."""
+    if msgpack is None:
+        raise PayloadError("MessagePack bodies need the msgpack package on the server", status_code=415)
+    try:
+        payload = msgpack.unpackb(body, raw=False, strict_map_key=False)
+    except Exception as e:
+        raise PayloadError(f"Invalid MessagePack body: {e}")
+    items = payload if isinstance(payload, list) else [payload]
+    if len(items) > max_records:
+        raise PayloadError(f"Too many readings (max {max_records})", status_code=413)
+
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        row, item_errors = _check_item(item)
+        if item_errors:
+            errors.append((index, item_errors))
+        else:
+            rows.append(row)
+    return rows, errors
+
+
+def decode(content_type: str, body: bytes, max_records: int):
+    """(rows, errors) for a binary body; rows have user_id, heart_rate, spo2, ir, red, timestamp (None = now)."""
+    if media_type(content_type) in MSGPACK_CONTENT_TYPES:
+        return decode_msgpack(body, max_records)
+    return decode_struct(body, max_records)
+
+
+def _timestamp_ms(reading) -> int:
+    ts = reading.get("timestamp")
+    if ts is None:
+        return int(reading.get("timestamp_ms") or 0)
+    return (ts - EPOCH) // timedelta(milliseconds=1)
+
+
+def encode_struct(readings, timestamps: bool = None) -> bytes:
+    """Reference encoder: readings (dicts with the FIELD_RANGES keys, optional timestamp) -> struct body."""
+    readings = list(readings)
+    if timestamps is None:
+        timestamps = any(r.get("timestamp") is not None or r.get("timestamp_ms") for r in readings)
+    dtype = RECORD_WITH_TIMESTAMP if timestamps else RECORD
+    records = np.zeros(len(readings), dtype=dtype)
+    for i, reading in enumerate(readings):
+        for field in FIELD_RANGES:
+            records[field][i] = reading[field]
+        if timestamps:
+            records["timestamp_ms"][i] = _timestamp_ms(reading)
+    header = HEADER.pack(STRUCT_VERSION, FLAG_TIMESTAMPS if timestamps else 0, len(readings))
+    return header + records.tobytes()
+
+
+def encode_msgpack(readings) -> bytes:
+    """Reference encoder: a list of readings -> MessagePack array of maps."""
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    items = []
+    for reading in readings:
+        item = {field: int(reading[field]) for field in FIELD_RANGES}
+        ts = _timestamp_ms(reading)
+        if ts:
+            item["timestamp_ms"] = ts
+        items.append(item)
+    return msgpack.packb(items)
@@ -0,0 +1,164 @@
+"""Pre-fork server for the FastAPI app (main.app).
+
+`uvicorn main:app --workers N` starts N fresh interpreters, and each one
+imports everything and loads the risk model on its own. This script
+imports main and loads the model once in the parent. It freezes the GC so
+that heap stays shared copy-on-write, then forks the workers, which all
+accept on one listening socket:
+
+    python init_db.py                     # schema, once per deploy
+    python serve.py --workers 4 --port 8000
+
+Each worker opens its own database pools (database.py drops the parent's
+after fork) and runs the startup hooks itself (ingest writer, live hub
+loop, model watcher). A worker that dies is replaced. SIGTERM/SIGINT shut
+the workers down gracefully, and stragglers are killed after
+SERVE_GRACEFUL_TIMEOUT seconds.
+
+Knobs (environment variables, overridden by the flags):
+    SERVE_HOST / SERVE_PORT      listen address (default 0.0.0.0:8000)
+    SERVE_WORKERS                worker processes (default: CPU count)
+    SERVE_BACKLOG                listen backlog
+    SERVE_GRACEFUL_TIMEOUT       seconds to wait for workers on shutdown
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+
+SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", str(os.cpu_count() or 1)))
+SERVE_BACKLOG = int(os.getenv("SERVE_BACKLOG", "2048"))
+SERVE_GRACEFUL_TIMEOUT = float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30"))
+
+# Workers replaced faster than this are crashing on start; slow down instead of spinning
+RESPAWN_BACKOFF_SECONDS = 1.0
+
+
+def bind_socket(host: str, port: int, backlog: int = SERVE_BACKLOG) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, log_level: str):
+    """Body of a forked worker; never returns."""
+    import uvicorn
+
+    status = 0
+    try:
+        gc.enable()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        config = uvicorn.Config(app, lifespan="on", log_level=log_level)
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        import traceback
+
+        traceback.print_exc()
+        status = 1
+    finally:
+        os._exit(status)
+
+
+class Arbiter:
+    """Forks the workers and keeps that many running until told to stop."""
+
+    def __init__(self, app, sock: socket.socket, workers: int, log_level: str = "info"):
+        self.app = app
+        self.sock = sock
+        self.size = workers
+        self.log_level = log_level
+        self.workers = {}   # pid -> started at
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.app, self.sock, self.log_level)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def stop(self, signum=None, frame=None):
+        # waitpid() resumes after a signal handler, so it is the workers
+        # exiting that wakes the loop up
+        self.stopping = True
+        self.signal_workers(signal.SIGTERM)
+
+    def signal_workers(self, signum):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                self.workers.pop(pid, None)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.size):
+            self.spawn()
+        print(f"🚀 {self.size} workers forked from {os.getpid()}, serving on {self.sock.getsockname()}")
+
+        while not self.stopping:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            started = self.workers.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"⚠️ Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, replacing it")
+            if time.monotonic() - started < RESPAWN_BACKOFF_SECONDS:
+                time.sleep(RESPAWN_BACKOFF_SECONDS)
+            self.spawn()
+        self.shutdown()
+
+    def shutdown(self):
+        self.signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + SERVE_GRACEFUL_TIMEOUT
+        while self.workers and time.monotonic() < deadline:
+            for pid in list(self.workers):
+                done, _ = os.waitpid(pid, os.WNOHANG)
+                if done:
+                    self.workers.pop(pid)
+            time.sleep(0.1)
+        for pid in self.workers:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        print("👋 Workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve main.app from pre-forked workers")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # No collections while the shared heap is built: a collection would
+    # touch (and so copy) pages the workers could otherwise share
+    gc.disable()
+    sock = bind_socket(args.host, args.port)
+
+    import main as api
+    import utils
+
+    started = time.perf_counter()
+    utils.load_models()
+    print(f"✅ Risk model loaded once in the parent ({time.perf_counter() - started:.2f}s)")
+
+    # Everything allocated so far is left out of the workers' collections
+    gc.freeze()
+    Arbiter(api.app, sock, args.workers, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main()
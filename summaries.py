@@ -0,0 +1,390 @@
+"""Per-patient summary (GET /patients/{id}/summary) maintained on every record write.
+
+crud.create_health_record and crud.delete_record update, in the record's
+own transaction:
+
+  * patient_summaries: one row per patient with the record count, the
+    count per risk status and the latest record's vitals, folded in with
+    a single upsert on insert;
+  * patient_record_hours: hourly count/min/max/sum of heart rate and SpO2
+    for the last SUMMARY_KEEP_HOURS, from which the 24h and 7d statistics
+    are read (windows are aligned to whole hours, the current hour
+    included).
+
+A delete decrements the counters and recomputes the one affected hour (and
+the latest vitals, if the newest record was deleted) from health_records,
+through the (patient_id, timestamp) index. Rendering a patient card is then
+a primary-key read plus at most SUMMARY_KEEP_HOURS small rows, whatever
+the length of the patient's history.
+
+Counts are all-time: retention.py archiving a record doesn't remove it from
+its summary. backfill_risk.py moves rescored records between the status
+counters with statuses_changed(), in the transaction of each chunk. Seed or
+repair after other bulk changes that bypass crud (manual SQL); a rebuild
+counts health_records plus the records retention.py moved to the archive:
+    python summaries.py --rebuild
+"""
+import itertools
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, case, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+import retention
+from models import HealthRecord, PatientRecordHour, PatientSummary
+
+SUMMARY_KEEP_HOURS = int(os.getenv("SUMMARY_KEEP_HOURS", "168"))
+
+STATUS_COLUMNS = {
+    "Normal": "normal_count",
+    "Slightly Normal": "slightly_normal_count",
+    "At Risk": "at_risk_count",
+}
+OTHER_COLUMN = "other_count"
+
+# How stored and incoming rows combine, per table
+SUMMARY_MERGE = {
+    "keys": ("patient_id",),
+    "sum": ("record_count", "normal_count", "slightly_normal_count", "at_risk_count", "other_count"),
+    "latest_by": "latest_timestamp",
+    "latest": ("latest_record_id", "latest_heart_rate", "latest_spo2", "latest_status"),
+}
+HOUR_MERGE = {
+    "keys": ("patient_id", "bucket_start"),
+    "sum": ("count", "hr_sum", "spo2_sum"),
+    "min": ("hr_min", "spo2_min"),
+    "max": ("hr_max", "spo2_max"),
+}
+
+
+def hour_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def status_column(status) -> str:
+    return STATUS_COLUMNS.get(status, OTHER_COLUMN)
+
+
+def _merge_assignments(table, new, spec, least, greatest):
+    """Ordered column updates folding new into the stored row (latest_by last, for MySQL)."""
+    out = [(col, table.c[col] + new[col]) for col in spec.get("sum", ())]
+    out += [(col, least(table.c[col], new[col])) for col in spec.get("min", ())]
+    out += [(col, greatest(table.c[col], new[col])) for col in spec.get("max", ())]
+    by = spec.get("latest_by")
+    if by:
+        newer = or_(table.c[by].is_(None), new[by] >= table.c[by])
+        out += [(col, case((newer, new[col]), else_=table.c[col])) for col in spec["latest"] + (by,)]
+    return out
+
+
+def _merge_in_python(db: Session, model, row: dict, spec: dict):
+    existing = db.get(model, tuple(row[k] for k in spec["keys"]))
+    if existing is None:
+        db.add(model(**row))
+        db.flush()
+        return
+    for col in spec.get("sum", ()):
+        setattr(existing, col, getattr(existing, col) + row[col])
+    for col in spec.get("min", ()):
+        setattr(existing, col, min(getattr(existing, col), row[col]))
+    for col in spec.get("max", ()):
+        setattr(existing, col, max(getattr(existing, col), row[col]))
+    by = spec.get("latest_by")
+    if by and (getattr(existing, by) is None or row[by] >= getattr(existing, by)):
+        for col in spec["latest"] + (by,):
+            setattr(existing, col, row[col])
+    db.flush()
+
+
+def _upsert(db: Session, model, row: dict, spec: dict):
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(table).values(row)
+        db.execute(stmt.on_duplicate_key_update(
+            _merge_assignments(table, stmt.inserted, spec, func.least, func.greatest)))
+        return
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        least, greatest = func.min, func.max   # two-argument min/max are scalar in SQLite
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        least, greatest = func.least, func.greatest
+    else:
+        _merge_in_python(db, model, row, spec)
+        return
+    stmt = insert(table).values(row)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c[k] for k in spec["keys"]],
+        set_=dict(_merge_assignments(table, stmt.excluded, spec, least, greatest)),
+    ))
+
+
+def _summary_row(record) -> dict:
+    row = {"patient_id": record.patient_id, "record_count": 1}
+    for col in SUMMARY_MERGE["sum"][1:]:
+        row[col] = 0
+    row[status_column(record.status)] = 1
+    row.update({
+        "latest_record_id": record.id,
+        "latest_timestamp": record.timestamp,
+        "latest_heart_rate": record.heart_rate,
+        "latest_spo2": record.spo2,
+        "latest_status": record.status,
+    })
+    return row
+
+
+def _hour_row(record) -> dict:
+    hr, spo2 = float(record.heart_rate), float(record.spo2)
+    return {
+        "patient_id": record.patient_id, "bucket_start": hour_start(record.timestamp), "count": 1,
+        "hr_min": hr, "hr_max": hr, "hr_sum": hr, "spo2_min": spo2, "spo2_max": spo2, "spo2_sum": spo2,
+    }
+
+
+def _has_vitals(record) -> bool:
+    return record.timestamp is not None and record.heart_rate is not None and record.spo2 is not None
+
+
+def record_added(db: Session, record):
+    """Fold a flushed health record into its patient's summary. The caller commits."""
+    if record.patient_id is None:
+        return
+    _upsert(db, PatientSummary, _summary_row(record), SUMMARY_MERGE)
+    if _has_vitals(record):
+        _upsert(db, PatientRecordHour, _hour_row(record), HOUR_MERGE)
+    # Hours that have left the 7d window
+    db.execute(delete(PatientRecordHour).where(
+        PatientRecordHour.patient_id == record.patient_id,
+        PatientRecordHour.bucket_start < hour_start(datetime.now()) - timedelta(hours=SUMMARY_KEEP_HOURS),
+    ))
+
+
+def _refresh_latest(db: Session, patient_id: int):
+    latest = db.execute(
+        select(HealthRecord.id, HealthRecord.timestamp, HealthRecord.heart_rate, HealthRecord.spo2, HealthRecord.status)
+        .where(HealthRecord.patient_id == patient_id)
+        .order_by(HealthRecord.timestamp.desc(), HealthRecord.id.desc())
+        .limit(1)
+    ).first()
+    values = dict(zip(
+        ("latest_record_id", "latest_timestamp", "latest_heart_rate", "latest_spo2", "latest_status"),
+        latest if latest is not None else (None,) * 5,
+    ))
+    db.execute(update(PatientSummary).where(PatientSummary.patient_id == patient_id).values(**values))
+
+
+def _recompute_hour(db: Session, patient_id: int, bucket: datetime):
+    HR = HealthRecord
+    count, hr_min, hr_max, hr_sum, spo2_min, spo2_max, spo2_sum = db.execute(
+        select(func.count(), func.min(HR.heart_rate), func.max(HR.heart_rate), func.sum(HR.heart_rate),
+               func.min(HR.spo2), func.max(HR.spo2), func.sum(HR.spo2))
+        .where(
+            HR.patient_id == patient_id,
+            HR.timestamp >= bucket,
+            HR.timestamp < bucket + timedelta(hours=1),
+            HR.heart_rate.isnot(None),
+            HR.spo2.isnot(None),
+        )
+    ).one()
+    H = PatientRecordHour
+    db.execute(delete(H).where(H.patient_id == patient_id, H.bucket_start == bucket))
+    if count:
+        db.execute(H.__table__.insert().values(
+            patient_id=patient_id, bucket_start=bucket, count=count,
+            hr_min=hr_min, hr_max=hr_max, hr_sum=hr_sum, spo2_min=spo2_min, spo2_max=spo2_max, spo2_sum=spo2_sum,
+        ))
+
+
+def record_removed(db: Session, record):
+    """Take a deleted (and flushed) record out of its patient's summary. The caller commits."""
+    if record.patient_id is None:
+        return
+    S = PatientSummary
+    column = status_column(record.status)
+    db.execute(
+        update(S).where(S.patient_id == record.patient_id)
+        .values({S.record_count: S.record_count - 1, getattr(S, column): getattr(S, column) - 1})
+    )
+    latest_id = db.execute(select(S.latest_record_id).where(S.patient_id == record.patient_id)).scalar()
+    if latest_id == record.id:
+        _refresh_latest(db, record.patient_id)
+    if _has_vitals(record):
+        _recompute_hour(db, record.patient_id, hour_start(record.timestamp))
+
+
+def _window(hours, since: datetime) -> dict:
+    rows = [h for h in hours if h.bucket_start >= since]
+    count = sum(h.count for h in rows)
+    if not count:
+        return {"count": 0, "heart_rate": None, "spo2": None}
+    return {
+        "count": count,
+        "heart_rate": {
+            "min": min(h.hr_min for h in rows),
+            "max": max(h.hr_max for h in rows),
+            "mean": round(sum(h.hr_sum for h in rows) / count, 1),
+        },
+        "spo2": {
+            "min": min(h.spo2_min for h in rows),
+            "max": max(h.spo2_max for h in rows),
+            "mean": round(sum(h.spo2_sum for h in rows) / count, 1),
+        },
+    }
+
+
+def get_summary(db: Session, patient_id: int, now: datetime = None):
+    """The summary served by GET /patients/{id}/summary, or None if the patient has no records."""
+    summary = db.get(PatientSummary, patient_id)
+    if summary is None or summary.record_count <= 0:
+        return None
+    now = now or datetime.now()
+    current = hour_start(now)
+    hours = (
+        db.query(PatientRecordHour)
+        .filter(
+            PatientRecordHour.patient_id == patient_id,
+            PatientRecordHour.bucket_start > current - timedelta(hours=SUMMARY_KEEP_HOURS),
+        )
+        .all()
+    )
+    latest = None
+    if summary.latest_record_id is not None:
+        latest = {
+            "record_id": summary.latest_record_id,
+            "heart_rate": summary.latest_heart_rate,
+            "spo2": summary.latest_spo2,
+            "status": summary.latest_status,
+            "timestamp": summary.latest_timestamp,
+        }
+    return {
+        "patient_id": patient_id,
+        "record_count": summary.record_count,
+        "status_counts": {
+            **{status: getattr(summary, column) for status, column in STATUS_COLUMNS.items()},
+            "Other": summary.other_count,
+        },
+        "latest": latest,
+        "seconds_since_last_reading": (
+            round((now - summary.latest_timestamp).total_seconds(), 1) if summary.latest_timestamp else None
+        ),
+        "last_24h": _window(hours, current - timedelta(hours=23)),
+        "last_7d": _window(hours, current - timedelta(hours=SUMMARY_KEEP_HOURS - 1)),
+    }
+
+
+def statuses_changed(db: Session, changes):
+    """Move rescored records between the status counters. The caller commits.
+
+    changes: (patient_id, record_id, old status, new status) tuples.
+    """
+    deltas, latest = {}, {}
+    for patient_id, record_id, old, new in changes:
+        if patient_id is None or old == new:
+            continue
+        delta = deltas.setdefault(patient_id, Counter())
+        delta[status_column(old)] -= 1
+        delta[status_column(new)] += 1
+        latest[(patient_id, record_id)] = new
+    if not deltas:
+        return
+    S = PatientSummary.__table__
+    columns = list(STATUS_COLUMNS.values()) + [OTHER_COLUMN]
+    db.execute(
+        update(S).where(S.c.patient_id == bindparam("pid"))
+        .values({col: S.c[col] + bindparam(f"d_{col}") for col in columns}),
+        [{"pid": pid, **{f"d_{col}": delta[col] for col in columns}} for pid, delta in deltas.items()],
+    )
+    # The latest record's status is shown on the card too
+    for patient_id, latest_id in db.execute(
+        select(S.c.patient_id, S.c.latest_record_id).where(S.c.patient_id.in_(list(deltas)))
+    ):
+        if (patient_id, latest_id) in latest:
+            db.execute(update(S).where(S.c.patient_id == patient_id)
+                       .values(latest_status=latest[(patient_id, latest_id)]))
+
+
+def _hot_records(db: Session, chunk_size: int):
+    last_id = 0
+    HR = HealthRecord
+    while True:
+        rows = (
+            db.query(HR.id, HR.patient_id, HR.heart_rate, HR.spo2, HR.status, HR.timestamp)
+            .filter(HR.id > last_id, HR.patient_id.isnot(None))
+            .order_by(HR.id)
+            .limit(chunk_size)
+            .all()
+        )
+        db.rollback()  # release the read snapshot between chunks
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def rebuild(db: Session, chunk_size: int = 10000):
+    """Recompute every summary and hour row from health_records and the archive, streaming rows."""
+    db.query(PatientSummary).delete()
+    db.query(PatientRecordHour).delete()
+    db.commit()
+    summaries, hours = {}, {}
+    keep_since = hour_start(datetime.now()) - timedelta(hours=SUMMARY_KEEP_HOURS - 1)
+    total = 0
+    for rows in itertools.chain(_hot_records(db, chunk_size), retention.iter_archived_rows(db, "health_records", chunk_size)):
+        for record in rows:
+            row = _summary_row(record)
+            existing = summaries.get(record.patient_id)
+            if existing is None:
+                summaries[record.patient_id] = row
+            else:
+                for col in SUMMARY_MERGE["sum"]:
+                    existing[col] += row[col]
+                newer = (record.timestamp or datetime.min, record.id) >= (
+                    existing["latest_timestamp"] or datetime.min, existing["latest_record_id"])
+                if newer:
+                    for col in SUMMARY_MERGE["latest"] + ("latest_timestamp",):
+                        existing[col] = row[col]
+            if _has_vitals(record) and record.timestamp >= keep_since:
+                row = _hour_row(record)
+                key = (row["patient_id"], row["bucket_start"])
+                existing = hours.get(key)
+                if existing is None:
+                    hours[key] = row
+                else:
+                    for col in HOUR_MERGE["sum"]:
+                        existing[col] += row[col]
+                    for col in HOUR_MERGE["min"]:
+                        existing[col] = min(existing[col], row[col])
+                    for col in HOUR_MERGE["max"]:
+                        existing[col] = max(existing[col], row[col])
+        total += len(rows)
+        print(f"🔁 {total} records summarized")
+
+    for model, rows in ((PatientSummary, list(summaries.values())), (PatientRecordHour, list(hours.values()))):
+        for i in range(0, len(rows), chunk_size):
+            db.execute(model.__table__.insert(), rows[i:i + chunk_size])
+    db.commit()
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain patient_summaries / patient_record_hours")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every summary from health_records")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        session = SessionLocal()
+        try:
+            print(f"✅ Rebuilt patient summaries from {rebuild(session, args.chunk_size)} records")
+        finally:
+            session.close()
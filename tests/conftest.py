@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The modules live at the repository root (flat layout); model files are found relative to it
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# Tests run against a throwaway SQLite database (see db_sqlite.py) and archive directory
+_TMP = tempfile.mkdtemp(prefix="latestback-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_TMP, 'test.db')}")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(_TMP, "archive"))
+
+
+@pytest.fixture(scope="session")
+def schema():
+    import init_db
+
+    init_db.init_db()
+
+
+@pytest.fixture
+def db(schema):
+    """A session on an empty database; every table is cleared afterwards."""
+    from database import Base, SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    for table in reversed(Base.metadata.sorted_tables):
+        session.execute(table.delete())
+    session.commit()
+    session.close()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    # Not entered as a context manager: the startup hooks (ingest writer, watchers) don't run
+    return TestClient(main.app)
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import alerts
+import crud
+import models
+
+START = datetime(2026, 10, 18, 8, 0)
+
+
+def _readings(spo2, count=20, user_id=5, step=15):
+    return [
+        {"user_id": user_id, "heart_rate": 80, "spo2": spo2, "ir": 1000, "red": 900,
+         "timestamp": START + timedelta(seconds=step * i)}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = alerts.AlertEngine()
+    monkeypatch.setattr(alerts, "alert_engine", engine)
+    return engine
+
+
+def test_sustained_low_spo2_fires_once_and_is_stored(db, engine):
+    crud.create_sensor_readings(db, _readings(spo2=85))
+    stored = db.query(models.Alert).all()
+    assert [(a.user_id, a.rule, a.severity) for a in stored] == [(5, "spo2_low_sustained", "high")]
+    # Still low: the rule stays active instead of firing again
+    crud.create_sensor_readings(db, [dict(r, timestamp=r["timestamp"] + timedelta(minutes=5)) for r in _readings(85)])
+    assert db.query(models.Alert).count() == 1
+
+
+def test_normal_readings_fire_nothing(db, engine):
+    crud.create_sensor_readings(db, _readings(spo2=98))
+    assert db.query(models.Alert).count() == 0
+
+
+def test_failing_rule_does_not_fail_the_committed_write(db, engine):
+    def boom(*args):
+        raise ZeroDivisionError("rule bug")
+
+    for rule in engine.rules:
+        rule.fn = boom
+    assert crud.create_sensor_readings(db, _readings(spo2=85)) == 20
+    assert db.query(models.SensorReading).count() == 20
+    assert db.query(models.Alert).count() == 0
+
+
+def test_failing_rule_does_not_fail_the_batch(client, db, engine):
+    def boom(*args):
+        raise ZeroDivisionError("rule bug")
+
+    engine.rules[0].fn = boom
+    items = [dict(r, timestamp=r["timestamp"].isoformat()) for r in _readings(spo2=85)]
+    r = client.post("/sensor-readings/batch", json=items)
+    assert r.status_code == 200
+    assert r.json()["stored"] == 20
+    assert db.query(models.SensorReading).count() == 20
+
+
+def test_out_of_order_readings_are_skipped(engine):
+    engine.observe(_readings(spo2=98, count=3))
+    engine.observe([dict(_readings(spo2=98, count=1)[0], timestamp=START - timedelta(hours=1))])
+    assert (engine.observed, engine.out_of_order) == (3, 1)
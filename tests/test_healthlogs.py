@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import crud
+from utils import create_access_token, decode_cursor, encode_cursor
+
+START = datetime(2026, 10, 1, 12, 0)
+
+
+@pytest.mark.parametrize("ts", [datetime(2024, 1, 31, 23, 59, 59), datetime(2024, 2, 1, 0, 0, 0, 123456)])
+def test_cursor_round_trip(ts):
+    cursor = encode_cursor(ts, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (ts, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(datetime(2024, 1, 1), 1)[:-4]])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.fixture
+def readings(db):
+    # User 1: 25 readings a minute apart, three of them sharing one timestamp; user 2: noise
+    rows = [{"user_id": 1, "heart_rate": 60 + i, "spo2": 97, "ir": 1, "red": 1,
+             "timestamp": START + timedelta(minutes=min(i, 20))} for i in range(25)]
+    rows += [{"user_id": 2, "heart_rate": 99, "spo2": 97, "ir": 1, "red": 1, "timestamp": START} for _ in range(5)]
+    crud.create_sensor_readings(db, rows)
+    return rows
+
+
+def _get(client, user_id=1, **params):
+    token = create_access_token({"sub": f"user{user_id}@example.com", "user_id": user_id})
+    return client.get("/healthlogs", params=params, headers={"Authorization": f"Bearer {token}"})
+
+
+def test_pages_cover_the_callers_readings_newest_first(client, readings):
+    seen, cursor = [], None
+    while True:
+        r = _get(client, limit=7, **({"cursor": cursor} if cursor else {}))
+        assert r.status_code == 200
+        seen.extend(r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert len(seen) == 25 and len({row["id"] for row in seen}) == 25
+    assert {row["user_id"] for row in seen} == {1}
+    keys = [(row["timestamp"], row["id"]) for row in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_time_range(client, readings):
+    r = _get(client, since=(START + timedelta(minutes=5)).isoformat(), until=(START + timedelta(minutes=10)).isoformat())
+    assert [row["heart_rate"] for row in r.json()] == [69, 68, 67, 66, 65]
+    assert "X-Next-Cursor" not in r.headers
+
+
+def test_bad_cursor_and_missing_token(client, readings):
+    assert _get(client, cursor="garbage").status_code == 400
+    assert client.get("/healthlogs").status_code == 401
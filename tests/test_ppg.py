@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import models
+import ppg
+
+
+def _window(**overrides):
+    ir, red = ppg.synthesize(heart_rate=75, spo2=97, seconds=8, fs=100)
+    window = {"user_id": 9, "sample_rate": 100, "ir": ir.tolist(), "red": red.tolist()}
+    window.update(overrides)
+    return window
+
+
+def test_derive_matches_synthetic_vitals():
+    ir, red = ppg.synthesize(heart_rate=72, spo2=95, seconds=10, fs=100)
+    values = ppg.derive_windows([(ir, red, 100.0)])[0]
+    assert values["valid"]
+    assert values["heart_rate"] == pytest.approx(72, abs=2)
+    assert values["spo2"] == pytest.approx(95, abs=1)
+
+
+def test_pack_round_trip():
+    ir, _ = ppg.synthesize(heart_rate=72, spo2=95)
+    assert np.array_equal(ppg.unpack_samples(ppg.pack_samples(ir)), ir)
+
+
+def test_window_is_stored_and_derived(client, db):
+    r = client.post("/ppg-windows", json=[_window()])
+    assert r.status_code == 200, r.text
+    result = r.json()["results"][0]
+    assert result["status"] == "stored" and result["valid"]
+    assert db.query(models.SensorReading).filter_by(user_id=9).count() == 1
+
+
+@pytest.mark.parametrize("bad", [
+    lambda s: [float(x) + 0.9 for x in s],     # would truncate to the same integers
+    lambda s: [float(x) for x in s],
+    lambda s: [str(x) for x in s],
+    lambda s: [True] + s[1:],
+    lambda s: [s[:2]] + s[2:],
+], ids=["fractional", "float", "string", "bool", "nested"])
+def test_non_integer_samples_are_rejected(client, db, bad):
+    window = _window()
+    window["ir"] = bad(window["ir"])
+    r = client.post("/ppg-windows", json=[window, _window()])
+    assert r.status_code == 200, r.text
+    results = r.json()["results"]
+    assert results[0]["status"] == "invalid"
+    assert results[0]["errors"] == [{"loc": ["ir"], "msg": "must be a flat list of integers", "type": "type_error"}]
+    assert results[1]["status"] == "stored"
+
+
+def test_out_of_range_and_length_mismatch(client, db):
+    window = _window()
+    r = client.post("/ppg-windows", json=[
+        _window(ir=[-1] + window["ir"][1:]),
+        _window(red=window["red"][:-1]),
+        _window(ir=window["ir"][:50], red=window["red"][:50]),
+    ])
+    assert [res["status"] for res in r.json()["results"]] == ["invalid"] * 3
+    assert db.query(models.PpgWindow).count() == 0
@@ -0,0 +1,115 @@
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import crud
+import database
+import db_replicas
+from database import Base
+from utils import create_access_token
+
+
+def _replica_set(*urls):
+    replicas = db_replicas.ReplicaSet([create_engine(url) for url in urls])
+    # Checked by the tests themselves: don't start the background checker
+    replicas._generation = db_replicas._fork_generation
+    return replicas
+
+
+@pytest.fixture
+def replica_url(tmp_path):
+    """An empty database with the schema, standing in for a replica that hasn't caught up."""
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    return url
+
+
+def test_replica_in_rotation_after_a_passing_check(replica_url):
+    replicas = _replica_set(replica_url)
+    assert replicas.pick() is None   # never checked yet
+    replicas.check()
+    replica = replicas.pick()
+    assert replica is not None and (replica.healthy, replica.lag) == (True, 0.0)
+
+
+@pytest.mark.parametrize("query, healthy", [("SELECT 1", True), ("SELECT 30", False), ("SELECT NULL", False)])
+def test_lagging_replica_is_skipped(replica_url, monkeypatch, query, healthy):
+    monkeypatch.setattr(db_replicas, "REPLICA_LAG_QUERY", query)
+    replicas = _replica_set(replica_url)
+    replicas.check()
+    assert replicas.replicas[0].healthy is healthy
+    assert (replicas.pick() is not None) is healthy
+
+
+def test_unreachable_replica_is_skipped(replica_url, tmp_path):
+    replicas = _replica_set(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}", replica_url)
+    replicas.check()
+    broken, good = replicas.replicas
+    assert not broken.healthy and broken.last_error
+    assert {replicas.pick().name for _ in range(4)} == {good.name}
+
+
+def test_round_robin(replica_url, tmp_path):
+    other = f"sqlite:///{tmp_path / 'other.db'}"
+    replicas = _replica_set(replica_url, other)
+    replicas.check()
+    assert [replicas.pick().name for _ in range(4)] == ["replica1", "replica2", "replica1", "replica2"]
+
+
+def test_read_session_routing(replica_url, monkeypatch):
+    replicas = _replica_set(replica_url)
+    replicas.check()
+    monkeypatch.setattr(database, "replicas", replicas)
+    assert database.read_session_factory() is replicas.replicas[0].Session
+    assert database.read_session_factory(time.time()) is database.SessionLocal
+    assert database.read_session_factory(time.time() - db_replicas.READ_YOUR_WRITES_SECONDS - 1) is replicas.replicas[0].Session
+    replicas.replicas[0].healthy = False
+    assert database.read_session_factory() is database.SessionLocal
+
+
+def test_get_endpoints_read_the_replica_unless_the_caller_just_wrote(client, db, replica_url, monkeypatch):
+    replicas = _replica_set(replica_url)
+    replicas.check()
+    monkeypatch.setattr(database, "replicas", replicas)
+    crud.create_sensor_readings(db, [{"user_id": 1, "heart_rate": 70, "spo2": 97, "ir": 1, "red": 1,
+                                      "timestamp": datetime(2026, 10, 18, 9, 0)}])
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'u1@example.com', 'user_id': 1})}"}
+    assert client.get("/healthlogs", headers=headers).json() == []
+    headers[db_replicas.LAST_WRITE_HEADER] = f"{time.time():.3f}"
+    assert [row["heart_rate"] for row in client.get("/healthlogs", headers=headers).json()] == [70]
+
+
+def test_middleware_stamps_requests_that_committed():
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    engine = create_engine("sqlite://")
+    db_replicas.track_writes(engine)
+
+    def write(request):
+        with engine.begin() as conn:
+            conn.execute(text("SELECT 1"))
+        return PlainTextResponse("ok")
+
+    def read(request):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return PlainTextResponse("ok")
+
+    app = db_replicas.ReadYourWritesMiddleware(Starlette(routes=[Route("/write", write), Route("/read", read)]))
+    client = TestClient(app)
+    before = time.time()
+    r = client.get("/write")
+    stamp = float(r.headers[db_replicas.LAST_WRITE_HEADER])
+    assert before <= stamp <= time.time()
+    assert r.cookies.get(db_replicas.LAST_WRITE_COOKIE) == r.headers[db_replicas.LAST_WRITE_HEADER]
+    client.cookies.clear()
+    r = client.get("/read")
+    assert db_replicas.LAST_WRITE_HEADER not in r.headers
+    assert db_replicas.LAST_WRITE_COOKIE not in r.cookies
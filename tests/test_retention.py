@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import crud
+import exports
+import models
+import retention
+import rollups
+from database import SessionLocal
+from utils import decode_cursor
+
+NOW = datetime.utcnow().replace(microsecond=0)
+USER_ID = 3
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    return tmp_path / "archive"
+
+
+@pytest.fixture
+def readings(db):
+    """40 readings, one every 5 days going back from now."""
+    rows = [
+        {"user_id": USER_ID, "heart_rate": 60 + i, "spo2": 95 + i % 5, "ir": 1000 + i, "red": 900 + i,
+         "timestamp": NOW - timedelta(days=5 * i)}
+        for i in range(40)
+    ]
+    crud.create_sensor_readings(db, rows)
+    SR = models.SensorReading
+    return [r.id for r in db.query(SR.id).order_by(SR.timestamp, SR.id)]
+
+
+def _archive(db):
+    moved = retention.archive_table(db, "sensor_readings", NOW - timedelta(days=90))
+    assert moved > 0
+    return moved
+
+
+def _day_rollups(db):
+    R = models.SensorRollup
+    return {
+        r.bucket_start: (r.count, r.hr_sum, r.last_heart_rate)
+        for r in db.query(R).filter(R.user_id == USER_ID, R.resolution == rollups.RESOLUTIONS["day"])
+    }
+
+
+def _export_ids(**kwargs):
+    body, _, _ = exports.stream_export(SessionLocal, "sensor_readings", USER_ID, chunk_size=7, **kwargs)
+    return [json.loads(line) for line in b"".join(body).splitlines()]
+
+
+def test_archive_moves_old_rows_and_sets_the_watermark(db, archive_dir, readings):
+    moved = _archive(db)
+    assert db.query(models.SensorReading).count() == len(readings) - moved
+    assert retention.get_watermark("sensor_readings") is not None
+    archived = retention.read_archive("sensor_readings", USER_ID)
+    assert len(archived) == moved
+    assert all(r.timestamp < NOW - timedelta(days=90) for r in archived)
+
+
+def test_rollup_rebuild_keeps_archived_months(db, archive_dir, readings):
+    before = _day_rollups(db)
+    assert sum(count for count, _, _ in before.values()) == len(readings)
+    _archive(db)
+    rollups.rebuild(db)
+    assert _day_rollups(db) == before
+
+
+def test_export_includes_archived_rows(db, archive_dir, readings):
+    _archive(db)
+    rows = _export_ids()
+    assert [r["id"] for r in rows] == readings
+    # Resuming from a cursor inside the archived range
+    assert [r["id"] for r in _export_ids(after=decode_cursor(rows[4]["cursor"]))] == readings[5:]
+    since = NOW - timedelta(days=120)
+    assert len(_export_ids(since=since, until=NOW - timedelta(days=60))) == sum(
+        1 for i in range(40) if since <= NOW - timedelta(days=5 * i) < NOW - timedelta(days=60))
+
+
+def test_interrupted_archive_run_is_not_counted_twice(db, archive_dir, readings):
+    _archive(db)
+    before = _day_rollups(db)
+    # Rows written to an archive file whose delete never happened
+    SR = models.SensorReading
+    hot = db.query(SR).order_by(SR.timestamp).limit(3).all()
+    retention.write_archive("sensor_readings", USER_ID, retention.month_start(hot[0].timestamp),
+                            retention._to_arrays("sensor_readings", hot))
+    db.rollback()
+    assert [r["id"] for r in _export_ids()] == readings
+    rollups.rebuild(db)
+    assert _day_rollups(db) == before
@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+import pytest
+
+import risk_engine
+from risk_engine import LinearRiskModel
+
+
+@pytest.fixture(scope="module")
+def model():
+    return LinearRiskModel.load("risk_model.json")
+
+
+def test_artifact_matches_sklearn(model):
+    joblib = pytest.importorskip("joblib")
+    pytest.importorskip("sklearn")
+    from export_model import verification_inputs
+
+    sk_model = joblib.load("risk_model.pkl")
+    encoder = joblib.load("label_encoder.pkl")
+    X = verification_inputs()
+    expected = encoder.inverse_transform(sk_model.predict(X))
+    assert (model.predict(X) == expected).all()
+    assert [model.predict_one(*row) for row in X[::97]] == list(expected[::97])
+
+
+def test_predict_one_matches_batch(model):
+    X = np.random.default_rng(1).uniform([0, 0, 0], [250, 100, 130], size=(2000, 3))
+    assert [model.predict_one(*row) for row in X] == list(model.predict(X))
+
+
+def test_binary_model():
+    model = LinearRiskModel([[1.0, -1.0, 0.0]], [0.0], ["Normal", "At Risk"])
+    X = [[120, 90, 40], [60, 98, 40]]
+    assert list(model.predict(X)) == ["At Risk", "Normal"]
+    assert [model.predict_one(*row) for row in X] == ["At Risk", "Normal"]
+
+
+def test_save_load_round_trip(model, tmp_path):
+    path = str(tmp_path / "model.json")
+    model.save(path)
+    loaded = LinearRiskModel.load(path)
+    assert loaded.to_dict() == model.to_dict()
+
+
+def test_rejects_unknown_artifact_format(model):
+    with pytest.raises(ValueError, match="format"):
+        LinearRiskModel.from_dict(dict(model.to_dict(), format="other"))
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf])
+def test_rejects_non_finite_inputs(model, value):
+    with pytest.raises(ValueError):
+        model.predict([[value, 97, 40]])
+    with pytest.raises(ValueError):
+        model.predict_one(value, 97, 40)
+
+
+def test_prefers_the_artifact(tmp_path):
+    assert risk_engine.model_sources("risk_model.json") == ["risk_model.json"]
+    missing = str(tmp_path / "missing.json")
+    assert risk_engine.model_sources(missing) == [risk_engine.RISK_MODEL_PKL, risk_engine.RISK_ENCODER_PKL]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import risk_table
+from risk_engine import LinearRiskModel
+
+
+@pytest.fixture(scope="module")
+def model():
+    return LinearRiskModel.load("risk_model.json")
+
+
+@pytest.fixture(scope="module")
+def table(model):
+    return risk_table.RiskLookupTable.build(model, "test")
+
+
+def test_table_matches_model_on_every_cell(model, table):
+    assert table.verify(model)
+
+
+def test_table_save_load(table, tmp_path):
+    path = str(tmp_path / "table.npz")
+    table.save(path)
+    loaded = risk_table.RiskLookupTable.load(path)
+    assert loaded.digest == "test"
+    assert (loaded.codes == table.codes).all()
+    assert loaded.lookup(80, 97, 40) == table.lookup(80, 97, 40)
+
+
+@pytest.mark.parametrize("reading", [
+    (29, 97, 40), (221, 97, 40), (80, 49, 40), (80, 97, 121), (80.5, 97, 40), (None, 97, 40),
+])
+def test_table_misses_off_grid(table, reading):
+    assert table.lookup(*reading) is None
+
+
+def test_lookup_batch_hit_mask(table):
+    labels, hit = table.lookup_batch([[80, 97, 40], [80.5, 97, 40], [30, 50, 0], [220, 100, 120], [np.nan, 97, 40]])
+    assert list(hit) == [True, False, True, True, False]
+    assert labels[1] is None and labels[4] is None
+    assert labels[0] == table.lookup(80, 97, 40)
+
+
+def test_table_model_falls_back_off_grid(model, table):
+    served = risk_table.TableRiskModel(model, table)
+    X = np.array([[80, 97, 40], [80.5, 97.2, 40], [250, 30, 5], [30, 50, 0], [220, 100, 120]], dtype=np.float64)
+    assert list(served.predict(X)) == list(model.predict(X))
+    assert [served.predict_one(*row) for row in X.tolist()] == list(model.predict(X))
+
+
+def test_load_or_build_rebuilds_stale_table(model, table, tmp_path):
+    path = str(tmp_path / "table.npz")
+    risk_table.RiskLookupTable(table.codes, table.labels, "old").save(path)
+    assert risk_table.load_or_build(model, "new", path).digest == "new"
+    assert risk_table.RiskLookupTable.load(path).digest == "new"
+
+
+def test_load_or_build_replaces_unreadable_table(model, tmp_path):
+    path = tmp_path / "table.npz"
+    path.write_bytes(b"not a table")
+    assert risk_table.load_or_build(model, "d", str(path)).verify(model)
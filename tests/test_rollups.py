@@ -0,0 +1,71 @@
+import random
+from datetime import datetime, timedelta
+
+import crud
+import models
+import rollups
+from utils import create_access_token
+
+START = datetime(2026, 10, 18, 6, 0)
+
+
+def _readings(n=300, user_id=4, seed=0):
+    rng = random.Random(seed)
+    return [
+        {"user_id": user_id, "heart_rate": rng.randint(50, 140), "spo2": rng.randint(85, 100), "ir": 1, "red": 1,
+         "timestamp": START + timedelta(seconds=rng.randint(0, 3 * 86400))}
+        for _ in range(n)
+    ]
+
+
+def _rollups(db):
+    columns = [c.name for c in models.SensorRollup.__table__.columns]
+    return sorted(tuple(getattr(r, c) for c in columns) for r in db.query(models.SensorRollup))
+
+
+def test_bucket_start():
+    ts = datetime(2026, 10, 18, 13, 47, 31)
+    assert rollups.bucket_start(ts, 60) == datetime(2026, 10, 18, 13, 47)
+    assert rollups.bucket_start(ts, 3600) == datetime(2026, 10, 18, 13, 0)
+    assert rollups.bucket_start(ts, 86400) == datetime(2026, 10, 18)
+
+
+def test_aggregate():
+    readings = [
+        {"user_id": 1, "heart_rate": 70, "spo2": 95, "timestamp": START + timedelta(seconds=10)},
+        {"user_id": 1, "heart_rate": 90, "spo2": 88, "timestamp": START + timedelta(seconds=50)},
+        {"user_id": 1, "heart_rate": 80, "spo2": 97, "timestamp": START + timedelta(seconds=30)},
+    ]
+    minute = next(r for r in rollups.aggregate(readings) if r["resolution"] == 60)
+    assert (minute["count"], minute["hr_min"], minute["hr_max"], minute["hr_sum"]) == (3, 70, 90, 240)
+    assert (minute["spo2_min"], minute["spo2_max"], minute["low_spo2_count"]) == (88, 97, 1)
+    # "last" is by timestamp, not arrival order
+    assert (minute["last_heart_rate"], minute["last_spo2"]) == (90, 88)
+
+
+def test_incremental_batches_match_a_rebuild(db):
+    readings = _readings()
+    for i in range(0, len(readings), 37):   # out-of-order batches, as gateways flush them
+        crud.create_sensor_readings(db, readings[i:i + 37])
+    incremental = _rollups(db)
+    assert sum(row[3] for row in incremental if row[1] == 60) == len(readings)
+    rollups.rebuild(db)
+    assert _rollups(db) == incremental
+
+
+def test_pick_resolution():
+    assert rollups.pick_resolution(START, START + timedelta(hours=2), 500) == "minute"
+    assert rollups.pick_resolution(START, START + timedelta(days=7), 500) == "hour"
+    assert rollups.pick_resolution(START, START + timedelta(days=365), 500) == "day"
+
+
+def test_rollups_endpoint(client, db):
+    crud.create_sensor_readings(db, _readings(user_id=4) + _readings(user_id=5, seed=1))
+    token = create_access_token({"sub": "u4@example.com", "user_id": 4})
+    r = client.get("/healthlogs/rollups", headers={"Authorization": f"Bearer {token}"},
+                   params={"since": START.isoformat(), "until": (START + timedelta(days=3)).isoformat()})
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["resolution"], body["bucket_seconds"]) == ("hour", 3600)
+    assert sum(p["count"] for p in body["points"]) == 300
+    assert all(p["hr_min"] <= p["hr_mean"] <= p["hr_max"] for p in body["points"])
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import models
+
+READING = {"user_id": 7, "heart_rate": 72, "spo2": 98, "ir": 51234, "red": 48765}
+
+
+def _stored(db):
+    SR = models.SensorReading
+    return db.query(SR.heart_rate, SR.timestamp).order_by(SR.heart_rate).all()
+
+
+def test_batch_stores_valid_items_and_reports_invalid_ones(client, db):
+    items = [READING, dict(READING, heart_rate="fast"), dict(READING, heart_rate=80)]
+    r = client.post("/sensor-readings/batch", json=items)
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["stored"], body["rejected"]) == (2, 1)
+    assert [result["status"] for result in body["results"]] == ["stored", "invalid", "stored"]
+    assert [hr for hr, _ in _stored(db)] == [72, 80]
+
+
+def test_batch_timestamps_with_an_offset_are_stored_as_naive_utc(client, db):
+    items = [
+        dict(READING, heart_rate=70, timestamp="2026-10-18T10:00:00Z"),
+        dict(READING, heart_rate=71, timestamp="2026-10-18T12:30:00+02:00"),
+        dict(READING, heart_rate=72, timestamp="2026-10-18T10:45:00"),
+    ]
+    r = client.post("/sensor-readings/batch", json=items)
+    assert r.status_code == 200, r.text
+    assert r.json()["stored"] == 3
+    assert _stored(db) == [
+        (70, datetime(2026, 10, 18, 10, 0)),
+        (71, datetime(2026, 10, 18, 10, 30)),
+        (72, datetime(2026, 10, 18, 10, 45)),
+    ]
+    # The rollups bucket the same naive UTC times
+    hour = db.query(models.SensorRollup).filter_by(user_id=7, resolution=3600).one()
+    assert (hour.bucket_start, hour.count) == (datetime(2026, 10, 18, 10, 0), 3)
+
+
+def test_batch_too_large(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "MAX_SENSOR_BATCH", 2)
+    assert client.post("/sensor-readings/batch", json=[READING] * 3).status_code == 413
@@ -0,0 +1,175 @@
+from datetime import datetime
+
+import pytest
+
+import sensor_codec
+from sensor_codec import PayloadError, decode_msgpack, decode_struct, encode_msgpack, encode_struct
+
+READINGS = [
+    {"user_id": 1, "heart_rate": 72, "spo2": 98, "ir": 51234, "red": 48765},
+    {"user_id": 2147483647, "heart_rate": 0, "spo2": 255, "ir": 0, "red": 2147483647},
+]
+STAMPED = [dict(r, timestamp=datetime(2024, 5, 1, 12, 30, 15, 250000)) for r in READINGS]
+
+
+def _expected(readings):
+    return [dict(r, timestamp=r.get("timestamp")) for r in readings]
+
+
+# ---- struct ----
+
+def test_struct_round_trip():
+    rows, errors = decode_struct(encode_struct(READINGS), max_records=10)
+    assert errors == []
+    assert rows == _expected(READINGS)
+
+
+def test_struct_round_trip_with_timestamps():
+    body = encode_struct(STAMPED)
+    assert len(body) == sensor_codec.HEADER.size + 2 * sensor_codec.RECORD_WITH_TIMESTAMP.itemsize
+    rows, errors = decode_struct(body, max_records=10)
+    assert errors == []
+    assert rows == _expected(STAMPED)
+
+
+def test_struct_rejects_out_of_range_records_only():
+    readings = READINGS + [dict(READINGS[0], user_id=2 ** 31, ir=2 ** 32 - 1)]
+    rows, errors = decode_struct(encode_struct(readings), max_records=10)
+    assert rows == _expected(READINGS)
+    assert [index for index, _ in errors] == [2]
+    assert sorted(e["loc"][0] for e in errors[0][1]) == ["ir", "user_id"]
+    assert all(e["type"] == "value_error.number.range" for e in errors[0][1])
+
+
+def test_struct_rejects_negative_timestamp():
+    body = encode_struct([dict(READINGS[0], timestamp_ms=-1)], timestamps=True)
+    rows, errors = decode_struct(body, max_records=10)
+    assert rows == []
+    assert errors[0][1][0]["loc"] == ["timestamp_ms"]
+
+
+@pytest.mark.parametrize("cut", [1, 7, sensor_codec.RECORD.itemsize])
+def test_struct_truncated_body(cut):
+    body = encode_struct(READINGS)
+    with pytest.raises(PayloadError) as exc:
+        decode_struct(body[:-cut], max_records=10)
+    assert exc.value.status_code == 400
+
+
+def test_struct_short_header():
+    with pytest.raises(PayloadError):
+        decode_struct(b"\x01\x00", max_records=10)
+
+
+def test_struct_trailing_bytes():
+    with pytest.raises(PayloadError):
+        decode_struct(encode_struct(READINGS) + b"\x00", max_records=10)
+
+
+def test_struct_bad_version_and_flags():
+    body = encode_struct(READINGS)
+    with pytest.raises(PayloadError, match="version"):
+        decode_struct(b"\x02" + body[1:], max_records=10)
+    with pytest.raises(PayloadError, match="flags"):
+        decode_struct(body[:1] + b"\x80" + body[2:], max_records=10)
+
+
+def test_struct_too_many_records():
+    with pytest.raises(PayloadError) as exc:
+        decode_struct(encode_struct(READINGS), max_records=1)
+    assert exc.value.status_code == 413
+
+
+# ---- MessagePack ----
+
+needs_msgpack = pytest.mark.skipif(sensor_codec.msgpack is None, reason="msgpack is not installed")
+
+
+@needs_msgpack
+def test_msgpack_round_trip():
+    rows, errors = decode_msgpack(encode_msgpack(STAMPED + READINGS), max_records=10)
+    assert errors == []
+    assert rows == _expected(STAMPED + READINGS)
+
+
+@needs_msgpack
+def test_msgpack_single_map():
+    body = sensor_codec.msgpack.packb(READINGS[0])
+    assert decode_msgpack(body, max_records=1) == (_expected(READINGS[:1]), [])
+
+
+@needs_msgpack
+def test_msgpack_rejects_bad_items():
+    items = [
+        READINGS[0],
+        dict(READINGS[0], spo2=256),
+        dict(READINGS[0], heart_rate=True),
+        {k: v for k, v in READINGS[0].items() if k != "red"},
+        dict(READINGS[0], timestamp_ms=-5),
+        "not a map",
+    ]
+    rows, errors = decode_msgpack(sensor_codec.msgpack.packb(items), max_records=10)
+    assert rows == _expected(READINGS[:1])
+    by_index = {index: [(e["loc"], e["type"]) for e in errs] for index, errs in errors}
+    assert by_index == {
+        1: [(["spo2"], "value_error.number.range")],
+        2: [(["heart_rate"], "type_error.integer")],
+        3: [(["red"], "value_error.missing")],
+        4: [(["timestamp_ms"], "value_error.number.range")],
+        5: [([], "type_error.dict")],
+    }
+
+
+@needs_msgpack
+def test_msgpack_truncated_body():
+    body = encode_msgpack(READINGS)
+    with pytest.raises(PayloadError) as exc:
+        decode_msgpack(body[:-3], max_records=10)
+    assert exc.value.status_code == 400
+
+
+@needs_msgpack
+def test_msgpack_too_many_records():
+    with pytest.raises(PayloadError) as exc:
+        decode_msgpack(encode_msgpack(READINGS), max_records=1)
+    assert exc.value.status_code == 413
+
+
+def test_decode_picks_format_from_content_type():
+    body = encode_struct(READINGS)
+    assert sensor_codec.decode("application/octet-stream; charset=binary", body, 10)[0] == _expected(READINGS)
+    if sensor_codec.msgpack is not None:
+        body = encode_msgpack(READINGS)
+        assert sensor_codec.decode("application/x-msgpack", body, 10)[0] == _expected(READINGS)
+
+
+# ---- the upload endpoints ----
+
+def test_struct_batch_upload(client, db):
+    import models
+
+    body = encode_struct(STAMPED + [dict(STAMPED[0], ir=2 ** 32 - 1)])
+    r = client.post("/sensor-readings/batch", content=body, headers={"Content-Type": "application/vnd.latestback.sensor"})
+    assert r.status_code == 200, r.text
+    assert [res["status"] for res in r.json()["results"]] == ["stored", "stored", "invalid"]
+    SR = models.SensorReading
+    assert db.query(SR.user_id, SR.timestamp).order_by(SR.user_id).all() == [(r["user_id"], r["timestamp"]) for r in STAMPED]
+
+
+def test_struct_single_upload(client, db):
+    body = encode_struct(READINGS[:1])
+    headers = {"Content-Type": "application/octet-stream"}
+    r = client.post("/sensor-readings", content=body, headers=headers)
+    assert r.status_code == 200, r.text
+    # The ingest writer isn't started in tests, so the reading is stored synchronously
+    assert r.json()["status"] == "stored"
+    assert client.post("/sensor-readings", content=encode_struct(READINGS), headers=headers).status_code == 413
+    assert client.post("/sensor-readings", content=body[:-1], headers=headers).status_code == 400
+
+
+@needs_msgpack
+def test_msgpack_batch_upload(client, db):
+    body = encode_msgpack(READINGS + [dict(READINGS[0], spo2=300)])
+    r = client.post("/sensor-readings/batch", content=body, headers={"Content-Type": "application/msgpack"})
+    assert r.status_code == 200, r.text
+    assert (r.json()["stored"], r.json()["rejected"]) == (2, 1)
@@ -0,0 +1,213 @@
+"""Cache of verified JWT payloads and of the account rows behind them.
+
+Dashboards send the same bearer token many times a minute; verifying its
+signature every time is wasted work. TokenCache keeps a bounded LRU of
+verified payloads keyed by the token's SHA-256 digest, and each entry
+expires at the token's own "exp", so caching never makes a token live
+longer than it would have.
+
+Revocation (logout) is checked before the cache: a revoked digest is
+remembered until the token would have expired anyway. Once bind() gives the
+cache a session factory, revocations are also written to the revoked_tokens
+table, and every worker picks up new rows at most once per
+TOKEN_REVOCATION_SYNC_SECONDS. So a logged-out token stops working on the
+worker that handled the logout at once, and on every other worker within
+that interval.
+
+Knobs: TOKEN_CACHE_SIZE, USER_CACHE_SIZE, USER_CACHE_TTL (seconds),
+TOKEN_REVOCATION_SYNC_SECONDS.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import logs
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", "1"))
+
+logger = logs.get_logger("auth")
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, sync_interval: float = TOKEN_REVOCATION_SYNC_SECONDS):
+        self.maxsize = maxsize
+        self.sync_interval = sync_interval
+        self.session_factory = None
+        self._entries = OrderedDict()   # digest -> (payload, exp)
+        self._revoked = {}              # digest -> exp
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_id = 0             # highest revoked_tokens.id seen
+        self._synced_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def bind(self, session_factory):
+        """Share revocations with the other workers through the revoked_tokens table."""
+        self.session_factory = session_factory
+
+    def _sync(self):
+        # One thread polls at a time; the others keep going with what is known
+        if self.session_factory is None or time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            from models import RevokedToken
+
+            db = self.session_factory()
+            try:
+                rows = db.query(RevokedToken.id, RevokedToken.digest, RevokedToken.expires_at).filter(
+                    RevokedToken.id > self._synced_id, RevokedToken.expires_at > datetime.utcnow()
+                ).order_by(RevokedToken.id).all()
+            finally:
+                db.close()
+            with self._lock:
+                for row_id, digest, expires_at in rows:
+                    self._revoked[digest] = _epoch(expires_at)
+                    self._entries.pop(digest, None)
+                    self._synced_id = max(self._synced_id, row_id)
+        except Exception as e:
+            logger.warning("⚠️ Token revocation sync failed: %s", e)
+        finally:
+            self._synced_at = time.monotonic()
+            self._sync_lock.release()
+
+    def verify(self, token: str, verifier):
+        """Payload for token (cached or from verifier(token)), or None if invalid/revoked."""
+        digest = token_digest(token)
+        now = time.time()
+        self._sync()
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                payload, exp = entry
+                if exp > now:
+                    if digest in self._revoked:
+                        self.rejected += 1
+                        return None
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return payload
+                del self._entries[digest]
+            self.misses += 1
+
+        payload = verifier(token)
+        if not payload:
+            return None
+        with self._lock:
+            if digest in self._revoked:
+                self.rejected += 1
+                return None
+            exp = payload.get("exp")
+            if exp is not None:
+                self._entries[digest] = (payload, float(exp))
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return payload
+
+    def revoke(self, token: str, payload: dict = None):
+        """Reject this token from now on (logout); with bind(), on every worker."""
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            if payload is None and entry is not None:
+                payload = entry[0]
+            exp = (payload or {}).get("exp")
+            exp = float(exp) if exp is not None else now + 24 * 3600
+            self._revoked[digest] = exp
+            # Forget revocations whose tokens have expired on their own
+            for stale in [d for d, e in self._revoked.items() if e <= now]:
+                del self._revoked[stale]
+        if self.session_factory is not None:
+            self._store(digest, exp)
+
+    def _store(self, digest: str, exp: float):
+        from models import RevokedToken
+
+        db = self.session_factory()
+        try:
+            if db.query(RevokedToken.id).filter(RevokedToken.digest == digest).first() is None:
+                db.add(RevokedToken(digest=digest, expires_at=datetime.utcfromtimestamp(exp)))
+            db.query(RevokedToken).filter(RevokedToken.expires_at <= datetime.utcnow()).delete()
+            db.commit()
+        except Exception as e:
+            # Already revoked by a concurrent logout, or the DB is down (then only this worker knows)
+            db.rollback()
+            logger.warning("⚠️ Token revocation not shared with other workers: %s", e)
+        finally:
+            db.close()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "revoked": len(self._revoked),
+        }
+
+
+def _epoch(naive_utc: datetime) -> float:
+    return (naive_utc - datetime(1970, 1, 1)).total_seconds()
+
+
+class UserCache:
+    """Short-TTL LRU of account rows (as dicts) keyed by user id."""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()   # user_id -> (record, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, loader):
+        """Cached record for user_id, else loader(user_id) (None results are not cached)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        record = loader(user_id)
+        if record is not None:
+            with self._lock:
+                self._entries[user_id] = (record, now + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return record
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl": self.ttl}
+
+
+token_cache = TokenCache()
+user_cache = UserCache()
@@ -1,25 +1,319 @@
-import pandas as pd
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import LabelEncoder
+"""Train the risk model by streaming labeled health_records from the database.
+
+    python train_model.py                        # continue from the newest checkpoint
+    python train_model.py --full --epochs 3      # retrain from scratch
+    python train_model.py --csv health_records.csv --full   # seed from the bundled CSV
+    python train_model.py --promote              # also serve the new version
+
+Rows (heart_rate, spo2, patient age -> status) are read in keyset chunks
+ordered by record id, the same way backfill_risk.py walks the table, and fed
+to SGDClassifier.partial_fit with a logistic loss, so memory is bounded by
+--chunk-size however large the table grows. A full run makes one pass to fit
+the StandardScaler, then --epochs passes of the classifier.
+
+A stable hash of the record id puts --holdout-percent of the rows into a
+validation slice that is never trained on; it is the same slice in every
+run, so the metrics of successive versions are comparable.
+
+Each run writes a new version directory under MODEL_ARTIFACTS_DIR (the
+model registry, see model_registry.py):
+
+    risk_model.json     linear-risk-v1 artifact (scaler folded into the coefficients)
+    metrics.json        validation accuracy, per-class precision/recall, confusion matrix
+    checkpoint.joblib   scaler + classifier state and the last record id seen
+
+An incremental run loads the newest checkpoint and trains one pass over the
+rows added since (id > last id seen); the scaler stays frozen so the learned
+weights keep their meaning. A label the checkpoint has never seen needs a
+--full run. --promote points ACTIVE at the new version and --shadow makes it
+the shadow candidate; running workers pick either up without a restart.
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import time
+from collections import namedtuple
+from datetime import datetime
+
 import joblib
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+import model_registry
+from model_registry import ARTIFACT_FILE, CHECKPOINT_FILE, METRICS_FILE, MODEL_ARTIFACTS_DIR, versions
+from risk_engine import FEATURES, LinearRiskModel
+
+# ids (int64), X (n x 3 float64), y (object labels)
+Chunk = namedtuple("Chunk", "ids X y")
+
+
+def iter_db_chunks(chunk_size: int, after_id: int = 0):
+    """Labeled rows from health_records joined to the patient's age, chunk by chunk."""
+    from sqlalchemy import select
+
+    from database import SessionLocal
+    from models import HealthRecord, Patient
+
+    db = SessionLocal()
+    last_id = after_id
+    try:
+        while True:
+            query = (
+                select(HealthRecord.id, HealthRecord.heart_rate, HealthRecord.spo2, Patient.age, HealthRecord.status)
+                .join(Patient, Patient.id == HealthRecord.patient_id)
+                .where(
+                    HealthRecord.id > last_id,
+                    HealthRecord.status.isnot(None),
+                    HealthRecord.heart_rate.isnot(None),
+                    HealthRecord.spo2.isnot(None),
+                    Patient.age.isnot(None),
+                )
+                .order_by(HealthRecord.id)
+                .limit(chunk_size)
+            )
+            rows = db.execute(query).all()
+            db.rollback()  # release the read snapshot between chunks
+            if not rows:
+                return
+            ids, heart_rate, spo2, age, status = zip(*rows)
+            yield Chunk(
+                np.asarray(ids, dtype=np.int64),
+                np.column_stack([heart_rate, spo2, age]).astype(np.float64),
+                np.asarray(status, dtype=object),
+            )
+            last_id = ids[-1]
+    finally:
+        db.close()
+
+
+def iter_csv_chunks(path: str, chunk_size: int, after_id: int = 0):
+    """Rows of a heart_rate,spo2,age,status CSV; the 1-based line number stands in for the id."""
+    import pandas as pd
+
+    offset = 0
+    for frame in pd.read_csv(path, chunksize=chunk_size):
+        ids = np.arange(offset + 1, offset + len(frame) + 1, dtype=np.int64)
+        offset += len(frame)
+        frame = frame.assign(id=ids).dropna(subset=FEATURES + ["status"])
+        frame = frame[frame["id"] > after_id]
+        if len(frame):
+            yield Chunk(frame["id"].to_numpy(), frame[FEATURES].to_numpy(np.float64), frame["status"].to_numpy(object))
+
+
+def holdout_mask(ids: np.ndarray, percent: float) -> np.ndarray:
+    """True for the validation rows: a multiplicative hash of the id, so the split is stable across runs."""
+    mixed = (ids.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+    return (mixed % np.uint64(10000)).astype(np.int64) < int(percent * 100)
+
+
+def to_linear_model(scaler: StandardScaler, classifier: SGDClassifier) -> LinearRiskModel:
+    """Fold the scaler into the weights so serving takes raw (heart_rate, spo2, age)."""
+    coef = classifier.coef_ / scaler.scale_
+    intercept = classifier.intercept_ - (classifier.coef_ * scaler.mean_ / scaler.scale_).sum(axis=1)
+    return LinearRiskModel(coef, intercept, classifier.classes_)
+
+
+def latest_checkpoint(root: str = MODEL_ARTIFACTS_DIR):
+    """(version, checkpoint dict) of the newest version that has one, else (None, None)."""
+    for version in reversed(versions(root)):
+        path = os.path.join(root, version, CHECKPOINT_FILE)
+        if os.path.isfile(path):
+            return version, joblib.load(path)
+    return None, None
+
+
+def _new_version(root: str) -> str:
+    base = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    version, n = base, 1
+    while os.path.exists(os.path.join(root, version)):
+        n += 1
+        version = f"{base}-{n}"
+    return version
+
+
+def _shuffled(chunk: Chunk, rng) -> Chunk:
+    order = rng.permutation(len(chunk.ids))
+    return Chunk(chunk.ids[order], chunk.X[order], chunk.y[order])
+
+
+def classification_metrics(confusion: np.ndarray, labels) -> dict:
+    """Accuracy, macro F1 and per-class precision/recall from a (true x predicted) count matrix."""
+    total = int(confusion.sum())
+    correct = int(np.trace(confusion))
+    per_class, f1s = {}, []
+    for i, label in enumerate(labels):
+        tp = int(confusion[i, i])
+        predicted = int(confusion[:, i].sum())
+        support = int(confusion[i, :].sum())
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / support if support else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        f1s.append(f1)
+        per_class[str(label)] = {
+            "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4), "support": support,
+        }
+    return {
+        "accuracy": round(correct / total, 4) if total else None,
+        "macro_f1": round(float(np.mean(f1s)), 4) if total else None,
+        "rows": total,
+        "per_class": per_class,
+        "confusion_matrix": {"labels": [str(label) for label in labels], "counts": confusion.tolist()},
+    }
+
+
+def evaluate(chunks, holdout_percent: float, models: dict, labels) -> dict:
+    """One pass over the validation slice; returns metrics per named LinearRiskModel."""
+    index = {str(label): i for i, label in enumerate(labels)}
+    confusion = {name: np.zeros((len(labels), len(labels)), dtype=np.int64) for name in models}
+    for chunk in chunks:
+        mask = holdout_mask(chunk.ids, holdout_percent)
+        if not mask.any():
+            continue
+        known = np.array([str(label) in index for label in chunk.y[mask]])
+        X = chunk.X[mask][known]
+        truth = np.array([index[str(label)] for label in chunk.y[mask][known]], dtype=np.int64)
+        for name, model in models.items():
+            predicted = np.array([index[str(label)] for label in model.predict(X)], dtype=np.int64)
+            np.add.at(confusion[name], (truth, predicted), 1)
+    return {name: classification_metrics(matrix, labels) for name, matrix in confusion.items()}
+
+
+def train(chunks_from, full: bool = False, epochs: int = 1, holdout_percent: float = 10.0,
+          seed: int = 0, root: str = MODEL_ARTIFACTS_DIR, source: str = "database"):
+    """Train a new version; chunks_from(after_id) must return a fresh chunk iterator.
+
+    Returns (version, metrics), or (None, None) when an incremental run finds no new rows.
+    """
+    rng = np.random.default_rng(seed)
+    started = time.monotonic()
+    parent, checkpoint = (None, None) if full else latest_checkpoint(root)
+
+    if checkpoint is None:
+        # Pass 0: feature scaling and the label set, from the training rows only
+        scaler, labels, last_id = StandardScaler(), set(), 0
+        for chunk in chunks_from(0):
+            train_rows = ~holdout_mask(chunk.ids, holdout_percent)
+            if train_rows.any():
+                scaler.partial_fit(chunk.X[train_rows])
+                labels.update(str(label) for label in chunk.y[train_rows])
+            last_id = max(last_id, int(chunk.ids[-1]))
+        if not labels:
+            raise SystemExit("❌ No labeled rows to train on")
+        classes = np.array(sorted(labels), dtype=object)
+        if len(classes) < 2:
+            raise SystemExit(f"❌ Need at least two labels to train, found {list(classes)}")
+        scaler.scale_[scaler.scale_ == 0] = 1.0
+        classifier = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=seed)
+        previous, trained_rows, after_id, passes = None, 0, 0, epochs
+    else:
+        if checkpoint["holdout_percent"] != holdout_percent:
+            print(f"⚠️ Keeping the checkpoint's holdout of {checkpoint['holdout_percent']}% so validation rows stay unseen")
+            holdout_percent = checkpoint["holdout_percent"]
+        scaler, classifier = checkpoint["scaler"], checkpoint["classifier"]
+        classes, last_id = classifier.classes_, checkpoint["last_id"]
+        previous = to_linear_model(scaler, copy.deepcopy(classifier))
+        trained_rows, after_id, passes = checkpoint["trained_rows"], last_id, 1
+
+    new_rows = 0
+    known = set(str(label) for label in classes)
+    for epoch in range(passes):
+        for chunk in chunks_from(after_id):
+            last_id = max(last_id, int(chunk.ids[-1]))
+            chunk = _shuffled(chunk, rng)
+            train_rows = ~holdout_mask(chunk.ids, holdout_percent)
+            unseen = set(str(label) for label in chunk.y[train_rows]) - known
+            if unseen:
+                raise SystemExit(f"❌ Labels {sorted(unseen)} are not in checkpoint {parent}; retrain with --full")
+            if not train_rows.any():
+                continue
+            classifier.partial_fit(scaler.transform(chunk.X[train_rows]), chunk.y[train_rows], classes=classes)
+            new_rows += int(train_rows.sum())
+            rate = new_rows / max(time.monotonic() - started, 1e-9)
+            print(f"🧠 epoch={epoch + 1}/{passes} trained={new_rows} last_id={int(chunk.ids[-1])} ({rate:.0f} rows/s)")
+
+    if new_rows == 0:
+        if checkpoint is not None:
+            print(f"✅ No new labeled rows since {parent}; nothing to train")
+            return None, None
+        raise SystemExit("❌ Every labeled row fell into the validation slice; lower --holdout-percent")
+
+    compiled = to_linear_model(scaler, classifier)
+    candidates = {"model": compiled}
+    if previous is not None:
+        candidates["parent"] = previous
+    results = evaluate(chunks_from(0), holdout_percent, candidates, classes)
+
+    metrics = dict(results["model"])
+    metrics.update({
+        "source": source,
+        "mode": "full" if checkpoint is None else "incremental",
+        "parent": parent,
+        "epochs": passes,
+        "holdout_percent": holdout_percent,
+        "trained_rows_this_run": new_rows // passes,
+        "trained_rows_total": trained_rows + new_rows // passes,
+        "last_id": last_id,
+        "seconds": round(time.monotonic() - started, 2),
+    })
+    if "parent" in results:
+        metrics["parent_accuracy"] = results["parent"]["accuracy"]
 
-# Load dataset
-data = pd.read_csv("health_records.csv")
+    os.makedirs(root, exist_ok=True)
+    version = _new_version(root)
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+    try:
+        compiled.save(os.path.join(staging, ARTIFACT_FILE))
+        with open(os.path.join(staging, METRICS_FILE), "w") as f:
+            json.dump(dict(metrics, version=version), f, indent=2)
+        joblib.dump({
+            "scaler": scaler,
+            "classifier": classifier,
+            "last_id": last_id,
+            "trained_rows": metrics["trained_rows_total"],
+            "holdout_percent": holdout_percent,
+            "source": source,
+        }, os.path.join(staging, CHECKPOINT_FILE))
+        os.replace(staging, os.path.join(root, version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
 
-# Encode status labels to numbers
-le = LabelEncoder()
-data['status_encoded'] = le.fit_transform(data['status'])
+    print(f"✅ Model {version}: accuracy={metrics['accuracy']} macro_f1={metrics['macro_f1']} "
+          f"on {metrics['rows']} validation rows ({metrics['mode']}, {metrics['trained_rows_this_run']} rows trained)")
+    return version, metrics
 
-# Features & target
-X = data[['heart_rate', 'spo2', 'age']]
-y = data['status_encoded']
 
-# Train model
-model = LogisticRegression(max_iter=200)
-model.fit(X, y)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the risk model from labeled health records")
+    parser.add_argument("--full", action="store_true", help="ignore checkpoints and retrain from scratch")
+    parser.add_argument("--epochs", type=int, default=1, help="passes over the data for a full run")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--holdout-percent", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", default=None, help="read a heart_rate,spo2,age,status CSV instead of the database")
+    parser.add_argument("--output-dir", default=MODEL_ARTIFACTS_DIR)
+    parser.add_argument("--promote", action="store_true", help="make the new version ACTIVE")
+    parser.add_argument("--shadow", action="store_true", help="shadow-score the new version against the active one")
+    parser.add_argument("--min-accuracy", type=float, default=0.0, help="only promote at or above this accuracy")
+    args = parser.parse_args()
 
-# Save model & encoder
-joblib.dump(model, 'risk_model.pkl')
-joblib.dump(le, 'label_encoder.pkl')
+    if args.csv:
+        chunks_from = lambda after_id: iter_csv_chunks(args.csv, args.chunk_size, after_id)
+    else:
+        chunks_from = lambda after_id: iter_db_chunks(args.chunk_size, after_id)
 
-print("Model and label encoder saved!")
+    version, metrics = train(chunks_from, args.full, args.epochs, args.holdout_percent, args.seed,
+                             args.output_dir, "csv" if args.csv else "database")
+    if version and args.shadow:
+        model_registry.write_pointer(model_registry.SHADOW, version, args.output_dir)
+        print(f"👥 Shadow scoring {version}")
+    if version and args.promote:
+        if (metrics["accuracy"] or 0.0) >= args.min_accuracy:
+            model_registry.activate(version, args.output_dir)
+            print(f"🚀 {version} is active")
+        else:
+            print(f"⚠️ Not promoting {version}: accuracy {metrics['accuracy']} < {args.min_accuracy}")
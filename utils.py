@@ -1,32 +1,123 @@
-import bcrypt, joblib
+import base64, bcrypt, os, time
+import numpy as np
+import risk_table
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
-from passlib.context import CryptContext
+import hashing
+import logs
+import metrics
+import model_registry
+from risk_engine import load_risk_model, model_sources
 
 SECRET_KEY = "supersecretkey123"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+logger = logs.get_logger("utils")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-# Load ML model and encoder
-ml_model = joblib.load("risk_model.pkl")
-ml_encoder = joblib.load("label_encoder.pkl")
+
+# bcrypt runs in hashing's process pool (see hashing.py)
+pwd_context = hashing.pwd_context
+# How often (seconds) each worker checks for a new active/shadow model version
+RISK_MODEL_CHECK_INTERVAL = float(os.getenv("RISK_MODEL_CHECK_INTERVAL", "5"))
+
+def load_serving_model():
+    """The ACTIVE registry version (legacy risk_model.json/pickles without one), wrapped in its lookup table when RISK_LOOKUP_TABLE is on."""
+    version = model_registry.read_pointer(model_registry.ACTIVE)
+    model = model_registry.load_version(version) if version else load_risk_model()
+    if risk_table.RISK_LOOKUP_TABLE:
+        table_model = risk_table.TableRiskModel(model, risk_table.load_or_build(model, model.digest))
+        table_model.version = version
+        return table_model
+    return model
+
+def _serving_stamp():
+    stamp = model_registry.pointer_stamp(model_registry.ACTIVE)
+    if stamp is not None:
+        return stamp
+    return [(path, os.stat(path).st_mtime_ns) for path in model_sources()]
+
+def load_shadow_model():
+    version = model_registry.read_pointer(model_registry.SHADOW)
+    return model_registry.load_version(version) if version else None
+
+# Served model, loaded on first use (or by load_models) and hot-swapped by a watcher thread (see model_registry.py)
+active_model = model_registry.HotModel("active", load_serving_model, _serving_stamp, RISK_MODEL_CHECK_INTERVAL)
+shadow_model = model_registry.HotModel(
+    "shadow", load_shadow_model, lambda: model_registry.pointer_stamp(model_registry.SHADOW), RISK_MODEL_CHECK_INTERVAL)
+shadow = model_registry.ShadowScorer(active_model, shadow_model)
+
+def load_models():
+    """Load the active and shadow models now instead of on the first request (startup hook, pre-fork parent)."""
+    active_model.ensure_loaded()
+    shadow_model.ensure_loaded()
+
+def get_risk_model():
+    """Served model; never blocks on a reload."""
+    return active_model.get()
+
+def model_status() -> dict:
+    """Active/shadow versions, available versions and shadow agreement stats (GET /models)."""
+    model = active_model.get()
+    return {
+        "active": getattr(model, "version", None) or "legacy",
+        "swaps": active_model.swaps,
+        "last_error": active_model.last_error,
+        "shadow": shadow.stats() if shadow_model.get() is not None else None,
+        "versions": model_registry.describe(),
+    }
 
 def compute_risk_ml(heart_rate: int, spo2: int, age: int) -> str:
     """Use trained ML model for risk classification."""
+    started = time.perf_counter()
     try:
-        X = [[heart_rate, spo2, age]]
-        pred_encoded = ml_model.predict(X)[0]
-        return ml_encoder.inverse_transform([pred_encoded])[0]
+        label = get_risk_model().predict_one(heart_rate, spo2, age)
     except Exception:
         # fallback to rule-based if ML fails
+        metrics.inference_fallbacks.inc("single")
         return classify_risk(heart_rate, spo2)
+    finally:
+        metrics.inference_latency.observe(time.perf_counter() - started, "single")
+    shadow.submit((heart_rate, spo2, age), [label])
+    return label
+
+def compute_risk_ml_batch(heart_rate, spo2, age) -> np.ndarray:
+    """Score many readings with one model call.
+
+    Takes equal-length sequences/arrays and returns an object array of labels.
+    Rows with missing or non-finite values (or every row, if the model call
+    fails) are classified with classify_risk_batch instead.
+    """
+    X = np.column_stack([
+        np.asarray(heart_rate, dtype=float),
+        np.asarray(spo2, dtype=float),
+        np.asarray(age, dtype=float),
+    ])
+    labels = classify_risk_batch(X[:, 0], X[:, 1])
+    usable = np.isfinite(X).all(axis=1)
+    fallbacks = len(X) - int(usable.sum())
+    if usable.any():
+        started = time.perf_counter()
+        try:
+            labels[usable] = get_risk_model().predict(X[usable])
+            shadow.submit(X[usable], labels[usable])
+        except Exception:
+            fallbacks = len(X)
+        metrics.inference_latency.observe(time.perf_counter() - started, "batch")
+    if fallbacks:
+        metrics.inference_fallbacks.inc("batch", amount=fallbacks)
+    return labels
+
+def compute_risk_ml_records(records) -> np.ndarray:
+    """compute_risk_ml_batch for an iterable of (heart_rate, spo2, age) rows."""
+    X = np.asarray(list(records), dtype=float).reshape(-1, 3)
+    return compute_risk_ml_batch(X[:, 0], X[:, 1], X[:, 2])
 
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -37,12 +128,30 @@ def verify_access_token(token: str):
     except JWTError:
         return None
 
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque keyset cursor for a (timestamp, id) position."""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return hashing.hash_password(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.verify_password(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """(valid, new_hash); new_hash is set when the stored hash uses an outdated cost."""
+    return hashing.verify_and_update(plain_password, hashed_password)
 
 def classify_risk(heart_rate: int, spo2: int) -> str:
     """Fallback rule-based risk classification."""
@@ -52,3 +161,11 @@ def classify_risk(heart_rate: int, spo2: int) -> str:
         return "Slightly Normal"
     else:
         return "Normal"
+
+def classify_risk_batch(heart_rate, spo2) -> np.ndarray:
+    """Vectorized classify_risk over arrays of readings."""
+    heart_rate = np.asarray(heart_rate, dtype=float)
+    spo2 = np.asarray(spo2, dtype=float)
+    at_risk = (spo2 < 90) | (heart_rate > 120)
+    slightly = ((spo2 >= 90) & (spo2 <= 94)) | ((heart_rate > 100) & (heart_rate <= 120))
+    return np.select([at_risk, slightly], ["At Risk", "Slightly Normal"], default="Normal").astype(object)